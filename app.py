@@ -2,35 +2,31 @@ import asyncio
 import argparse
 from typing import Optional, Dict, List
 import json
+import time
 from pathlib import Path
-from collections import defaultdict
+from datetime import timedelta
 
-from config import FIRECRAWL_API_KEY
+from config import FIRECRAWL_API_KEY, MAX_CONCURRENCY, METRICS_TEXTFILE, RESUME_MAX_AGE_HOURS, FETCH_BACKEND
+import metrics
 from stock_checker import StockChecker
+from fetchers import create_fetcher
 from image_scraper import ImageScraper
 from csv_handler import CSVHandler
 from models import StockInfo
+from stock_matrix import StockMatrix
 
 def print_stock_summary(results: Dict[str, StockInfo], csv_handler: CSVHandler):
     """Print a summary of stock information"""
-    store_totals = defaultdict(int)
-    out_of_stock_products = []
-    well_stocked_products = []
-    
-    for url, stock in results.items():
+    stock = StockMatrix.from_results(results)
+
+    def product_name(url: str) -> str:
         product = csv_handler.get_product_by_url(url)
-        product_name = product.name if product else "Unknown Product"
-        
-        # Update store totals
-        for store, qty in stock.to_dict().items():
-            store_totals[store] += qty
-        
-        # Check if product is out of stock everywhere
-        if all(qty == 0 for qty in stock.to_dict().values()):
-            out_of_stock_products.append(product_name)
-        # Check if product is well stocked (more than 50 total items)
-        elif sum(stock.to_dict().values()) > 50:
-            well_stocked_products.append((product_name, sum(stock.to_dict().values())))
+        return product.name if product else "Unknown Product"
+
+    store_totals = stock.store_totals() if len(stock) else {}
+    # Out of stock everywhere, and well stocked (more than 50 items in total)
+    out_of_stock_products = [product_name(url) for url in stock.out_of_stock()]
+    well_stocked_products = [(product_name(url), total) for url, total in stock.top_stocked(above=50)]
     
     print("\nStock Summary")
     print("=" * 80)
@@ -48,16 +44,19 @@ def print_stock_summary(results: Dict[str, StockInfo], csv_handler: CSVHandler):
     
     print("\nWell Stocked Products (>50 items):")
     if well_stocked_products:
-        for product, total in sorted(well_stocked_products, key=lambda x: x[1], reverse=True):
+        for product, total in well_stocked_products:
             print(f"- {product}: {total} items")
     else:
         print("No products with more than 50 items in stock")
 
-async def check_stock(output_file: Optional[str] = None):
+async def check_stock(output_file: Optional[str] = None, concurrency: int = MAX_CONCURRENCY,
+                      requests_per_second: Optional[float] = None, resume: bool = False,
+                      max_age_hours: float = RESUME_MAX_AGE_HOURS, backend: str = FETCH_BACKEND):
     """Check stock for all products"""
-    checker = StockChecker(FIRECRAWL_API_KEY)
+    fetcher = create_fetcher(backend, FIRECRAWL_API_KEY, concurrency)
+    checker = StockChecker(FIRECRAWL_API_KEY, concurrency, requests_per_second, fetcher)
     csv_handler = CSVHandler()
-    results = await checker.check_stock()
+    results = await checker.check_stock(resume=resume, max_age=timedelta(hours=max_age_hours))
     
     if output_file:
         with open(output_file, 'w') as f:
@@ -72,8 +71,12 @@ async def check_stock(output_file: Optional[str] = None):
 async def download_images():
     """Download all product images"""
     scraper = ImageScraper()
-    results = await scraper.scrape_all_images()
+    urls = list(dict.fromkeys(scraper.csv_handler.get_all_product_urls()))
+    results = await scraper.scrape_all_images(urls)
     print(f"\nDownloaded {len(results)} images")
+    # Record where each product's image was saved, in one rewrite of the catalog
+    updated = scraper.csv_handler.update_product_images(results, column='Local Image Path')
+    print(f"Updated image paths of {updated} products in {scraper.csv_handler.csv_path}")
     return results
 
 def list_products():
@@ -97,20 +100,40 @@ async def main():
     parser.add_argument('action', choices=['check-stock', 'download-images', 'list-products'],
                       help='Action to perform')
     parser.add_argument('--output', '-o', help='Output file for stock results')
+    parser.add_argument('--concurrency', type=int, default=MAX_CONCURRENCY,
+                      help='Maximum stock checks in flight at once')
+    parser.add_argument('--rps', type=float,
+                      help='Starting requests-per-second for stock checks (adapts to 429s)')
+    parser.add_argument('--backend', choices=['firecrawl', 'http', 'replay'], default=FETCH_BACKEND,
+                      help='Where stock checks fetch product pages from')
+    parser.add_argument('--resume', action='store_true',
+                      help='Skip products checked recently by an earlier (interrupted) sweep')
+    parser.add_argument('--max-age-hours', type=float, default=RESUME_MAX_AGE_HOURS,
+                      help='How recent a check must be to be skipped on resume')
+    parser.add_argument('--metrics-file', default=METRICS_TEXTFILE,
+                      help='Write Prometheus metrics here when done (for node_exporter\'s textfile collector)')
     
     args = parser.parse_args()
     
+    start = time.perf_counter()
     try:
         if args.action == 'check-stock':
-            await check_stock(args.output)
+            await check_stock(args.output, args.concurrency, args.rps, args.resume,
+                              args.max_age_hours, args.backend)
         elif args.action == 'download-images':
             await download_images()
         elif args.action == 'list-products':
             list_products()
+        metrics.BATCH_LAST_SUCCESS.labels(args.action).set(time.time())
     except KeyboardInterrupt:
         print("\nOperation cancelled by user")
     except Exception as e:
         print(f"\nError: {str(e)}")
+    finally:
+        if args.metrics_file:
+            metrics.BATCH_DURATION.labels(args.action).set(time.perf_counter() - start)
+            metrics.write_textfile(args.metrics_file)
+            print(f"Metrics written to {args.metrics_file}")
 
 if __name__ == "__main__":
     asyncio.run(main())
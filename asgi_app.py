@@ -0,0 +1,114 @@
+"""ASGI version of the web frontend (same routes, template and caches as web_app).
+
+Handlers are async: a request whose response is already rendered for the
+current snapshot is answered on the event loop, and anything that has to
+load stock data, rebuild the catalog or render runs in a worker thread, so
+one slow request never holds up the others.
+
+Run with: uvicorn asgi_app:app --workers 4
+"""
+from contextlib import asynccontextmanager
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Route
+from starlette.staticfiles import StaticFiles
+
+import metrics
+from config import INDEX_RENDER_MODE
+from web_core import (
+    SSE_HEADERS, BadRequest, cache_key, cached_response, index_context, link_product_images, products_query,
+    products_renderer, render_chunks, stock_event_stream_async, streamed_response, warm_up
+)
+
+templates = Environment(loader=FileSystemLoader('templates'), autoescape=select_autoescape())
+link_product_images('static')
+
+
+async def respond(request: Request, key: str, render, mimetype: str) -> Response:
+    """Serve a response rendered once per snapshot version, with a strong ETag"""
+    args = (key, render, mimetype, request.headers.get('accept-encoding', ''),
+            request.headers.get('if-none-match', ''))
+    with metrics.WEB_REQUEST_SECONDS.labels(request.url.path).time():
+        result = cached_response(*args, build=False)
+        if result is None:
+            result = await run_in_threadpool(cached_response, *args)
+    status, headers, body = result
+    return Response(body, status, headers, media_type=mimetype)
+
+
+async def respond_streamed(request: Request, key: str, render, mimetype: str) -> Response:
+    """Stream a response as it renders; the ETag still allows a 304"""
+    with metrics.WEB_REQUEST_SECONDS.labels(request.url.path).time():
+        status, headers, body = await run_in_threadpool(streamed_response, key, render,
+                                                        request.headers.get('accept-encoding', ''),
+                                                        request.headers.get('if-none-match', ''))
+    if status == 304:
+        return Response(b'', status, headers, media_type=mimetype)
+    # Rendering is synchronous; Starlette pulls each chunk in a worker thread
+    return StreamingResponse(body, status, headers, media_type=mimetype)
+
+
+def render_index(snapshot, loaded_at) -> bytes:
+    return templates.get_template('index.html').render(**index_context(snapshot, loaded_at)).encode()
+
+
+def stream_index(snapshot, loaded_at):
+    return render_chunks(templates.get_template('index.html'), index_context(snapshot, loaded_at))
+
+
+async def index(request: Request) -> Response:
+    if INDEX_RENDER_MODE == 'stream':
+        return await respond_streamed(request, 'index', stream_index, 'text/html')
+    return await respond(request, 'index', render_index, 'text/html')
+
+
+async def api_products(request: Request) -> Response:
+    """Paginated, filterable product list (see web_app.api_products)"""
+    query = products_query(request.query_params)
+    return await respond(request, cache_key(request.url.path, request.url.query), products_renderer(query),
+                         'application/json')
+
+
+async def stock_events(request: Request) -> Response:
+    """Stock change events (see web_app.stock_events)"""
+    stream = stock_event_stream_async(request.headers.get('last-event-id'))
+    return StreamingResponse(stream, media_type='text/event-stream', headers=SSE_HEADERS)
+
+
+async def metrics_endpoint(request: Request) -> Response:
+    """Prometheus metrics of this worker process"""
+    return Response(metrics.render(), headers={'Content-Type': metrics.CONTENT_TYPE})
+
+
+async def bad_request(request: Request, error: BadRequest) -> Response:
+    return JSONResponse({'error': str(error)}, 400)
+
+
+@asynccontextmanager
+async def lifespan(app: Starlette):
+    # Load stock and build the snapshot before taking traffic
+    await run_in_threadpool(warm_up)
+    yield
+
+
+app = Starlette(
+    routes=[
+        Route('/', index),
+        Route('/api/products', api_products),
+        Route('/api/stock/events', stock_events),
+        Route('/metrics', metrics_endpoint),
+        Mount('/static', StaticFiles(directory='static', follow_symlink=True), name='static'),
+    ],
+    exception_handlers={BadRequest: bad_request},
+    lifespan=lifespan,
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+
+    uvicorn.run(app)
@@ -0,0 +1,113 @@
+"""Benchmark the stock availability parser against the saved page fixtures.
+
+Compares the per-store regex parser that used to live in
+``StockChecker._parse_stock_info`` with ``stock_parser.parse_availability``
+and reports pages/sec for both.
+
+Usage: python benchmarks/bench_parse.py [--repeat N]
+"""
+import argparse
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from config import STORES
+from stock_parser import parse_availability
+
+HTML_FIXTURE = ROOT / 'IKEA plate _ Recommended plate from IKEA - Page 2 _ IKEA Dairyfarm.html'
+JSON_FIXTURES = sorted(ROOT.glob('ikea_products_*.json'))
+
+AVAILABILITY_BLOCK = (
+    '<div class="status status--green"><span class="status__label">In stock at Warehouse 30 in stock</span></div>'
+    '<div class="status status--green"><span class="status__label">In stock at Causeway Bay 1,213 in stock</span></div>'
+    '<div class="status status--red"><span class="status__label">Out of stock at Kowloon Bay</span></div>'
+    '<div class="status status--red"><span class="status__label">Out of stock at Macau Taipa</span></div>'
+    '<div class="status status--green"><span class="status__label">In stock at Shatin 10 in stock</span></div>'
+    '<div class="status status--green"><span class="status__label">In stock at Tsuen Wan 18 in stock</span></div>'
+)
+
+
+def legacy_parse(html: str) -> dict:
+    """The original per-store parser: up to four full-page searches per store"""
+    stock_info = {}
+    for store in STORES:
+        if re.search(f'Out of stock at\\s*{store}', html, re.IGNORECASE):
+            stock_info[store] = 0
+            continue
+        patterns = [
+            f'In stock at\\s*{store}\\s*([0-9,]+)\\s*in stock',
+            f'{store}[^0-9]*([0-9,]+)\\s*in stock',
+            f'status__label[^>]*>[^>]*{store}[^0-9]*([0-9,]+)\\s*in stock'
+        ]
+        stock_info[store] = 0
+        for pattern in patterns:
+            match = re.search(pattern, html, re.IGNORECASE)
+            if match:
+                try:
+                    stock_info[store] = int(match.group(1).replace(',', ''))
+                    break
+                except ValueError:
+                    continue
+    return stock_info
+
+
+def load_pages() -> dict:
+    """Load the fixture pages, plus copies with an availability block spliced in"""
+    pages = {}
+    if HTML_FIXTURE.exists():
+        pages[HTML_FIXTURE.name] = HTML_FIXTURE.read_text(encoding='utf-8')
+    for path in JSON_FIXTURES:
+        data = json.loads(path.read_text(encoding='utf-8'))
+        for i, item in enumerate(data.get('data', [])):
+            if item.get('html'):
+                pages[f'{path.name}[{i}]'] = item['html']
+
+    # The fixtures are listing pages; splice a product availability block into
+    # the middle of each so the "found" path is measured as well.
+    for name, html in list(pages.items()):
+        middle = len(html) // 2
+        pages[f'{name} +availability'] = html[:middle] + AVAILABILITY_BLOCK + html[middle:]
+    return pages
+
+
+def bench(parse, pages: dict, repeat: int) -> float:
+    """Return pages/sec for parsing every page ``repeat`` times"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for html in pages.values():
+            parse(html)
+    elapsed = time.perf_counter() - start
+    return (len(pages) * repeat) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Stock parser benchmark')
+    parser.add_argument('--repeat', type=int, default=5, help='Passes over the fixture set')
+    args = parser.parse_args()
+
+    pages = load_pages()
+    if not pages:
+        print("No fixtures found")
+        return
+
+    total_mb = sum(len(html) for html in pages.values()) / 1e6
+    print(f"{len(pages)} pages, {total_mb:.1f} MB")
+
+    mismatches = [name for name, html in pages.items() if legacy_parse(html) != parse_availability(html)]
+    for name in mismatches:
+        print(f"Result mismatch on {name}")
+
+    before = bench(legacy_parse, pages, args.repeat)
+    after = bench(parse_availability, pages, args.repeat)
+    print(f"before (per-store regex): {before:10.1f} pages/sec")
+    print(f"after  (single pass):     {after:10.1f} pages/sec")
+    print(f"speedup: {after / before:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""Catalog build scaling: how building the web app's product records grows with the catalog.
+
+Generates synthetic product CSVs and stock snapshots of increasing size (by
+repeating the rows of ``ikea_products.csv`` under new URLs, with string
+prices, missing images and duplicate URLs mixed in) and times
+``snapshot.build_products`` on each, next to the row-at-a-time build it
+replaced and the full ``CatalogSnapshot`` (records plus query index). Unless
+``--skip-rowwise`` is given, both builds must also give identical records,
+with and without local image paths.
+
+Usage:
+    python benchmarks/catalog_scaling.py [--sizes 1000 10000 50000] [--repeat 3] [--skip-rowwise]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import pandas as pd
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from config import STORES
+from stock_matrix import StockMatrix
+from run_benchmarks import measure
+from snapshot import CatalogSnapshot, build_products, format_price, parse_price
+
+
+def build_products_rowwise(prices_csv: Path, images_csv: Path, stock_data: Dict) -> List[Dict]:
+    """The iterrows-based build that ``build_products`` replaced, kept as the baseline"""
+    df_prices = pd.read_csv(prices_csv)
+    df_images = pd.read_csv(images_csv)
+    df_prices.columns = df_prices.columns.str.strip()
+    df_images.columns = df_images.columns.str.strip()
+    if 'Price' in df_images.columns:
+        df_images = df_images.drop('Price', axis=1)
+    df = df_images.drop_duplicates(subset=['Product URL'], keep='first')
+    df['Product URL'] = df['Product URL'].str.strip()
+    df_prices['Product URL'] = df_prices['Product URL'].str.strip()
+    df = pd.merge(df, df_prices[['Product URL', 'Price']], on='Product URL', how='left')
+
+    products = []
+    seen_urls = set()
+    for _, row in df.iterrows():
+        if row['Product URL'] in seen_urls:
+            continue
+        seen_urls.add(row['Product URL'])
+        stock_info = stock_data.get(row['Product URL'], None)
+        stock_status = stock_info.to_dict() if stock_info else {}
+        products.append({
+            'name': row['Product Name'],
+            'url': row['Product URL'],
+            'description': row['Description'] if pd.notna(row['Description']) else 'N/A',
+            'price': format_price(row['Price']),
+            'price_value': parse_price(row['Price']),
+            'image_path': f"/static/product_images/{os.path.basename(row['Local Image Path'])}" if pd.notna(row['Local Image Path']) else None,
+            'stock': {store: stock_status.get(store, 0) for store in STORES}
+        })
+    products.sort(key=lambda x: x['name'])
+    return products
+
+
+def make_catalog(size: int, workdir: Path, seed: int = 0, local_images: bool = True) -> Tuple[Path, StockMatrix]:
+    """Write a ``size``-product CSV and return it with a matching stock snapshot, as the web app serves it.
+
+    Without ``local_images`` the Local Image Path column is left empty, as it
+    is before any image download.
+    """
+    rng = random.Random(seed)
+    base = pd.read_csv(ROOT / 'ikea_products.csv')
+    df = base.iloc[[i % len(base) for i in range(size)]].reset_index(drop=True)
+    df['Product URL'] = [f"{url}?v={i}" for i, url in enumerate(df['Product URL'])]
+    # IKEA-style prices (x.9), some written as "+1,234.9" strings
+    df['Price'] = [f"+{price:,.1f}" if rng.random() < 0.2 else price
+                   for price in (rng.randrange(5, 5000) + 0.9 for _ in range(size))]
+    df.loc[[rng.random() < 0.05 for _ in range(size)], 'Local Image Path'] = None
+    if not local_images:
+        df['Local Image Path'] = None
+    # A few URLs listed twice, as the scraped CSVs sometimes have
+    df = pd.concat([df, df.sample(frac=0.01, random_state=seed)], ignore_index=True)
+    path = workdir / f"catalog_{size}{'' if local_images else '_no_images'}.csv"
+    df.to_csv(path, index=False)
+
+    stock_data = {url: {store: rng.choice([0, 0, 3, 12, 40]) for store in STORES}
+                  for url in df['Product URL'] if rng.random() < 0.9}
+    return path, StockMatrix.from_results(stock_data)
+
+
+def check_parity(path: Path, stock_data: Dict):
+    """Fail unless build_products gives exactly the records of the row-wise build"""
+    if build_products(path, path, stock_data) != build_products_rowwise(path, path, stock_data):
+        raise AssertionError(f"build_products differs from the row-wise build on {path}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Catalog build scaling benchmark')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--repeat', type=int, default=3, help='Timed runs per size')
+    parser.add_argument('--skip-rowwise', action='store_true', help='Do not time the row-at-a-time baseline')
+    parser.add_argument('--output', type=Path, help='Also write the results as JSON')
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory(prefix='ikea-catalog-') as tmp:
+        for size in args.sizes:
+            path, stock_data = make_catalog(size, Path(tmp))
+            row = {'products': size,
+                   'build_products': measure(lambda: build_products(path, path, stock_data), args.repeat, size),
+                   'catalog_snapshot': measure(
+                       lambda: CatalogSnapshot(build_products(path, path, stock_data), (), stock_data),
+                       args.repeat, size)}
+            line = (f"{size:>8} products  build_products {row['build_products']['mean_s'] * 1e3:9.1f} ms  "
+                    f"snapshot {row['catalog_snapshot']['mean_s'] * 1e3:9.1f} ms")
+            if not args.skip_rowwise:
+                check_parity(path, stock_data)
+                check_parity(*make_catalog(size, Path(tmp), local_images=False))
+                row['rowwise'] = measure(lambda: build_products_rowwise(path, path, stock_data), args.repeat, size)
+                speedup = row['rowwise']['mean_s'] / row['build_products']['mean_s']
+                line += f"  rowwise {row['rowwise']['mean_s'] * 1e3:9.1f} ms ({speedup:.1f}x)"
+            print(line)
+            results.append(row)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,287 @@
+"""Local stand-in for the Firecrawl API and ikea.com.hk.
+
+Serves a recorded product page (with a per-URL availability block and
+product image tag) and synthetic images, with configurable response latency,
+429 injection and a shared bandwidth cap, so the scrapers can be load-tested
+without spending API credits.
+
+Routes:
+    POST /v1/scrape       Firecrawl scrape (html, markdown and screenshot formats)
+    GET  /images/<name>   product image bytes
+    GET  /__stats         request counters as JSON
+    GET  /<anything>      product page HTML
+
+Usage: python benchmarks/fake_upstream.py [--port 8700] [--latency lognormal:80,0.5] ...
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from aiohttp import web
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from config import STORES
+
+HTML_FIXTURE = ROOT / 'IKEA plate _ Recommended plate from IKEA - Page 2 _ IKEA Dairyfarm.html'
+CHUNK_SIZE = 16 * 1024
+
+
+class LatencyModel:
+    """Response latency drawn from a distribution spec.
+
+    ``fixed:MS``, ``uniform:LOW_MS,HIGH_MS`` or ``lognormal:MEDIAN_MS,SIGMA``.
+    """
+
+    def __init__(self, spec: str = 'fixed:0', seed: Optional[int] = None):
+        kind, _, args = spec.partition(':')
+        values = [float(v) for v in args.split(',')] if args else []
+        if kind == 'fixed' and len(values) == 1:
+            self._sample = lambda: values[0]
+        elif kind == 'uniform' and len(values) == 2:
+            self._sample = lambda: self._random.uniform(values[0], values[1])
+        elif kind == 'lognormal' and len(values) == 2:
+            mu = math.log(values[0])
+            self._sample = lambda: self._random.lognormvariate(mu, values[1])
+        else:
+            raise ValueError(f"Bad latency spec: {spec}")
+        self.spec = spec
+        self._random = random.Random(seed)
+
+    def sample(self) -> float:
+        """Latency in seconds"""
+        return max(0.0, self._sample()) / 1000
+
+
+class Bandwidth:
+    """Shared link capacity: responses are paced so all of them together stay under ``bytes_per_second``"""
+
+    def __init__(self, bytes_per_second: float):
+        self.bytes_per_second = bytes_per_second
+        self._next = 0.0
+
+    async def reserve(self, size: int):
+        now = time.monotonic()
+        start = max(now, self._next)
+        self._next = start + size / self.bytes_per_second
+        await asyncio.sleep(self._next - now)
+
+
+class FakeUpstream:
+    """aiohttp application imitating Firecrawl and the IKEA site"""
+
+    def __init__(self, latency: LatencyModel, throttle_rate: float = 0.0,
+                 rate_limit: Optional[float] = None, retry_after: float = 1.0,
+                 bandwidth: Optional[float] = None, image_size: int = 60 * 1024,
+                 seed: Optional[int] = None):
+        self.latency = latency
+        self.throttle_rate = throttle_rate
+        self.rate_limit = rate_limit
+        self._allowance = rate_limit or 0.0
+        self._checked = time.monotonic()
+        self.retry_after = retry_after
+        self.bandwidth = Bandwidth(bandwidth) if bandwidth else None
+        self.image_size = image_size
+        self.base_url = ''
+        self.stats: Counter = Counter()
+        self.service_times: List[float] = []
+        self._random = random.Random(seed)
+
+        # Product details go at the top of <body>, outside any script or comment
+        html = HTML_FIXTURE.read_text(encoding='utf-8')
+        body = html.index('>', html.index('<body')) + 1
+        self._page_head, self._page_tail = html[:body], html[body:]
+
+        self.app = web.Application()
+        self.app.router.add_post('/v1/scrape', self.scrape)
+        self.app.router.add_get('/images/{name}', self.image)
+        self.app.router.add_get('/__stats', self.stats_handler)
+        self.app.router.add_get('/{tail:.*}', self.product_page)
+
+    def availability(self, url: str) -> Dict[str, int]:
+        """Deterministic per-URL stock levels"""
+        seed = zlib.crc32(url.encode())
+        return {store: (seed >> (4 * i)) % 7 * 3 for i, store in enumerate(STORES)}
+
+    def availability_block(self, url: str) -> str:
+        labels = []
+        for store, qty in self.availability(url).items():
+            text = f"In stock at {store} {qty:,} in stock" if qty else f"Out of stock at {store}"
+            labels.append(f'<div class="status"><span class="status__label">{text}</span></div>')
+        return ''.join(labels)
+
+    def image_url(self, url: str) -> str:
+        return f"{self.base_url}/images/{hashlib.md5(url.encode()).hexdigest()}.jpg"
+
+    def page(self, url: str) -> str:
+        image = f'<img class="mx-auto d-block keen-slider-detail-image" src="{self.image_url(url)}">'
+        return self._page_head + image + self.availability_block(url) + self._page_tail
+
+    def image_bytes(self, name: str) -> bytes:
+        return random.Random(name).randbytes(self.image_size)
+
+    def _throttled(self) -> bool:
+        if self.rate_limit:
+            # Token bucket holding one second's worth of requests
+            now = time.monotonic()
+            self._allowance = min(self.rate_limit, self._allowance + (now - self._checked) * self.rate_limit)
+            self._checked = now
+            if self._allowance < 1:
+                return True
+            self._allowance -= 1
+        return self._random.random() < self.throttle_rate
+
+    async def _respond(self, request: web.Request, body: bytes, content_type: str,
+                       kind: str) -> web.StreamResponse:
+        """Send ``body`` after the sampled latency, or a 429"""
+        start = time.monotonic()
+        self.stats[f'{kind}.requests'] += 1
+        await asyncio.sleep(self.latency.sample())
+        if self._throttled():
+            self.stats[f'{kind}.throttled'] += 1
+            headers = {'Retry-After': f'{self.retry_after:g}'} if self.retry_after else {}
+            return web.json_response({'success': False, 'error': 'Rate limit exceeded'},
+                                     status=429, headers=headers)
+
+        response = web.StreamResponse(headers={'Content-Type': content_type})
+        response.content_length = len(body)
+        await response.prepare(request)
+        for offset in range(0, len(body), CHUNK_SIZE):
+            chunk = body[offset:offset + CHUNK_SIZE]
+            if self.bandwidth is not None:
+                await self.bandwidth.reserve(len(chunk))
+            await response.write(chunk)
+        await response.write_eof()
+        self.stats[f'{kind}.bytes'] += len(body)
+        self.service_times.append(time.monotonic() - start)
+        return response
+
+    async def scrape(self, request: web.Request) -> web.StreamResponse:
+        payload = await request.json()
+        url = payload['url']
+        data = {'metadata': {'sourceURL': url, 'statusCode': 200}}
+        formats = payload.get('formats', ['markdown'])
+        if 'html' in formats or 'rawHtml' in formats:
+            data['html'] = self.page(url)
+        if 'markdown' in formats:
+            data['markdown'] = re.sub(r'<[^>]+>', '\n', self.availability_block(url))
+        if 'screenshot' in formats:
+            data['screenshot'] = base64.b64encode(self.image_bytes(url)).decode()
+        body = json.dumps({'success': True, 'data': data}).encode()
+        return await self._respond(request, body, 'application/json', 'firecrawl')
+
+    async def image(self, request: web.Request) -> web.StreamResponse:
+        return await self._respond(request, self.image_bytes(request.match_info['name']),
+                                   'image/jpeg', 'images')
+
+    async def product_page(self, request: web.Request) -> web.StreamResponse:
+        return await self._respond(request, self.page(str(request.rel_url)).encode(),
+                                   'text/html; charset=utf-8', 'pages')
+
+    async def stats_handler(self, request: web.Request) -> web.Response:
+        return web.json_response(self.summary())
+
+    def summary(self) -> Dict:
+        times = sorted(self.service_times)
+        summary = dict(self.stats)
+        if times:
+            summary['service_p50_ms'] = times[len(times) // 2] * 1000
+            summary['service_p99_ms'] = times[min(len(times) - 1, int(len(times) * 0.99))] * 1000
+        return summary
+
+
+class ServerThread(threading.Thread):
+    """Runs a FakeUpstream on its own event loop, so client-side CPU work does not skew it"""
+
+    def __init__(self, upstream: FakeUpstream, host: str = '127.0.0.1', port: int = 0):
+        super().__init__(daemon=True)
+        self.upstream = upstream
+        self.host = host
+        self.port = port
+        self._ready = threading.Event()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._runner: Optional[web.AppRunner] = None
+
+    def run(self):
+        self._loop = asyncio.new_event_loop()
+        self._loop.run_until_complete(self._start())
+        self._ready.set()
+        self._loop.run_forever()
+        self._loop.run_until_complete(self._runner.cleanup())
+        self._loop.close()
+
+    async def _start(self):
+        self._runner = web.AppRunner(self.upstream.app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+        self.upstream.base_url = f"http://{self.host}:{self.port}"
+
+    def start(self) -> str:
+        """Start serving and return the base URL"""
+        super().start()
+        self._ready.wait()
+        return self.upstream.base_url
+
+    def stop(self):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self.join()
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """Server options shared with the load driver"""
+    parser.add_argument('--latency', default='lognormal:80,0.5',
+                        help='Response latency: fixed:MS, uniform:LOW,HIGH or lognormal:MEDIAN,SIGMA')
+    parser.add_argument('--throttle-rate', type=float, default=0.0,
+                        help='Fraction of requests answered with a 429')
+    parser.add_argument('--rate-limit', type=float,
+                        help='Requests/sec the server accepts before answering 429')
+    parser.add_argument('--retry-after', type=float, default=1.0,
+                        help='Retry-After seconds sent with 429s (0 to omit the header)')
+    parser.add_argument('--bandwidth-kbps', type=float,
+                        help='Shared bandwidth cap in kilobytes/sec')
+    parser.add_argument('--image-kb', type=int, default=60, help='Size of served images')
+    parser.add_argument('--seed', type=int, help='Seed for latency and throttling')
+
+
+def from_arguments(args: argparse.Namespace) -> FakeUpstream:
+    return FakeUpstream(
+        LatencyModel(args.latency, args.seed),
+        throttle_rate=args.throttle_rate,
+        rate_limit=args.rate_limit,
+        retry_after=args.retry_after,
+        bandwidth=args.bandwidth_kbps * 1024 if args.bandwidth_kbps else None,
+        image_size=args.image_kb * 1024,
+        seed=args.seed
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fake Firecrawl/IKEA server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8700)
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    upstream = from_arguments(args)
+    upstream.base_url = f"http://{args.host}:{args.port}"
+    print(f"Serving on {upstream.base_url} (set FIRECRAWL_API_URL to use it as Firecrawl)")
+    web.run_app(upstream.app, host=args.host, port=args.port, access_log=None, print=None)
+
+
+if __name__ == '__main__':
+    main()
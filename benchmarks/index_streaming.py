@@ -0,0 +1,91 @@
+"""Index page rendering: cached (whole page per snapshot) against streamed (rows in chunks).
+
+For synthetic catalogs of increasing size (see ``catalog_scaling.make_catalog``)
+renders ``index.html`` both ways, the way a cache miss does it in each
+``INDEX_RENDER_MODE``, and reports the time until the first byte could be
+sent, the time for the whole page and the peak memory allocated while
+rendering (tracemalloc). Streamed chunks are dropped as they come, like a
+server writing them to the socket.
+
+Usage:
+    python benchmarks/index_streaming.py [--sizes 1000 10000 50000] [--rows 200] [--encoding gzip]
+"""
+import argparse
+import json
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable, Dict, Iterator
+
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from catalog_scaling import make_catalog
+from config import INDEX_STREAM_ROWS
+from page_cache import RenderedResponse, compress_stream
+from snapshot import CatalogSnapshot, build_products
+from web_core import index_context, render_chunks
+
+templates = Environment(loader=FileSystemLoader(ROOT / 'templates'), autoescape=select_autoescape())
+
+
+def run(chunks: Callable[[], Iterator[bytes]]) -> Dict:
+    """Time to the first chunk, total time, bytes and peak allocation of consuming ``chunks()``"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    first = None
+    size = 0
+    for chunk in chunks():
+        if first is None:
+            first = time.perf_counter() - start
+        size += len(chunk)
+    total = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'first_byte_ms': first * 1e3, 'total_ms': total * 1e3, 'bytes': size, 'peak_mb': peak / 2 ** 20}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Cached against streamed index rendering')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+    parser.add_argument('--rows', type=int, default=INDEX_STREAM_ROWS, help='Product rows per streamed chunk')
+    parser.add_argument('--encoding', choices=['identity', 'gzip'], default='identity',
+                        help='Response encoding to produce')
+    parser.add_argument('--output', type=Path, help='Also write the results as JSON')
+    args = parser.parse_args()
+
+    template = templates.get_template('index.html')
+    results = []
+    with tempfile.TemporaryDirectory(prefix='ikea-index-') as tmp:
+        for size in args.sizes:
+            path, stock_data = make_catalog(size, Path(tmp))
+            snapshot = CatalogSnapshot(build_products(path, path, stock_data), (), stock_data)
+            context = index_context(snapshot, None)
+
+            def cached():
+                # A cache miss renders the page and builds every encoded variant before sending
+                rendered = RenderedResponse(template.render(**context).encode(), 'text/html')
+                yield rendered.variants[args.encoding]
+
+            def streamed():
+                return compress_stream(render_chunks(template, context, args.rows), args.encoding)
+
+            row = {'products': size, 'cached': run(cached), 'stream': run(streamed)}
+            results.append(row)
+            for mode in ('cached', 'stream'):
+                report = row[mode]
+                print(f"{size:>8} products  {mode:6}  first byte {report['first_byte_ms']:8.1f} ms  "
+                      f"total {report['total_ms']:8.1f} ms  peak {report['peak_mb']:7.1f} MB  "
+                      f"({report['bytes']} bytes)")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
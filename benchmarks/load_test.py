@@ -0,0 +1,211 @@
+"""Load-test the scrapers against the local fake upstream.
+
+Starts ``fake_upstream`` in a background thread and runs the real
+``StockChecker`` or image download code paths against it, then reports
+products/min, per-product latency percentiles and throttle retries. Use it
+to tune concurrency and rate-governor settings without spending API credits.
+
+Scenarios:
+    stock        StockChecker.check_stock (--backend firecrawl or http)
+    images       IkeaImageDownloader.download_all_images (product page + direct image)
+    screenshots  ImageScraper.scrape_all_images via Firecrawl screenshots
+
+Usage:
+    python benchmarks/load_test.py stock --products 500 --concurrency 8 --rate-limit 5
+    python benchmarks/load_test.py images --latency uniform:50,400 --throttle-rate 0.05
+"""
+import argparse
+import asyncio
+import contextlib
+import csv
+import io
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+from urllib.parse import urlparse
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+import fake_upstream
+from csv_handler import CSVHandler
+from fetch_engine import FetchEngine
+from fetchers import FirecrawlFetcher, HttpFetcher
+from parse_pool import get_parse_stage
+from rate_governor import get_governor, FIRECRAWL, IKEA
+from response_cache import ResponseCache
+
+
+def product_urls(count: int) -> List[str]:
+    """Catalog URLs, repeated with a query string when more products are asked for"""
+    catalog = list(dict.fromkeys(CSVHandler(str(ROOT / 'ikea_products.csv')).get_all_product_urls()))
+    count = count or len(catalog)
+    return [url if i < len(catalog) else f"{url}?copy={i // len(catalog)}"
+            for i, url in ((i, catalog[i % len(catalog)]) for i in range(count))]
+
+
+def rebase(url: str, base_url: str) -> str:
+    """Point a product URL at the fake server"""
+    parsed = urlparse(url)
+    return base_url + parsed.path + (f"?{parsed.query}" if parsed.query else '')
+
+
+def write_catalog(urls: List[str], path: Path):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Product Name', 'Product URL', 'Description', 'Price'])
+        for i, url in enumerate(urls):
+            writer.writerow([f'Product {i}', url, '', '10'])
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """Nearest-rank percentile"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def timed(func, latencies: List[float]):
+    """Wrap an async per-product worker to record its latency"""
+    async def run(item):
+        start = time.perf_counter()
+        try:
+            return await func(item)
+        finally:
+            latencies.append(time.perf_counter() - start)
+    return run
+
+
+async def run_stock(args, base_url: str, workdir: Path, latencies: List[float]) -> Dict:
+    from database import Database
+    from stock_checker import StockChecker
+    from stock_history import StockHistory
+
+    urls = product_urls(args.products)
+    if args.backend == 'http':
+        urls = [rebase(url, base_url) for url in urls]
+        fetcher = HttpFetcher(FetchEngine(args.concurrency, get_governor(IKEA)))
+    else:
+        fetcher = FirecrawlFetcher('fake-key', FetchEngine(args.concurrency, get_governor(FIRECRAWL)),
+                                   api_url=base_url)
+    write_catalog(urls, workdir / 'catalog.csv')
+
+    checker = StockChecker('fake-key', fetcher=fetcher)
+    checker.csv_handler = CSVHandler(str(workdir / 'catalog.csv'))
+    checker.results_file = workdir / 'stock_results.json'
+    checker.journal.path = workdir / 'stock_results_partial.ndjson'
+    checker.history = StockHistory(Database(str(workdir / 'history.db')))
+    checker._scrape_product = timed(checker._scrape_product, latencies)
+    results = await checker.check_stock()
+    return {'products': len(urls), 'succeeded': len(results), 'retries': checker.engine.retries,
+            'final_rps': checker.engine.governor.rate}
+
+
+async def run_images(args, base_url: str, workdir: Path, latencies: List[float]) -> Dict:
+    from download_ikea_image import IkeaImageDownloader
+
+    urls = [rebase(url, base_url) for url in product_urls(args.products)]
+    write_catalog(urls, workdir / 'catalog.csv')
+
+    downloader = IkeaImageDownloader(args.concurrency)
+    downloader.cache = ResponseCache(workdir / 'cache')
+    downloader.process_product = timed(downloader.process_product, latencies)
+    await downloader.download_all_images(str(workdir / 'catalog.csv'))
+    succeeded = sum(1 for product in downloader.products if product.local_image_path)
+    retries = downloader.engine.retries + downloader.scraper.image_engine.retries
+    return {'products': len(urls), 'succeeded': succeeded, 'retries': retries,
+            'final_rps': downloader.engine.governor.rate}
+
+
+async def run_screenshots(args, base_url: str, workdir: Path, latencies: List[float]) -> Dict:
+    from image_scraper import ImageScraper
+
+    urls = product_urls(args.products)
+    scraper = ImageScraper(str(workdir / 'images'), args.concurrency)
+    scraper.cache = ResponseCache(workdir / 'cache')
+    scraper._download_image = timed(scraper._download_image, latencies)
+    downloaded = await scraper.scrape_all_images(urls)
+    return {'products': len(urls), 'succeeded': len(downloaded), 'retries': scraper.firecrawl_engine.retries,
+            'final_rps': scraper.firecrawl_engine.governor.rate}
+
+
+SCENARIOS = {'stock': run_stock, 'images': run_images, 'screenshots': run_screenshots}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load-test the scrapers against a fake upstream')
+    parser.add_argument('scenario', choices=SCENARIOS)
+    parser.add_argument('--products', type=int, default=0, help='Products to process (default: the catalog)')
+    parser.add_argument('--backend', choices=['firecrawl', 'http'], default='firecrawl',
+                        help='Fetch backend for the stock scenario')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--rps', type=float, help='Starting requests/sec for the rate governors')
+    parser.add_argument('--max-rps', type=float, help='Upper bound for the rate governors')
+    parser.add_argument('--aimd-increase', type=float, help='Governor additive increase')
+    parser.add_argument('--aimd-decrease', type=float, help='Governor multiplicative decrease')
+    parser.add_argument('--output', type=Path, help='Also write the report as JSON')
+    parser.add_argument('--verbose', action='store_true', help='Show the scrapers\' own output')
+    fake_upstream.add_arguments(parser)
+    args = parser.parse_args()
+
+    for name in (FIRECRAWL, IKEA):
+        governor = get_governor(name)
+        if args.max_rps:
+            governor.max_rate = args.max_rps
+        if args.rps:
+            governor.set_rate(args.rps)
+        if args.aimd_increase:
+            governor.increase = args.aimd_increase
+        if args.aimd_decrease:
+            governor.decrease = args.aimd_decrease
+
+    server = fake_upstream.ServerThread(fake_upstream.from_arguments(args))
+    base_url = server.start()
+    # FirecrawlApp clients built inside the scrapers pick these up
+    os.environ['FIRECRAWL_API_URL'] = base_url
+    os.environ.setdefault('FIRECRAWL_API_KEY', 'fake-key')
+
+    workdir = Path(tempfile.mkdtemp(prefix='ikea-load-'))
+    os.chdir(workdir)
+    if not args.verbose:
+        logging.getLogger('download_ikea_image').setLevel(logging.WARNING)
+
+    latencies: List[float] = []
+    output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    start = time.perf_counter()
+    with output:
+        report = asyncio.run(SCENARIOS[args.scenario](args, base_url, workdir, latencies))
+    elapsed = time.perf_counter() - start
+    server.stop()
+    get_parse_stage().close()
+
+    report.update({
+        'scenario': args.scenario,
+        'backend': args.backend if args.scenario == 'stock' else None,
+        'concurrency': args.concurrency,
+        'elapsed_s': elapsed,
+        'products_per_min': report['products'] / elapsed * 60,
+        'latency_p50_ms': percentile(latencies, 50) * 1000 if latencies else None,
+        'latency_p99_ms': percentile(latencies, 99) * 1000 if latencies else None,
+        'server': server.upstream.summary(),
+        'upstream': {'latency': args.latency, 'throttle_rate': args.throttle_rate,
+                     'rate_limit': args.rate_limit, 'bandwidth_kbps': args.bandwidth_kbps},
+    })
+
+    print(f"{report['scenario']}: {report['succeeded']}/{report['products']} products in {elapsed:.1f}s "
+          f"({report['products_per_min']:.0f} products/min)")
+    if latencies:
+        print(f"latency p50 {report['latency_p50_ms']:.0f} ms, p99 {report['latency_p99_ms']:.0f} ms")
+    print(f"throttle retries: {report['retries']}, governor ended at {report['final_rps']:.2f} requests/sec")
+    print(f"server: {json.dumps(report['server'])}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,276 @@
+"""Offline benchmark suite for the hot paths of the scraper and web app.
+
+Runs against the fixtures in the repository (saved pages, the product CSVs,
+``stock_results.json`` and ``ikea_products.db``) without touching the
+network, and writes the timings as JSON so runs from different commits can
+be compared.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--repeat N] [--output PATH]
+    python benchmarks/run_benchmarks.py --compare benchmarks/results/<commit>.json
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from bench_parse import AVAILABILITY_BLOCK, HTML_FIXTURE, load_pages
+from csv_handler import CSVHandler
+from database import Database
+from fetch_engine import FetchEngine
+from fetchers import Fetcher
+from models import StockInfo
+from rate_governor import RateGovernor
+from stock_checker import StockChecker, load_stock_results
+from stock_history import StockHistory
+
+RESULTS_DIR = Path(__file__).resolve().parent / 'results'
+
+
+class FakeFetcher(Fetcher):
+    """Serves a saved page with an availability block for every URL after ``latency`` seconds"""
+
+    def __init__(self, page: str, latency: float, concurrency: int):
+        # An effectively unlimited governor: the sweep is bounded by concurrency and latency
+        governor = RateGovernor(rate=1e6, max_rate=1e6, burst=1e6)
+        super().__init__(FetchEngine(concurrency, governor))
+        self.page = page
+        self.latency = latency
+
+    async def _fetch(self, url: str) -> Optional[str]:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self.page
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(func: Callable[[], object], repeat: int, items: int = 1) -> Dict:
+    """Time ``repeat`` calls of ``func`` after one warm-up call"""
+    with contextlib.redirect_stdout(io.StringIO()), warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        func()
+        timings = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            timings.append(time.perf_counter() - start)
+    mean = statistics.mean(timings)
+    return {
+        'repeat': repeat,
+        'items': items,
+        'mean_s': mean,
+        'median_s': statistics.median(timings),
+        'min_s': min(timings),
+        'max_s': max(timings),
+        'stdev_s': statistics.stdev(timings) if len(timings) > 1 else 0.0,
+        'items_per_s': items / mean if mean else None,
+    }
+
+
+def bench_parse_stock_info(repeat: int) -> Dict:
+    pages = list(load_pages().values())
+    checker = StockChecker('offline', fetcher=FakeFetcher('', 0, 1))
+
+    def run():
+        for html in pages:
+            checker._parse_stock_info(html)
+    return measure(run, repeat, len(pages))
+
+
+def bench_csv_get_all_products(repeat: int) -> Dict:
+    # Served from the catalog loaded by the warm-up call
+    handler = CSVHandler(str(ROOT / 'ikea_products.csv'))
+    return measure(handler.get_all_products, repeat, len(handler.get_all_products()))
+
+
+def bench_csv_load_products(repeat: int) -> Dict:
+    handler = CSVHandler(str(ROOT / 'ikea_products.csv'))
+
+    def run():
+        # Parse the file and rebuild the indexes every run, as after the CSV changes
+        handler.catalog.invalidate()
+        handler.get_all_products()
+    return measure(run, repeat, len(handler.get_all_products()))
+
+
+def bench_csv_update_product_images(repeat: int) -> Dict:
+    path = Path(tempfile.mkdtemp()) / 'ikea_products.csv'
+    shutil.copy(ROOT / 'ikea_products.csv', path)
+    handler = CSVHandler(str(path))
+    urls = list(dict.fromkeys(handler.get_all_product_urls()))
+    runs = iter(range(1_000_000))
+
+    def run():
+        # New values every run, so the file is rewritten each time
+        n = next(runs)
+        handler.update_product_images({url: f"https://example.com/{n}/{i}.jpg" for i, url in enumerate(urls)})
+    return measure(run, repeat, len(urls))
+
+
+def bench_web_app_get_product_data(repeat: int) -> Dict:
+    # web_app reads its CSVs relative to the working directory
+    os.chdir(ROOT)
+    import web_app
+
+    # Serve stock from stock_results.json via a warm stock cache
+    web_app.get_stock_cache().set(load_stock_results(ROOT / 'stock_results.json') or {})
+    return measure(web_app.get_product_data, repeat, len(web_app.get_product_data()))
+
+
+def bench_snapshot_build_products(repeat: int) -> Dict:
+    from snapshot import build_products
+
+    stock_data = load_stock_results(ROOT / 'stock_results.json') or {}
+    prices_csv, images_csv = ROOT / 'ikea_products.csv', ROOT / 'ikea_products_with_images.csv'
+    return measure(lambda: build_products(prices_csv, images_csv, stock_data), repeat,
+                   len(build_products(prices_csv, images_csv, stock_data)))
+
+
+def bench_api_products_query(repeat: int) -> Dict:
+    os.chdir(ROOT)
+    import web_app
+
+    web_app.get_stock_cache().set(load_stock_results(ROOT / 'stock_results.json') or {})
+    client = web_app.app.test_client()
+    queries = ['/api/products', '/api/products?in_stock=Shatin,Warehouse&fields=name,stock',
+               '/api/products?store=Causeway%20Bay&min_qty=5&min_price=10&max_price=100&per_page=20']
+
+    def run():
+        for query in queries:
+            client.get(query)
+    return measure(run, repeat, len(queries))
+
+
+def bench_database_get_all_products(repeat: int) -> Dict:
+    # Served from the catalog loaded by the warm-up call
+    db = Database(str(ROOT / 'ikea_products.db'))
+    return measure(db.get_all_products, repeat, len(db.get_all_products()))
+
+
+def bench_database_load_products(repeat: int) -> Dict:
+    db = Database(str(ROOT / 'ikea_products.db'))
+
+    def run():
+        # Query the table and rebuild the indexes every run, as after a write
+        db.catalog.invalidate()
+        db.get_all_products()
+    return measure(run, repeat, len(db.get_all_products()))
+
+
+def bench_check_stock_sweep(repeat: int, latency: float, concurrency: int) -> Dict:
+    html = HTML_FIXTURE.read_text(encoding='utf-8')
+    middle = len(html) // 2
+    page = html[:middle] + AVAILABILITY_BLOCK + html[middle:]
+    handler = CSVHandler(str(ROOT / 'ikea_products.csv'))
+    products = len(dict.fromkeys(handler.get_all_product_urls()))
+    workdir = Path(tempfile.mkdtemp())
+    history = StockHistory(Database(str(workdir / 'history.db')))
+
+    def run():
+        checker = StockChecker('offline', fetcher=FakeFetcher(page, latency, concurrency))
+        checker.csv_handler = handler
+        checker.results_file = workdir / 'stock_results.json'
+        checker.journal.path = workdir / 'stock_results_partial.ndjson'
+        checker.history = history
+        results = asyncio.run(checker.check_stock())
+        assert all(isinstance(stock, StockInfo) for stock in results.values())
+
+    result = measure(run, repeat, products)
+    result.update(latency_s=latency, concurrency=concurrency)
+    return result
+
+
+def compare(current: Dict, baseline_path: Path):
+    """Print the change in mean time per case against an earlier results file"""
+    with open(baseline_path, 'r') as f:
+        baseline = json.load(f)
+    print(f"\nAgainst {baseline_path} ({baseline.get('commit') or 'unknown commit'}):")
+    for name, case in current['cases'].items():
+        before = baseline.get('cases', {}).get(name)
+        if not before:
+            print(f"  {name:32} (new)")
+            continue
+        change = (case['mean_s'] - before['mean_s']) / before['mean_s'] * 100
+        print(f"  {name:32} {before['mean_s'] * 1e3:10.2f} ms -> {case['mean_s'] * 1e3:10.2f} ms ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Offline benchmark suite')
+    parser.add_argument('--repeat', type=int, default=10, help='Timed runs per case')
+    parser.add_argument('--only', nargs='+', metavar='CASE', help='Run only these cases')
+    parser.add_argument('--latency-ms', type=float, default=20,
+                        help='Simulated fetch latency for the check_stock sweep')
+    parser.add_argument('--concurrency', type=int, default=8, help='Fetch concurrency for the sweep')
+    parser.add_argument('--output', type=Path,
+                        help='Where to write the JSON results (default: benchmarks/results/<commit>.json)')
+    parser.add_argument('--compare', type=Path, help='Earlier results file to compare against')
+    args = parser.parse_args()
+
+    cases = {
+        'parse_stock_info': lambda: bench_parse_stock_info(args.repeat),
+        'csv_get_all_products': lambda: bench_csv_get_all_products(args.repeat),
+        'csv_load_products': lambda: bench_csv_load_products(args.repeat),
+        'csv_update_product_images': lambda: bench_csv_update_product_images(args.repeat),
+        'web_app_get_product_data': lambda: bench_web_app_get_product_data(args.repeat),
+        'snapshot_build_products': lambda: bench_snapshot_build_products(args.repeat),
+        'api_products_query': lambda: bench_api_products_query(args.repeat),
+        'database_get_all_products': lambda: bench_database_get_all_products(args.repeat),
+        'database_load_products': lambda: bench_database_load_products(args.repeat),
+        'check_stock_sweep': lambda: bench_check_stock_sweep(max(1, args.repeat // 5),
+                                                             args.latency_ms / 1000, args.concurrency),
+    }
+    selected: List[str] = args.only or list(cases)
+    unknown = set(selected) - set(cases)
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(sorted(unknown))}")
+
+    commit = git_commit()
+    results = {
+        'commit': commit,
+        'timestamp': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'cases': {}
+    }
+    for name in selected:
+        case = cases[name]()
+        results['cases'][name] = case
+        print(f"{name:32} {case['mean_s'] * 1e3:10.2f} ms  "
+              f"({case['items']} items, {case['items_per_s']:,.0f} items/s)")
+
+    output = args.output or RESULTS_DIR / f"{commit or 'results'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=4)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,181 @@
+"""Load-test the web frontend: Flask (web_app) against ASGI (asgi_app).
+
+Starts each server in a subprocess on a free port, then keeps
+``--concurrency`` HTTP connections busy for ``--duration`` seconds, going
+through the page and API paths in turn. For each server it reports
+requests/sec and latency percentiles.
+
+``--rebuild-every`` bumps the mtime of the images CSV on a timer, which
+forces a catalog rebuild. That shows how a slow request (rebuild plus
+re-render) affects everyone else's latency.
+
+Usage:
+    python benchmarks/web_load_test.py --concurrency 32 --duration 10
+    python benchmarks/web_load_test.py --servers asgi --asgi-workers 4 --gzip --revalidate
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import aiohttp
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from load_test import percentile
+
+PATHS = [
+    '/',
+    '/api/products',
+    '/api/products?in_stock=Shatin,Warehouse&fields=name,stock',
+    '/api/products?store=Causeway%20Bay&min_qty=5&min_price=10&max_price=100&per_page=20',
+]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def server_command(server: str, port: int, args) -> List[str]:
+    if server == 'flask':
+        # Flask's own threaded server, as started by `python web_app.py` minus the debugger
+        return [sys.executable, '-m', 'flask', '--app', 'web_app', 'run', '--port', str(port), '--no-reload']
+    return [sys.executable, '-m', 'uvicorn', 'asgi_app:app', '--port', str(port),
+            '--workers', str(args.asgi_workers), '--no-access-log', '--log-level', 'warning']
+
+
+async def wait_ready(session: aiohttp.ClientSession, base_url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            async with session.get(base_url + '/') as response:
+                if response.status == 200:
+                    return
+        except aiohttp.ClientError:
+            pass
+        if time.monotonic() > deadline:
+            raise RuntimeError(f"Server at {base_url} did not come up")
+        await asyncio.sleep(0.2)
+
+
+async def rebuild_timer(interval: float, stop: asyncio.Event):
+    """Touch the images CSV every ``interval`` seconds so the servers rebuild their snapshot"""
+    path = ROOT / 'ikea_products_with_images.csv'
+    while not stop.is_set():
+        try:
+            await asyncio.wait_for(stop.wait(), interval)
+        except asyncio.TimeoutError:
+            os.utime(path)
+
+
+async def run_load(base_url: str, args) -> Dict:
+    headers = {'Accept-Encoding': 'gzip' if args.gzip else 'identity'}
+    latencies: List[float] = []
+    statuses: Dict[int, int] = {}
+    errors = 0
+    etags: Dict[str, str] = {}
+    stop = asyncio.Event()
+
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(base_url, connector=connector, auto_decompress=False) as session:
+        await wait_ready(session, base_url)
+        for path in PATHS:
+            async with session.get(path, headers=headers) as response:
+                await response.read()
+                etags[path] = response.headers.get('ETag', '')
+
+        async def worker(offset: int):
+            nonlocal errors
+            i = offset
+            while not stop.is_set():
+                path = PATHS[i % len(PATHS)]
+                i += 1
+                request_headers = dict(headers)
+                if args.revalidate and etags[path]:
+                    request_headers['If-None-Match'] = etags[path]
+                start = time.perf_counter()
+                try:
+                    async with session.get(path, headers=request_headers) as response:
+                        await response.read()
+                        statuses[response.status] = statuses.get(response.status, 0) + 1
+                        if response.status == 200:
+                            etags[path] = response.headers.get('ETag', '')
+                except aiohttp.ClientError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+
+        tasks = [asyncio.create_task(worker(n)) for n in range(args.concurrency)]
+        if args.rebuild_every:
+            tasks.append(asyncio.create_task(rebuild_timer(args.rebuild_every, stop)))
+        start = time.perf_counter()
+        await asyncio.sleep(args.duration)
+        stop.set()
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - start
+
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'statuses': statuses,
+        'elapsed_s': elapsed,
+        'requests_per_s': len(latencies) / elapsed,
+        'latency_p50_ms': percentile(latencies, 50) * 1000 if latencies else None,
+        'latency_p99_ms': percentile(latencies, 99) * 1000 if latencies else None,
+        'latency_max_ms': max(latencies) * 1000 if latencies else None,
+    }
+
+
+def bench_server(server: str, args) -> Dict:
+    port = free_port()
+    env = dict(os.environ, STOCK_CACHE_BACKEND='local')
+    process = subprocess.Popen(server_command(server, port, args), cwd=ROOT, env=env,
+                               stdout=subprocess.DEVNULL, stderr=None if args.verbose else subprocess.DEVNULL)
+    try:
+        return asyncio.run(run_load(f"http://127.0.0.1:{port}", args))
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare Flask and ASGI serving throughput')
+    parser.add_argument('--servers', nargs='+', choices=['flask', 'asgi'], default=['flask', 'asgi'])
+    parser.add_argument('--concurrency', type=int, default=32, help='Concurrent client connections')
+    parser.add_argument('--duration', type=float, default=10, help='Seconds of load per server')
+    parser.add_argument('--asgi-workers', type=int, default=1, help='uvicorn worker processes')
+    parser.add_argument('--gzip', action='store_true', help='Ask for gzip responses')
+    parser.add_argument('--revalidate', action='store_true',
+                        help='Send If-None-Match with the last ETag seen (mostly 304s)')
+    parser.add_argument('--rebuild-every', type=float,
+                        help='Force a catalog rebuild every N seconds during the run')
+    parser.add_argument('--output', type=Path, help='Also write the results as JSON')
+    parser.add_argument('--verbose', action='store_true', help='Show server logs')
+    args = parser.parse_args()
+
+    results = {}
+    for server in args.servers:
+        report = bench_server(server, args)
+        results[server] = report
+        print(f"{server:6} {report['requests_per_s']:9.0f} requests/s  "
+              f"p50 {report['latency_p50_ms']:7.1f} ms  p99 {report['latency_p99_ms']:7.1f} ms  "
+              f"max {report['latency_max_ms']:7.1f} ms  ({report['requests']} requests, "
+              f"{report['errors']} errors, statuses {report['statuses']})")
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({'args': {key: str(value) for key, value in vars(args).items()}, 'results': results},
+                      f, indent=4)
+
+
+if __name__ == '__main__':
+    main()
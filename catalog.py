@@ -0,0 +1,103 @@
+"""Product catalog loaded once per version of its source file, with hash indexes.
+
+``CSVHandler`` and ``Database`` read products through a Catalog: the
+products are loaded on first use and looked up by product URL or article
+number in O(1). A lookup checks the source file's size and mtime (one
+``stat`` per file) and reloads when they changed, so edits by other
+processes are picked up.
+"""
+import os
+import threading
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, Union
+
+from models import Product, article_number
+
+# (mtime_ns, size) per source file, None for a missing file
+Signature = Tuple[Optional[Tuple[int, int]], ...]
+
+
+def file_signature(paths: Sequence[Path]) -> Signature:
+    signature = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        except OSError:
+            signature.append(None)
+    return tuple(signature)
+
+
+class Catalog:
+    """Products from ``load()``, indexed by URL and article number.
+
+    ``paths`` are the files ``load`` reads; the catalog reloads when any of
+    them changes, or after ``invalidate()``. The Product objects are shared
+    between callers and must not be modified.
+    """
+
+    def __init__(self, load: Callable[[], List[Product]], paths: Sequence[Union[str, Path]]):
+        self._load = load
+        self.paths = [Path(path) for path in paths]
+        self._signature: Optional[Signature] = None
+        self._products: List[Product] = []
+        self._by_url: Dict[str, Product] = {}
+        self._by_article: Dict[str, Product] = {}
+        self._lock = threading.Lock()
+
+    def _current(self) -> Tuple[List[Product], Dict[str, Product], Dict[str, Product]]:
+        signature = file_signature(self.paths)
+        if signature == self._signature:
+            return self._products, self._by_url, self._by_article
+        with self._lock:
+            if signature != self._signature:
+                products = self._load()
+                by_url: Dict[str, Product] = {}
+                by_article: Dict[str, Product] = {}
+                # The first listing of a product wins, as with a scan of the file
+                for product in products:
+                    by_url.setdefault(product.url, product)
+                    article = article_number(product.url)
+                    if article:
+                        by_article.setdefault(article, product)
+                self._products, self._by_url, self._by_article = products, by_url, by_article
+                self._signature = signature
+            return self._products, self._by_url, self._by_article
+
+    def invalidate(self):
+        """Reload on the next lookup, e.g. after writing the source file"""
+        with self._lock:
+            self._signature = None
+
+    def products(self) -> List[Product]:
+        """All products in source order, including repeated listings"""
+        return list(self._current()[0])
+
+    def urls(self) -> List[str]:
+        """Product URLs in source order, including repeats"""
+        return [product.url for product in self._current()[0] if product.url]
+
+    def by_url(self, url: str) -> Optional[Product]:
+        return self._current()[1].get(url)
+
+    def by_article(self, article: str) -> Optional[Product]:
+        """Product with an article number (e.g. '20477181', from the URL's -art- suffix)"""
+        return self._current()[2].get(article)
+
+    def __len__(self) -> int:
+        return len(self._current()[0])
+
+
+# Catalogs shared by every reader of the same file in this process
+_catalogs: Dict[str, Catalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(path: Union[str, Path], load: Callable[[], List[Product]]) -> Catalog:
+    """The process-wide catalog of ``path``, created with ``load`` on first use"""
+    key = str(Path(path).resolve())
+    with _catalogs_lock:
+        catalog = _catalogs.get(key)
+        if catalog is None:
+            catalog = _catalogs[key] = Catalog(load, [path])
+        return catalog
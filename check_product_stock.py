@@ -1,156 +1,75 @@
-import pandas as pd
-from firecrawl import FirecrawlApp
 import duckdb
 from pprint import pprint
-import time
 from pathlib import Path
-import shutil
-import tempfile
-import json
 import asyncio
-from typing import List, Dict
-import aiohttp
-import re
-from config import FIRECRAWL_API_KEY
+from typing import List, Dict, Optional
+from config import (
+    DB_PATH, FIRECRAWL_API_KEY, MAX_CONCURRENCY, FETCH_BACKEND, PARTIAL_RESULTS_FILE, STOCK_RESULTS_FILE
+)
+from database import get_database
+from fetchers import Fetcher, create_fetcher
+from checkpoint import CheckpointJournal
+from stock_parser import parse_availability
+from parse_pool import get_parse_stage
 
 api_key = FIRECRAWL_API_KEY
 
-def parse_stock_info(result: dict) -> dict:
-    """Parse stock information from the scraping result"""
-    stock_info = {}
-    
-    # Extract stock information using the HTML content
-    if 'html' in result:
-        html = result['html']
-        
-        # Debug: Print a section of HTML containing stock info
-        if 'status status--green' in html:
-            start_idx = html.find('status status--green')
-            print("\nDebug - HTML section with stock info:")
-            print(html[start_idx:start_idx + 500])
-        
-        # Look for stock status divs with the specific format
-        stores = ['Warehouse', 'Causeway Bay', 'Kowloon Bay', 'Macau Taipa', 'Shatin', 'Tsuen Wan']
-        for store in stores:
-            # Pattern to match stock information in different formats
-            patterns = [
-                f'In stock at\\s*{store}\\s*([0-9,]+)\\s*in stock',  # Format: "In stock at Store X in stock"
-                f'{store}[^0-9]*([0-9,]+)\\s*in stock',  # Format: "Store X in stock"
-                f'status__label[^>]*>[^>]*{store}[^0-9]*([0-9,]+)\\s*in stock'  # Format in status label
-            ]
-            
-            for pattern in patterns:
-                match = re.search(pattern, html, re.IGNORECASE)
-                if match:
-                    try:
-                        qty_str = match.group(1).replace(',', '')  # Remove commas from numbers
-                        qty = int(qty_str)
-                        stock_info[store] = qty
-                        break  # Found a match, no need to try other patterns
-                    except (ValueError, IndexError) as e:
-                        print(f"Error parsing quantity for {store}: {e}")
-            
-            if store not in stock_info:
-                stock_info[store] = 0
-    
-    return stock_info
-
-async def exponential_backoff(attempt: int, max_attempts: int = 5):
-    """Implement exponential backoff for rate limiting"""
-    if attempt >= max_attempts:
-        raise Exception("Max retry attempts reached")
-    wait_time = min(300, (2 ** attempt))  # Cap at 300 seconds
-    print(f"Rate limited. Waiting {wait_time} seconds before retry...")
-    await asyncio.sleep(wait_time)
+def get_product_urls() -> List[str]:
+    db_path = Path(DB_PATH)
 
-def get_product_urls(max_retries=3, delay=1) -> List[str]:
-    db_path = Path('ikea_products.db')
-    
     if not db_path.exists():
         print(f"Database file {db_path} not found")
         return []
 
-    # Create a temporary copy of the database
-    with tempfile.NamedTemporaryFile(suffix='.db', delete=False) as temp_db:
-        try:
-            # Copy the database to a temporary file
-            shutil.copy2(db_path, temp_db.name)
-            
-            # Connect to the temporary database copy
-            with duckdb.connect(temp_db.name, read_only=True) as conn:
-                try:
-                    result = conn.execute("SELECT DISTINCT product_url FROM ikea_products").fetchall()
-                    urls = [row[0] for row in result]
-                    return urls
-                except duckdb.Error as e:
-                    print(f"Error querying database: {e}")
-                    return []
-                
-        except (IOError, duckdb.Error) as e:
-            print(f"Error accessing database: {e}")
-            return []
-        finally:
-            # Clean up temporary file
-            try:
-                Path(temp_db.name).unlink()
-            except:
-                pass
+    # Read in place through the shared connection; no copy of the file
+    try:
+        return get_database(str(db_path)).get_all_product_urls()
+    except duckdb.Error as e:
+        print(f"Error accessing database: {e}")
+        return []
 
-async def scrape_product(app: FirecrawlApp, url: str, attempt: int = 0) -> Dict:
-    """Scrape a single URL with retry logic"""
+async def scrape_product(fetcher: Fetcher, url: str) -> Optional[str]:
+    """Fetch a single product page; throttled attempts are retried by the fetch engine"""
     print(f"\nScraping: {url}")
     try:
-        # Scrape URL and get result directly
-        result = app.scrape_url(url, params={'formats': ['markdown', 'html']})
-        if result:
-            return result
+        body = await fetcher.fetch(url)
+        if body is not None:
+            return body
         else:
             print(f"Failed to scrape {url}")
             return None
     except Exception as e:
-        if "429" in str(e) and attempt < 5:  # Rate limit error
-            await exponential_backoff(attempt)
-            return await scrape_product(app, url, attempt + 1)
         print(f"Error scraping {url}: {str(e)}")
         return None
 
-async def process_urls(urls: List[str], batch_size: int = 2) -> Dict:
-    """Process URLs in batches with smaller batch size and longer delay"""
+async def process_urls(urls: List[str], concurrency: int = MAX_CONCURRENCY,
+                       backend: str = FETCH_BACKEND) -> Dict:
+    """Process URLs with bounded concurrency under the shared rate governor"""
     results = {}
-    app = FirecrawlApp(api_key=api_key)
+    fetcher = create_fetcher(backend, api_key, concurrency)
+    journal = CheckpointJournal(PARTIAL_RESULTS_FILE)
+    journal.reset()
     total_urls = len(urls)
     
-    # Process URLs in batches
-    for i in range(0, total_urls, batch_size):
-        batch = urls[i:i + batch_size]
-        print(f"\nProgress: {i}/{total_urls} URLs processed ({(i/total_urls)*100:.1f}%)")
-        
-        # Create tasks for concurrent processing
-        tasks = []
-        for url in batch:
-            # Add longer delay between requests
-            await asyncio.sleep(2)
-            tasks.append(asyncio.create_task(scrape_product(app, url)))
-        
-        # Wait for all tasks in batch to complete
-        batch_results = await asyncio.gather(*tasks)
-        
-        # Process results
-        for url, result in zip(batch, batch_results):
-            if result:
-                stock_info = parse_stock_info(result)
-                if stock_info:  # Only store if we found stock information
-                    results[url] = stock_info
-                    print(f"\nStock information for {url}:")
-                    pprint(stock_info)
-                    
-                    # Save results after each successful scrape
-                    with open('stock_results_partial.json', 'w') as f:
-                        json.dump(results, f, indent=4)
-        
-        # Add delay between batches
-        await asyncio.sleep(3)
+    processed = 0
+    fetched = fetcher.engine.map(lambda url: scrape_product(fetcher, url), urls)
+    try:
+        async for url, stock_info in get_parse_stage().map(parse_availability, fetched):
+            processed += 1
+            if stock_info is not None:
+                results[url] = stock_info
+                print(f"\nStock information for {url}:")
+                pprint(stock_info)
+                
+                # Checkpoint after each successful scrape
+                journal.append(url, stock_info)
+            
+            print(f"\nProgress: {processed}/{total_urls} URLs processed ({(processed/total_urls)*100:.1f}%)")
+    finally:
+        journal.close()
+        await fetcher.close()
     
+    journal.compact(STOCK_RESULTS_FILE)
     return results
 
 async def main():
@@ -163,18 +82,14 @@ async def main():
         return
     
     try:
-        # Process URLs and get results
+        # Process URLs; the checkpoint journal is compacted into the final results
         results = await process_urls(urls)
-        
-        # Save final results
-        with open('stock_results.json', 'w') as f:
-            json.dump(results, f, indent=4)
-        print("\nResults saved to stock_results.json")
+        print(f"\nResults saved to {STOCK_RESULTS_FILE}")
         
     except KeyboardInterrupt:
         print("\nScript interrupted by user. Saving partial results...")
-        # Final results should already be saved in stock_results_partial.json
-        print("Partial results saved in stock_results_partial.json")
+        # Checked products are already journaled in the partial results file
+        print(f"Partial results saved in {PARTIAL_RESULTS_FILE}")
         raise
 
 if __name__ == "__main__":
@@ -0,0 +1,92 @@
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Union
+
+from config import CHECKPOINT_FLUSH_EVERY
+
+
+class CheckpointJournal:
+    """Append-only NDJSON journal of per-product stock results.
+
+    Each checked product adds one line; lines are buffered and written in
+    batches of ``flush_every``, so a sweep costs I/O linear in its size. At the
+    end of a sweep the journal is compacted into the usual results snapshot.
+    """
+
+    def __init__(self, path: Union[str, Path], flush_every: int = CHECKPOINT_FLUSH_EVERY):
+        self.path = Path(path)
+        self.flush_every = flush_every
+        self._buffer: List[str] = []
+        self._file = None
+
+    def append(self, url: str, stock: Dict[str, int], checked_at: Optional[datetime] = None):
+        """Record the stock for one product"""
+        record = {
+            'url': url,
+            'checked_at': (checked_at or datetime.now()).isoformat(),
+            'stock': stock
+        }
+        self._buffer.append(json.dumps(record, separators=(',', ':')) + '\n')
+        if len(self._buffer) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        """Write buffered records and push them to disk"""
+        if not self._buffer:
+            return
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+        self._file.write(''.join(self._buffer))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._buffer.clear()
+
+    def close(self):
+        """Flush and close the journal file"""
+        self.flush()
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def reset(self):
+        """Discard all journaled records"""
+        self.close()
+        self.path.unlink(missing_ok=True)
+
+    def records(self) -> Iterator[Dict]:
+        """Iterate over journaled records, skipping a torn final line"""
+        self.flush()
+        if not self.path.exists():
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+    def load(self) -> Dict[str, Dict]:
+        """Latest record per URL"""
+        return {record['url']: record for record in self.records()}
+
+    def compact(self, snapshot_path: Union[str, Path]) -> Dict[str, Dict[str, int]]:
+        """Fold the journal into a results snapshot and remove the journal.
+
+        The snapshot keeps when each product was checked (``checked_at``), so
+        results carried over by a resumed sweep keep their original age.
+        """
+        records = self.load()
+        results = {url: record['stock'] for url, record in records.items()}
+        snapshot_path = Path(snapshot_path)
+        tmp_path = snapshot_path.with_name(snapshot_path.name + '.tmp')
+        with open(tmp_path, 'w') as f:
+            json.dump({
+                'timestamp': datetime.now().isoformat(),
+                'results': results,
+                'checked_at': {url: record['checked_at'] for url, record in records.items()}
+            }, f, indent=4)
+        os.replace(tmp_path, snapshot_path)
+        self.reset()
+        return results
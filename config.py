@@ -14,13 +14,56 @@ DB_PATH = "ikea_products.db"
 BASE_DIR = Path(__file__).parent
 PRODUCT_IMAGES_DIR = BASE_DIR / "product_images"
 STOCK_RESULTS_FILE = BASE_DIR / "stock_results.json"
-PARTIAL_RESULTS_FILE = BASE_DIR / "stock_results_partial.json"
+PARTIAL_RESULTS_FILE = BASE_DIR / "stock_results_partial.ndjson"
 
 # Scraping Configuration
-BATCH_SIZE = 2
+MAX_CONCURRENCY = 4  # requests in flight at once
 MAX_RETRIES = 5
-RATE_LIMIT_DELAY = 2  # seconds
-BATCH_DELAY = 3  # seconds
+FETCH_TIMEOUT_SECONDS = 60  # whole-request limit; a timeout counts as a throttle
+
+# Adaptive (AIMD) rate control, shared per upstream provider
+REQUESTS_PER_SECOND = 0.5  # starting rate
+MIN_REQUESTS_PER_SECOND = 0.05
+MAX_REQUESTS_PER_SECOND = 20
+RATE_BURST = 1  # token bucket capacity
+AIMD_INCREASE = 0.05  # requests/sec gained per second of successful traffic
+AIMD_DECREASE = 0.5  # rate multiplier on a 429 or timeout
+
+# Fetching
+FETCH_BACKEND = 'firecrawl'  # firecrawl, http (aiohttp straight to IKEA) or replay
+REPLAY_DIR = BASE_DIR / "recorded_pages"  # pages served by the replay backend
+
+# Response cache shared by every fetcher
+RESPONSE_CACHE_DIR = BASE_DIR / ".cache" / "responses"
+RESPONSE_CACHE_MAX_BYTES = 256 * 1024 * 1024
+STOCK_PAGE_TTL = 15 * 60  # seconds a cached page is good for a stock check
+IMAGE_PAGE_TTL = 7 * 24 * 3600  # seconds a cached page is good for image lookups
+
+# Parsing
+PARSE_WORKERS = os.cpu_count() or 1  # processes parsing fetched pages
+PARSE_BACKLOG = 2 * PARSE_WORKERS  # fetched bodies queued for the parse pool
+
+# Checkpointing
+CHECKPOINT_FLUSH_EVERY = 20  # journal records buffered before each write
+RESUME_MAX_AGE_HOURS = 4  # checks newer than this are skipped on resume
+
+# Metrics
+METRICS_TEXTFILE = os.getenv('METRICS_TEXTFILE')  # where batch runs write Prometheus metrics
+
+# Web app
+STOCK_CACHE_TTL_HOURS = 4  # age at which served stock data is refreshed
+STOCK_REFRESH_RETRY_SECONDS = 60  # wait after a failed refresh before trying again
+STOCK_CACHE_BACKEND = os.getenv('STOCK_CACHE_BACKEND', 'shared')  # local (per process) or shared (per host)
+SHARED_STOCK_CACHE = BASE_DIR / ".cache" / "stock_cache.sqlite"  # snapshot shared by web workers
+STOCK_CACHE_POLL_SECONDS = 5  # how often a worker checks for a newer shared snapshot
+STOCK_REFRESH_LEASE_SECONDS = 300  # a worker's claim on refreshing the shared snapshot
+API_PAGE_SIZE = 50  # products per page of the JSON API by default
+API_MAX_PAGE_SIZE = 500
+RENDER_CACHE_ENTRIES = 256  # rendered responses kept per snapshot version
+STOCK_EVENTS_HISTORY = 32  # stock change events kept for reconnecting subscribers
+STOCK_EVENTS_KEEPALIVE_SECONDS = 15  # idle time before an event stream sends a keepalive
+INDEX_RENDER_MODE = os.getenv('INDEX_RENDER_MODE', 'cached')  # cached (whole page per snapshot) or stream (rows in chunks)
+INDEX_STREAM_ROWS = 200  # product rows per chunk of a streamed index page
 
 # Store Names
 STORES = [
@@ -1,12 +1,21 @@
 import csv
+import decimal
+import os
 from typing import List, Dict, Optional
 from pathlib import Path
 from models import Product
 from decimal import Decimal
+from catalog import Catalog, get_catalog
+
+# Columns holding a product's downloaded image URL, as written by the image downloaders and by older
+# versions. Products read from the file always get the image URL generated from their article number.
+IMAGE_URL_COLUMNS = ('Image URL', 'Image')
 
 class CSVHandler:
     def __init__(self, csv_path: str = 'ikea_products.csv'):
         self.csv_path = csv_path
+        # Parsed once and shared by every handler of this file; reloaded when the file changes
+        self.catalog: Catalog = get_catalog(csv_path, self._read_products)
 
     def _parse_price(self, price_str: str) -> Optional[Decimal]:
         """Parse price string to Decimal, handling various formats"""
@@ -31,8 +40,8 @@ class CSVHandler:
         except IndexError:
             return ""
 
-    def get_all_products(self) -> List[Product]:
-        """Get all products from the CSV file"""
+    def _read_products(self) -> List[Product]:
+        """Parse every product in the CSV file"""
         products = []
         try:
             with open(self.csv_path, 'r', encoding='utf-8') as f:
@@ -55,61 +64,67 @@ class CSVHandler:
             print(f"Error reading CSV file: {e}")
         return products
 
+    def get_all_products(self) -> List[Product]:
+        """Get all products from the CSV file"""
+        return self.catalog.products()
+
     def get_all_product_urls(self) -> List[str]:
         """Get all product URLs from the CSV file"""
-        urls = []
-        try:
-            with open(self.csv_path, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                urls = [row['Product URL'] for row in reader if row.get('Product URL')]
-        except Exception as e:
-            print(f"Error reading CSV file: {e}")
-        return urls
+        return self.catalog.urls()
 
     def get_product_by_url(self, url: str) -> Optional[Product]:
         """Get a specific product by its URL"""
-        try:
-            with open(self.csv_path, 'r', encoding='utf-8') as f:
-                reader = csv.DictReader(f)
-                for row in reader:
-                    if row.get('Product URL') == url:
-                        price = self._parse_price(row.get('Price', ''))
-                        image_url = self._get_image_url(url)
-                        return Product(
-                            name=row.get('Product Name', ''),
-                            url=row.get('Product URL', ''),
-                            description=row.get('Description', ''),
-                            image_url=image_url,
-                            price=price
-                        )
-        except Exception as e:
-            print(f"Error reading CSV file: {e}")
-        return None
+        return self.catalog.by_url(url)
+
+    def get_product_by_article_number(self, article: str) -> Optional[Product]:
+        """Get a specific product by its article number"""
+        return self.catalog.by_article(article)
 
     def update_product_image(self, url: str, new_image_url: str) -> bool:
         """Update the image URL for a specific product"""
-        products = self.get_all_products()
-        updated = False
-        
+        return self.update_product_images({url: new_image_url}) > 0
+
+    def update_product_images(self, images: Dict[str, str], column: Optional[str] = None) -> int:
+        """Set the image of every product in ``images`` (product URL -> image) in one rewrite of the file.
+
+        Every other column and the header are kept as they are. The new file is
+        written next to the old one and swapped in with ``os.replace``, so
+        readers see either the old catalog or the new one. ``column`` defaults
+        to the file's image URL column. Returns the number of rows matched.
+        """
+        if not images:
+            return 0
+        path = Path(self.csv_path)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
         try:
-            with open(self.csv_path, 'w', encoding='utf-8', newline='') as f:
-                writer = csv.DictWriter(f, fieldnames=['Product Name', 'Product URL', 'Description', 'Image', 'Price'])
-                writer.writeheader()
-                
-                for product in products:
-                    if product.url == url:
-                        product.image_url = new_image_url
-                        updated = True
-                    
-                    writer.writerow({
-                        'Product Name': product.name,
-                        'Product URL': product.url,
-                        'Description': product.description,
-                        'Image': product.image_url,
-                        'Price': str(product.price) if product.price else ''
-                    })
-                
-            return updated
+            with open(path, 'r', encoding='utf-8', newline='') as f:
+                reader = csv.DictReader(f)
+                fieldnames = list(reader.fieldnames or [])
+                rows = list(reader)
+            if column is None:
+                column = next((name for name in IMAGE_URL_COLUMNS if name in fieldnames), IMAGE_URL_COLUMNS[0])
+            if column not in fieldnames:
+                fieldnames.append(column)
+
+            matched = changed = 0
+            for row in rows:
+                image = images.get(row.get('Product URL'))
+                if image is None:
+                    continue
+                matched += 1
+                if row.get(column) != image:
+                    row[column] = image
+                    changed += 1
+
+            if changed:
+                with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+                    writer = csv.DictWriter(f, fieldnames=fieldnames)
+                    writer.writeheader()
+                    writer.writerows(rows)
+                os.replace(tmp_path, path)
+                self.catalog.invalidate()
+            return matched
         except Exception as e:
             print(f"Error updating CSV file: {e}")
-            return False
+            tmp_path.unlink(missing_ok=True)
+            return 0
@@ -1,52 +1,53 @@
 import duckdb
+import pyarrow as pa
 import time
-import shutil
+import threading
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, Iterator, List, Optional
 from models import Product
 from decimal import Decimal
-import tempfile
 import atexit
-import os
+from catalog import Catalog
+from config import DB_PATH
 
 class Database:
-    def __init__(self, db_path: str = 'ikea_products.db'):
-        self.original_db_path = db_path
-        self.working_db_path = self._create_working_copy(db_path)
-        self._ensure_db_exists()
-        # Register cleanup on program exit
-        atexit.register(self._cleanup)
-
-    def _create_working_copy(self, original_path: str) -> str:
-        """Create a working copy of the database in a temporary directory"""
-        temp_dir = tempfile.mkdtemp()
-        working_path = os.path.join(temp_dir, 'working_ikea_products.db')
-        
-        if os.path.exists(original_path):
-            try:
-                shutil.copy2(original_path, working_path)
-            except Exception as e:
-                print(f"Warning: Could not copy original database: {e}")
-        
-        return working_path
-
-    def _cleanup(self):
-        """Clean up temporary files"""
-        try:
-            if os.path.exists(self.working_db_path):
-                os.remove(self.working_db_path)
-            temp_dir = os.path.dirname(self.working_db_path)
-            if os.path.exists(temp_dir):
-                os.rmdir(temp_dir)
-        except Exception as e:
-            print(f"Warning: Could not clean up temporary files: {e}")
+    """The DuckDB product database, read and written in place.
+
+    One connection is kept open for the life of the object and each thread
+    queries through its own cursor on it. Writes run in transactions, so
+    opening the database and running a query cost the same whatever the size
+    of the file. Products are read through a Catalog of the ``ikea_products``
+    table, reloaded after writes and when the file changes.
+
+    A read-only database takes write access only for the duration of a
+    write (see ``writable``), so DuckDB's exclusive file lock is not held
+    while the process is only reading.
+    """
+
+    def __init__(self, db_path: str = DB_PATH, read_only: bool = False):
+        self.db_path = str(db_path)
+        self.read_only = read_only
+        self._local = threading.local()
+        self._cursors: List[duckdb.DuckDBPyConnection] = []
+        self._lock = threading.Lock()
+        self._conn: Optional[duckdb.DuckDBPyConnection] = None
+        # Bumped on every reopen, so threads drop cursors of the old connection
+        self._generation = 0
+        if read_only and not Path(self.db_path).exists():
+            # DuckDB cannot open a missing file read-only
+            self.reopen(read_only=False)
+        self.reopen(read_only)
+        # DuckDB writes go to the write-ahead log first, so watch it as well as the file
+        self.catalog = Catalog(self._read_products, [self.db_path, f"{self.db_path}.wal"])
+        # Close the connection (and checkpoint the WAL) on program exit
+        atexit.register(self.close)
 
     def _connect_with_retry(self, read_only: bool = False, max_retries: int = 3) -> duckdb.DuckDBPyConnection:
-        """Connect to database with retry logic"""
+        """Connect to database with retry logic (another process may hold the write lock)"""
         for attempt in range(max_retries):
             try:
-                conn = duckdb.connect(self.working_db_path, read_only=read_only)
-                return conn
+                return duckdb.connect(self.db_path, read_only=read_only)
             except duckdb.IOException as e:
                 if attempt < max_retries - 1:
                     print(f"Database connection failed, retrying in {2 ** attempt} seconds...")
@@ -54,11 +55,75 @@ class Database:
                 else:
                     raise
 
+    def cursor(self) -> duckdb.DuckDBPyConnection:
+        """This thread's cursor on the shared connection"""
+        cursor = getattr(self._local, 'cursor', None)
+        if cursor is None or self._local.generation != self._generation:
+            with self._lock:
+                cursor = self._conn.cursor()
+                self._cursors.append(cursor)
+            self._local.cursor = cursor
+            self._local.generation = self._generation
+        return cursor
+
+    def reopen(self, read_only: bool):
+        """Close the connection and open the file again, read-only or for writing.
+
+        Cursors handed out before are closed, so no other thread may be
+        querying meanwhile.
+        """
+        self.close()
+        conn = self._connect_with_retry(read_only=read_only)
+        with self._lock:
+            self._conn = conn
+            self._generation += 1
+        self.read_only = read_only
+        if not read_only:
+            self._ensure_db_exists()
+
+    @contextmanager
+    def writable(self) -> Iterator['Database']:
+        """Write access for the ``with`` block.
+
+        A read-only database is reopened for writing and goes back to
+        read-only afterwards, releasing DuckDB's exclusive lock.
+        """
+        if not self.read_only:
+            yield self
+            return
+        self.reopen(read_only=False)
+        try:
+            yield self
+        finally:
+            self.reopen(read_only=True)
+
+    @contextmanager
+    def transaction(self) -> Iterator[duckdb.DuckDBPyConnection]:
+        """This thread's cursor inside a transaction, committed on success and rolled back on error"""
+        cursor = self.cursor()
+        cursor.begin()
+        try:
+            yield cursor
+        except BaseException:
+            cursor.rollback()
+            raise
+        cursor.commit()
+
+    def close(self):
+        """Close every cursor and the connection"""
+        with self._lock:
+            cursors, self._cursors = self._cursors, []
+            conn, self._conn = self._conn, None
+        for cursor in cursors:
+            cursor.close()
+        if conn is not None:
+            conn.close()
+
     def _ensure_db_exists(self):
         """Ensure database exists and has correct schema"""
         try:
-            with self._connect_with_retry() as conn:
-                conn.execute("""
+            with self.transaction() as cursor:
+                cursor.execute("""
                     CREATE TABLE IF NOT EXISTS ikea_products (
                         product_name VARCHAR,
                         product_url VARCHAR,
@@ -71,81 +136,112 @@ class Database:
             print(f"Error initializing database: {e}")
             raise
 
-    def get_all_product_urls(self) -> List[str]:
-        """Get all product URLs from the database"""
+    def _read_products(self) -> List[Product]:
+        """Load every product from the ikea_products table"""
         try:
-            with self._connect_with_retry(read_only=True) as conn:
-                result = conn.execute("SELECT DISTINCT product_url FROM ikea_products").fetchall()
-                return [row[0] for row in result]
+            result = self.cursor().execute("""
+                SELECT product_name, product_url, description, image_url, price
+                FROM ikea_products
+            """).fetchall()
+
+            return [
+                Product(
+                    name=row[0],
+                    url=row[1],
+                    description=row[2],
+                    image_url=row[3],
+                    price=Decimal(str(row[4])) if row[4] is not None else None
+                )
+                for row in result
+            ]
         except Exception as e:
-            print(f"Error getting product URLs: {e}")
+            print(f"Error getting products: {e}")
             return []
 
+    def get_all_product_urls(self) -> List[str]:
+        """Get all product URLs from the database"""
+        return list(dict.fromkeys(self.catalog.urls()))
+
     def get_all_products(self) -> List[Product]:
         """Get all products from the database"""
-        try:
-            with self._connect_with_retry(read_only=True) as conn:
-                result = conn.execute("""
-                    SELECT product_name, product_url, description, image_url, price 
-                    FROM ikea_products
-                """).fetchall()
-                
-                return [
-                    Product(
-                        name=row[0],
-                        url=row[1],
-                        description=row[2],
-                        image_url=row[3],
-                        price=Decimal(str(row[4])) if row[4] is not None else None
-                    )
-                    for row in result
-                ]
-        except Exception as e:
-            print(f"Error getting products: {e}")
-            return []
+        return self.catalog.products()
 
     def get_product_by_url(self, url: str) -> Optional[Product]:
         """Get a specific product by its URL"""
-        try:
-            with self._connect_with_retry(read_only=True) as conn:
-                result = conn.execute("""
-                    SELECT product_name, product_url, description, image_url, price 
-                    FROM ikea_products 
-                    WHERE product_url = ?
-                """, [url]).fetchone()
-                
-                if result:
-                    return Product(
-                        name=result[0],
-                        url=result[1],
-                        description=result[2],
-                        image_url=result[3],
-                        price=Decimal(str(result[4])) if result[4] is not None else None
-                    )
-                return None
-        except Exception as e:
-            print(f"Error getting product by URL: {e}")
-            return None
+        return self.catalog.by_url(url)
+
+    def get_product_by_article_number(self, article: str) -> Optional[Product]:
+        """Get a specific product by its article number"""
+        return self.catalog.by_article(article)
 
     def update_product_image(self, url: str, new_image_url: str) -> bool:
         """Update the image URL for a specific product"""
+        return self.update_product_images({url: new_image_url}) > 0
+
+    def update_product_images(self, images: Dict[str, str]) -> int:
+        """Set the image URL of every product in ``images`` (product URL -> image URL) in one transaction.
+
+        The mapping is staged as an Arrow table and applied with a single
+        ``UPDATE ... FROM``. Returns the number of rows updated.
+        """
+        if not images:
+            return 0
+        staged = pa.table({
+            'product_url': pa.array(list(images), pa.string()),
+            'image_url': pa.array(list(images.values()), pa.string()),
+        })
         try:
-            with self._connect_with_retry() as conn:
-                conn.execute("""
-                    UPDATE ikea_products 
-                    SET image_url = ? 
-                    WHERE product_url = ?
-                """, [new_image_url, url])
-                return True
+            with self.writable(), self.transaction() as cursor:
+                cursor.register('image_updates', staged)
+                try:
+                    updated = cursor.execute("""
+                        UPDATE ikea_products
+                        SET image_url = image_updates.image_url
+                        FROM image_updates
+                        WHERE ikea_products.product_url = image_updates.product_url
+                    """).fetchone()[0]
+                finally:
+                    cursor.unregister('image_updates')
+            self.catalog.invalidate()
+            return updated
         except Exception as e:
-            print(f"Error updating product image: {e}")
-            return False
+            print(f"Error updating product images: {e}")
+            return 0
 
     def save_changes(self):
-        """Save changes back to the original database file"""
+        """Flush committed changes from the write-ahead log into the database file.
+
+        Writes already go to the file itself, so this is only needed to make
+        the file complete on its own before another process copies it.
+        """
         try:
-            shutil.copy2(self.working_db_path, self.original_db_path)
+            with self.writable():
+                self.cursor().execute("CHECKPOINT")
             return True
         except Exception as e:
-            print(f"Error saving changes to original database: {e}")
+            print(f"Error saving changes to database: {e}")
             return False
+
+
+# One Database per file for the whole process
+_databases: Dict[str, Database] = {}
+_databases_lock = threading.Lock()
+
+
+def get_database(db_path: str = DB_PATH, read_only: bool = True) -> Database:
+    """The process-wide Database for ``db_path``, opened on first use.
+
+    Databases are opened read-only unless a caller asks for write access.
+    DuckDB cannot open one file both ways in a process, so a writer reopens
+    a read-only database for writing, and from then on it serves every
+    caller. Code that only writes now and then should use
+    ``Database.writable`` instead.
+    """
+    key = str(Path(db_path).resolve())
+    with _databases_lock:
+        db = _databases.get(key)
+        if db is None:
+            db = _databases[key] = Database(db_path, read_only=read_only)
+        elif db.read_only and not read_only:
+            db.reopen(read_only=False)
+        return db
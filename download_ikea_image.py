@@ -2,8 +2,16 @@ import asyncio
 import aiohttp
 from bs4 import BeautifulSoup
 import csv
+import os
 from pathlib import Path
+from csv_handler import CSVHandler
 from image_scraper import ImageScraper
+from fetch_engine import FetchEngine
+from rate_governor import RateLimited, get_governor, parse_retry_after, IKEA
+from response_cache import get_response_cache
+from parse_pool import get_parse_stage
+from metrics import FETCH_BYTES
+from config import FETCH_TIMEOUT_SECONDS, MAX_CONCURRENCY, IMAGE_PAGE_TTL
 from typing import List, Dict, Optional, Tuple
 import logging
 from dataclasses import dataclass
@@ -20,11 +28,35 @@ class Product:
     image_url: Optional[str] = None
     local_image_path: Optional[str] = None
 
+def extract_image_url(html: str) -> Optional[str]:
+    """Main product image URL from a product page; runs in the parse pool"""
+    soup = BeautifulSoup(html, 'html.parser')
+    img = soup.select_one('.mx-auto.d-block.keen-slider-detail-image')
+    if img and 'src' in img.attrs:
+        return img['src']
+    return None
+
 class IkeaImageDownloader:
-    def __init__(self):
-        self.scraper = ImageScraper()
+    def __init__(self, concurrency: int = MAX_CONCURRENCY):
+        self.scraper = ImageScraper(concurrency=concurrency)
         self.session: Optional[aiohttp.ClientSession] = None
         self.products: List[Product] = []
+        self.engine = FetchEngine(concurrency, get_governor(IKEA))
+        self.cache = get_response_cache()
+        self.parser = get_parse_stage()
+
+    async def _fetch_page(self, product_url: str) -> Optional[bytes]:
+        """Fetch a product page, raising RateLimited on a 429"""
+        async with self.session.get(product_url) as response:
+            if response.status == 429:
+                raise RateLimited(f"Rate limited fetching {product_url}",
+                                  parse_retry_after(response.headers.get('Retry-After')))
+            if response.status != 200:
+                logger.error(f"Failed to fetch {product_url}: Status {response.status}")
+                return None
+            body = (await response.text()).encode('utf-8')
+            FETCH_BYTES.labels('image_page').inc(len(body))
+            return body
 
     async def get_product_image_url(self, product_url: str) -> Optional[str]:
         """Extract the main product image URL from the product page"""
@@ -32,21 +64,19 @@ class IkeaImageDownloader:
             return None
         
         try:
-            async with self.session.get(product_url) as response:
-                if response.status != 200:
-                    logger.error(f"Failed to fetch {product_url}: Status {response.status}")
-                    return None
-                
-                html = await response.text()
-                soup = BeautifulSoup(html, 'html.parser')
-                
-                # Look for the product image
-                img = soup.select_one('.mx-auto.d-block.keen-slider-detail-image')
-                if img and 'src' in img.attrs:
-                    return img['src']
-                
-                logger.warning(f"No image found for {product_url}")
+            # Same cache entry as an http-backend stock check of this page
+            body = await self.cache.get_or_fetch(
+                product_url, None, IMAGE_PAGE_TTL,
+                lambda: self.engine.request(self._fetch_page, product_url), consumer='images')
+            if body is None:
                 return None
+            # Look for the product image without blocking other downloads
+            image_url = await self.parser.parse(extract_image_url, body.decode('utf-8'))
+            if image_url:
+                return image_url
+            
+            logger.warning(f"No image found for {product_url}")
+            return None
         except Exception as e:
             logger.error(f"Error fetching {product_url}: {str(e)}")
             return None
@@ -65,15 +95,10 @@ class IkeaImageDownloader:
         else:
             logger.error(f"No image URL found for {product.name}")
 
-    async def process_batch(self, batch_size: int = 5):
-        """Process a batch of products concurrently"""
-        for i in range(0, len(self.products), batch_size):
-            batch = self.products[i:i + batch_size]
-            tasks = [self.process_product(product) for product in batch]
-            await asyncio.gather(*tasks)
-            
-            # Add a small delay between batches to be nice to the server
-            await asyncio.sleep(1)
+    async def process_batch(self):
+        """Process all products concurrently, paced by the shared IKEA rate governor"""
+        async for _ in self.engine.map(self.process_product, self.products):
+            pass
 
     def read_products(self, csv_path: str):
         """Read products from CSV file"""
@@ -92,8 +117,9 @@ class IkeaImageDownloader:
         logger.info(f"Found {len(self.products)} products to process")
 
     def save_product_mapping(self, output_path: str = 'ikea_products_with_images.csv'):
-        """Save products with their image mappings to CSV"""
-        with open(output_path, 'w', newline='', encoding='utf-8') as f:
+        """Save products with their image mappings to CSV, replacing the file atomically"""
+        tmp_path = f"{output_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
             writer = csv.writer(f)
             # Write header
             writer.writerow(['Product Name', 'Product URL', 'Description', 'Price', 'Image URL', 'Local Image Path'])
@@ -107,6 +133,7 @@ class IkeaImageDownloader:
                     product.image_url or '',
                     product.local_image_path or ''
                 ])
+        os.replace(tmp_path, output_path)
         logger.info(f"Saved product-image mapping to {output_path}")
 
     async def download_all_images(self, csv_path: str = 'ikea_products.csv'):
@@ -114,15 +141,21 @@ class IkeaImageDownloader:
         self.read_products(csv_path)
         
         # Create aiohttp session
-        async with aiohttp.ClientSession() as session:
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=FETCH_TIMEOUT_SECONDS)) as session:
             self.session = session
             await self.process_batch()
         
         self.session = None
+        logger.info(f"Response cache: {self.cache.summary()}")
         
         # Save the mapping
         self.save_product_mapping()
 
+        # Record the image URLs in the product catalog, all in one rewrite
+        images = {product.url: product.image_url for product in self.products if product.image_url}
+        updated = CSVHandler(csv_path).update_product_images(images)
+        logger.info(f"Updated image URLs of {updated} products in {csv_path}")
+
 async def main():
     downloader = IkeaImageDownloader()
     await downloader.download_all_images()
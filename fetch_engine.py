@@ -0,0 +1,92 @@
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterable, Optional, Tuple, TypeVar
+
+from config import FETCH_TIMEOUT_SECONDS, MAX_CONCURRENCY, MAX_RETRIES
+from metrics import FETCH_RETRIES
+from rate_governor import RateGovernor, get_governor, is_throttled, retry_after, FIRECRAWL
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+class FetchEngine:
+    """Runs fetches with bounded concurrency under a shared adaptive rate budget"""
+
+    def __init__(self, concurrency: int = MAX_CONCURRENCY,
+                 governor: Optional[RateGovernor] = None,
+                 max_retries: int = MAX_RETRIES,
+                 timeout: Optional[float] = FETCH_TIMEOUT_SECONDS):
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        self.concurrency = concurrency
+        self.governor = governor or get_governor(FIRECRAWL)
+        self.max_retries = max_retries
+        self.timeout = timeout
+        self.retries = 0
+
+    async def request(self, func: Callable[..., Awaitable[R]], *args: Any, **kwargs: Any) -> R:
+        """Await ``func`` under the governor, retrying throttled attempts.
+
+        Every attempt takes a token first and gives up after ``timeout``
+        seconds. A 429 or timeout is reported to the governor (which slows
+        every caller down) and retried up to ``max_retries`` times; any other
+        error is raised straight away.
+        """
+        for attempt in range(self.max_retries + 1):
+            admitted_at = await self.governor.acquire()
+            try:
+                result = await asyncio.wait_for(func(*args, **kwargs), self.timeout)
+            except Exception as e:
+                if not is_throttled(e):
+                    raise
+                self.governor.on_throttle(retry_after(e), admitted_at)
+                if attempt >= self.max_retries:
+                    raise
+                self.retries += 1
+                FETCH_RETRIES.labels(self.governor.name).inc()
+                continue
+            self.governor.on_success(admitted_at)
+            return result
+
+    async def call(self, func: Callable[..., R], *args: Any, **kwargs: Any) -> R:
+        """Run a blocking client call in a worker thread under the governor.
+
+        On a timeout the caller moves on; the thread finishes in the background.
+        """
+        return await self.request(asyncio.to_thread, func, *args, **kwargs)
+
+    async def map(self, worker: Callable[[T], Awaitable[R]],
+                  items: Iterable[T]) -> AsyncIterator[Tuple[T, R]]:
+        """Run ``worker`` over ``items`` with at most ``concurrency`` in flight.
+
+        Yields (item, result) pairs in completion order. An exception raised by
+        ``worker`` stops the remaining work and is re-raised to the caller.
+        """
+        pending: asyncio.Queue = asyncio.Queue()
+        for item in items:
+            pending.put_nowait(item)
+        total = pending.qsize()
+        done: asyncio.Queue = asyncio.Queue()
+
+        async def run():
+            while True:
+                try:
+                    item = pending.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                try:
+                    done.put_nowait((item, await worker(item), None))
+                except Exception as e:
+                    done.put_nowait((item, None, e))
+
+        runners = [asyncio.create_task(run()) for _ in range(min(self.concurrency, total))]
+        try:
+            for _ in range(total):
+                item, result, error = await done.get()
+                if error is not None:
+                    raise error
+                yield item, result
+        finally:
+            for runner in runners:
+                runner.cancel()
+            await asyncio.gather(*runners, return_exceptions=True)
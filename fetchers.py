@@ -0,0 +1,173 @@
+import hashlib
+import json
+from abc import ABC, abstractmethod
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Iterable, Optional, Union
+
+import aiohttp
+from firecrawl import FirecrawlApp
+
+from fetch_engine import FetchEngine
+from metrics import FETCH_BYTES
+from rate_governor import RateLimited, get_governor, parse_retry_after, FIRECRAWL, IKEA
+from response_cache import ResponseCache, get_response_cache
+from config import (
+    FETCH_BACKEND, FETCH_TIMEOUT_SECONDS, FIRECRAWL_API_KEY, MAX_CONCURRENCY,
+    REPLAY_DIR, STOCK_PAGE_TTL
+)
+
+
+class Fetcher(ABC):
+    """Fetches product pages for stock checks.
+
+    ``fetch`` returns the page body as text, or None when the page could not
+    be fetched. Bodies are handed on whole: ``parse_availability`` finds
+    the availability block itself in the parse pool, so no page is scanned on
+    the event loop. Network backends keep the bodies in a shared
+    ``ResponseCache`` for ``cache_ttl`` seconds.
+    """
+
+    def __init__(self, engine: FetchEngine,
+                 cache: Optional[ResponseCache] = None, cache_ttl: float = STOCK_PAGE_TTL):
+        self.engine = engine
+        self.cache = cache
+        self.cache_ttl = cache_ttl
+
+    async def _cached(self, url: str, params: Optional[Dict],
+                      load: Callable[[], Awaitable[Optional[str]]]) -> Optional[str]:
+        """Serve ``load()`` through the response cache, if there is one"""
+        if self.cache is None:
+            body = await load()
+            if body is not None:
+                FETCH_BYTES.labels('stock_page').inc(len(body.encode('utf-8')))
+            return body
+
+        async def load_bytes() -> Optional[bytes]:
+            body = await load()
+            if body is None:
+                return None
+            data = body.encode('utf-8')
+            FETCH_BYTES.labels('stock_page').inc(len(data))
+            return data
+
+        body = await self.cache.get_or_fetch(url, params, self.cache_ttl, load_bytes, consumer='stock')
+        return body.decode('utf-8') if body is not None else None
+
+    async def fetch(self, url: str) -> Optional[str]:
+        """Fetch a product page"""
+        return await self._fetch(url)
+
+    @abstractmethod
+    async def _fetch(self, url: str) -> Optional[str]:
+        """Fetch the raw body for ``url``"""
+
+    async def close(self):
+        """Release any connections held by the fetcher"""
+
+
+class FirecrawlFetcher(Fetcher):
+    """Fetches pages through the Firecrawl scrape API"""
+
+    PARAMS = {'formats': ['html']}
+
+    def __init__(self, api_key: Optional[str] = FIRECRAWL_API_KEY,
+                 engine: Optional[FetchEngine] = None,
+                 api_url: Optional[str] = None,
+                 cache: Optional[ResponseCache] = None,
+                 cache_ttl: float = STOCK_PAGE_TTL):
+        super().__init__(engine or FetchEngine(governor=get_governor(FIRECRAWL)), cache, cache_ttl)
+        self.app = FirecrawlApp(api_key=api_key, api_url=api_url)
+
+    async def _scrape(self, url: str) -> Optional[str]:
+        result = await self.engine.call(self.app.scrape_url, url, self.PARAMS)
+        if not result:
+            return None
+        return result.get('html')
+
+    async def _fetch(self, url: str) -> Optional[str]:
+        return await self._cached(url, self.PARAMS, lambda: self._scrape(url))
+
+
+class HttpFetcher(Fetcher):
+    """Fetches pages straight from ikea.com.hk with aiohttp"""
+
+    def __init__(self, engine: Optional[FetchEngine] = None,
+                 cache: Optional[ResponseCache] = None,
+                 cache_ttl: float = STOCK_PAGE_TTL):
+        super().__init__(engine or FetchEngine(governor=get_governor(IKEA)), cache, cache_ttl)
+        self.session: Optional[aiohttp.ClientSession] = None
+
+    async def _get(self, url: str) -> Optional[str]:
+        if self.session is None:
+            self.session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=FETCH_TIMEOUT_SECONDS))
+        async with self.session.get(url) as response:
+            if response.status == 429:
+                raise RateLimited(f"Rate limited fetching {url}",
+                                  parse_retry_after(response.headers.get('Retry-After')))
+            if response.status != 200:
+                print(f"Failed to fetch {url}: Status {response.status}")
+                return None
+            return await response.text()
+
+    async def _fetch(self, url: str) -> Optional[str]:
+        # A plain GET: the same cache entry serves IkeaImageDownloader's page fetches
+        return await self._cached(url, None, lambda: self.engine.request(self._get, url))
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+
+class ReplayFetcher(Fetcher):
+    """Serves previously recorded pages from disk, without touching the network.
+
+    Pages are read from ``directory/<md5 of url>.html``. Firecrawl JSON dumps
+    (like ``ikea_products_1.json``) can be passed as ``fixtures`` and are
+    indexed by their ``metadata.sourceURL``.
+    """
+
+    def __init__(self, directory: Union[str, Path] = REPLAY_DIR,
+                 fixtures: Iterable[Union[str, Path]] = (),
+                 engine: Optional[FetchEngine] = None):
+        super().__init__(engine or FetchEngine())
+        self.directory = Path(directory)
+        self.fixtures: Dict[str, str] = {}
+        for fixture in fixtures:
+            with open(fixture, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for item in data.get('data', []):
+                source_url = item.get('metadata', {}).get('sourceURL')
+                if source_url and item.get('html'):
+                    self.fixtures[source_url] = item['html']
+
+    def page_path(self, url: str) -> Path:
+        return self.directory / f"{hashlib.md5(url.encode()).hexdigest()}.html"
+
+    def record(self, url: str, body: str):
+        """Save a page so later runs can replay it"""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.page_path(url).write_text(body, encoding='utf-8')
+
+    async def _fetch(self, url: str) -> Optional[str]:
+        if url in self.fixtures:
+            return self.fixtures[url]
+        path = self.page_path(url)
+        if path.exists():
+            return path.read_text(encoding='utf-8')
+        print(f"No recorded page for {url}")
+        return None
+
+
+def create_fetcher(backend: str = FETCH_BACKEND, api_key: Optional[str] = FIRECRAWL_API_KEY,
+                   concurrency: int = MAX_CONCURRENCY) -> Fetcher:
+    """Build the fetcher for a backend name: firecrawl, http or replay"""
+    if backend == 'firecrawl':
+        engine = FetchEngine(concurrency, get_governor(FIRECRAWL))
+        return FirecrawlFetcher(api_key, engine, cache=get_response_cache())
+    if backend == 'http':
+        engine = FetchEngine(concurrency, get_governor(IKEA))
+        return HttpFetcher(engine, cache=get_response_cache())
+    if backend == 'replay':
+        return ReplayFetcher(engine=FetchEngine(concurrency))
+    raise ValueError(f"Unknown fetch backend: {backend}")
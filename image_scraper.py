@@ -6,17 +6,33 @@ import hashlib
 import base64
 from urllib.parse import urlparse
 import os
+import time
 from firecrawl import FirecrawlApp
 from csv_handler import CSVHandler
-from config import FIRECRAWL_API_KEY
+from fetch_engine import FetchEngine
+from rate_governor import RateLimited, get_governor, parse_retry_after, FIRECRAWL, IKEA
+from response_cache import get_response_cache
+from metrics import FETCH_BYTES, IMAGE_DOWNLOAD_SECONDS
+from config import FETCH_TIMEOUT_SECONDS, FIRECRAWL_API_KEY, MAX_CONCURRENCY, IMAGE_PAGE_TTL
+
+SCREENSHOT_PARAMS = {
+    'formats': ['screenshot'],
+    'screenshotOptions': {
+        'selector': '.product-image img',  # Target the product image
+        'fullPage': False
+    }
+}
 
 class ImageScraper:
-    def __init__(self, image_dir: str = 'product_images'):
+    def __init__(self, image_dir: str = 'product_images', concurrency: int = MAX_CONCURRENCY):
         self.image_dir = Path(image_dir)
         self.image_dir.mkdir(exist_ok=True)
         self.csv_handler = CSVHandler()
         self.downloaded_images: Dict[str, str] = {}
         self.app = FirecrawlApp(api_key=FIRECRAWL_API_KEY)
+        self.firecrawl_engine = FetchEngine(concurrency, get_governor(FIRECRAWL))
+        self.image_engine = FetchEngine(concurrency, get_governor(IKEA))
+        self.cache = get_response_cache()
 
     def _get_image_filename(self, url: str) -> str:
         """Generate a unique filename for an image URL while preserving extension"""
@@ -30,6 +46,20 @@ class ImageScraper:
         url_hash = hashlib.md5(url.encode()).hexdigest()
         return f"{url_hash}{ext}"
 
+    async def _fetch_image_bytes(self, image_url: str) -> Optional[bytes]:
+        """Fetch raw image bytes, raising RateLimited on a 429"""
+        async with aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=FETCH_TIMEOUT_SECONDS)) as session:
+            async with session.get(image_url) as response:
+                if response.status == 429:
+                    raise RateLimited(f"Rate limited downloading {image_url}",
+                                      parse_retry_after(response.headers.get('Retry-After')))
+                if response.status == 200:
+                    content = await response.read()
+                    FETCH_BYTES.labels('image').inc(len(content))
+                    return content
+                print(f"Failed to download image {image_url}: Status {response.status}")
+                return None
+
     async def _download_image_direct(self, image_url: str) -> Optional[Path]:
         """Download image directly from URL"""
         if not image_url:
@@ -43,19 +73,19 @@ class ImageScraper:
             self.downloaded_images[image_url] = str(file_path)
             return file_path
 
+        start = time.perf_counter()
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(image_url) as response:
-                    if response.status == 200:
-                        content = await response.read()
-                        file_path.write_bytes(content)
-                        self.downloaded_images[image_url] = str(file_path)
-                        print(f"Downloaded image: {image_url} -> {file_path}")
-                        return file_path
-                    else:
-                        print(f"Failed to download image {image_url}: Status {response.status}")
-                        return None
+            content = await self.image_engine.request(self._fetch_image_bytes, image_url)
+            if content is None:
+                IMAGE_DOWNLOAD_SECONDS.labels('direct', 'failed').observe(time.perf_counter() - start)
+                return None
+            file_path.write_bytes(content)
+            self.downloaded_images[image_url] = str(file_path)
+            IMAGE_DOWNLOAD_SECONDS.labels('direct', 'ok').observe(time.perf_counter() - start)
+            print(f"Downloaded image: {image_url} -> {file_path}")
+            return file_path
         except Exception as e:
+            IMAGE_DOWNLOAD_SECONDS.labels('direct', 'error').observe(time.perf_counter() - start)
             print(f"Error downloading image {image_url}: {str(e)}")
             return None
 
@@ -72,41 +102,43 @@ class ImageScraper:
             self.downloaded_images[product_url] = str(file_path)
             return file_path
 
-        try:
+        async def capture() -> Optional[bytes]:
             # Use FireCrawl to get a screenshot of the product page
-            result = self.app.scrape_url(product_url, params={
-                'formats': ['screenshot'],
-                'screenshotOptions': {
-                    'selector': '.product-image img',  # Target the product image
-                    'fullPage': False
-                }
-            })
-            
+            result = await self.firecrawl_engine.call(self.app.scrape_url, product_url, SCREENSHOT_PARAMS)
             if result and 'screenshot' in result:
                 # Decode base64 screenshot data
                 image_data = base64.b64decode(result['screenshot'])
+                FETCH_BYTES.labels('screenshot').inc(len(image_data))
+                return image_data
+            return None
+
+        start = time.perf_counter()
+        try:
+            image_data = await self.cache.get_or_fetch(product_url, SCREENSHOT_PARAMS, IMAGE_PAGE_TTL,
+                                                       capture, consumer='images')
+            if image_data:
                 file_path.write_bytes(image_data)
                 self.downloaded_images[product_url] = str(file_path)
+                IMAGE_DOWNLOAD_SECONDS.labels('screenshot', 'ok').observe(time.perf_counter() - start)
                 print(f"Downloaded image for product: {product_url} -> {file_path}")
                 return file_path
             else:
+                IMAGE_DOWNLOAD_SECONDS.labels('screenshot', 'failed').observe(time.perf_counter() - start)
                 print(f"Failed to capture image for product {product_url}: No screenshot data received")
                 return None
         except Exception as e:
+            IMAGE_DOWNLOAD_SECONDS.labels('screenshot', 'error').observe(time.perf_counter() - start)
             print(f"Error capturing image for product {product_url}: {str(e)}")
             return None
 
-    async def _download_batch(self, urls: List[str], batch_size: int = 2, direct_image: bool = False):
-        """Download a batch of images"""
-        for i in range(0, len(urls), batch_size):
-            batch = urls[i:i + batch_size]
-            if direct_image:
-                tasks = [self._download_image_direct(url) for url in batch]
-            else:
-                tasks = [self._download_image(url) for url in batch]
-            await asyncio.gather(*tasks)
-            # Add a delay between batches to respect rate limits
-            await asyncio.sleep(1)
+    async def _download_batch(self, urls: List[str], direct_image: bool = False):
+        """Download images with bounded concurrency under the shared rate governors"""
+        if direct_image:
+            engine, worker = self.image_engine, self._download_image_direct
+        else:
+            engine, worker = self.firecrawl_engine, self._download_image
+        async for _ in engine.map(worker, urls):
+            pass
 
     async def download_direct_image(self, image_url: str) -> Optional[str]:
         """Download a single image directly from its URL"""
@@ -120,7 +152,7 @@ class ImageScraper:
         # Clear the downloaded images dictionary
         self.downloaded_images.clear()
         
-        # Download images in batches
+        # Download images; pacing comes from the shared rate governors
         await self._download_batch(urls, direct_image=direct_image)
         
         print(f"Downloaded {len(self.downloaded_images)} images successfully")
@@ -0,0 +1,237 @@
+"""Prometheus-style counters, gauges and latency histograms for the hot paths.
+
+Metrics live in one process-wide registry and are rendered in the
+Prometheus text exposition format: by the web app's ``/metrics`` route, or
+written to a file for node_exporter's textfile collector after a batch run
+(``app.py --metrics-file``). Each process keeps its own values.
+"""
+import math
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from bisect import bisect_left
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Union
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+# Seconds, from a cached lookup up to a slow scrape
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return '+Inf' if value > 0 else '-Inf'
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric(ABC):
+    """A named metric with one child per combination of label values"""
+
+    kind = 'untyped'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 registry: Optional['Registry'] = None):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    @abstractmethod
+    def _new_child(self):
+        """A fresh child for one combination of label values"""
+
+    def labels(self, *values: str, **kwargs: str):
+        """The child for these label values, created on first use"""
+        if kwargs:
+            values = tuple(kwargs[name] for name in self.labelnames)
+        key = tuple(str(value) for value in values)
+        if len(key) != len(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}")
+        child = self._children.get(key)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, self._new_child())
+        return child
+
+    @abstractmethod
+    def _samples(self) -> Iterator[str]:
+        """Sample lines of every child, in the text exposition format"""
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {_escape(self.help)}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return '\n'.join(lines)
+
+
+class _Value:
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+    def set(self, value: float):
+        self.value = value
+
+
+class Counter(Metric):
+    """Monotonically increasing count"""
+
+    kind = 'counter'
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def _samples(self) -> Iterator[str]:
+        for values, child in sorted(self._children.items()):
+            yield f"{self.name}{_format_labels(self.labelnames, values)} {_format_value(child.value)}"
+
+
+class Gauge(Counter):
+    """Current value of something that goes up and down"""
+
+    kind = 'gauge'
+
+    def set(self, value: float):
+        self.labels().set(value)
+
+
+class _HistogramChild:
+    def __init__(self, buckets: Sequence[float]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+
+    @contextmanager
+    def time(self):
+        """Observe the duration of the ``with`` block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Histogram(Metric):
+    """Distribution of observed values (latencies in seconds) over fixed buckets"""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS, registry: Optional['Registry'] = None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames, registry)
+
+    def _new_child(self) -> _HistogramChild:
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def time(self):
+        return self.labels().time()
+
+    def _samples(self) -> Iterator[str]:
+        for values, child in sorted(self._children.items()):
+            with child._lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                labels = _format_labels(self.labelnames, values, f'le="{_format_value(bound)}"')
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _format_labels(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {cumulative}"
+
+
+class Registry:
+    """The metrics of a process, in registration order"""
+
+    def __init__(self):
+        self._metrics: List[Metric] = []
+
+    def register(self, metric: Metric):
+        if any(existing.name == metric.name for existing in self._metrics):
+            raise ValueError(f"Metric already registered: {metric.name}")
+        self._metrics.append(metric)
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text format"""
+        return ''.join(metric.render() + '\n' for metric in self._metrics)
+
+    def write_textfile(self, path: Union[str, Path]):
+        """Write the metrics for node_exporter's textfile collector, replacing the file atomically"""
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp_path.write_text(self.render(), encoding='utf-8')
+        os.replace(tmp_path, path)
+
+
+REGISTRY = Registry()
+
+# Web app
+WEB_REQUEST_SECONDS = Histogram('ikea_web_request_seconds', 'Time to build a web response', ['route'])
+PRODUCT_DATA_SECONDS = Histogram('ikea_product_data_seconds',
+                                 'Time to get the current catalog snapshot, including rebuilds')
+SNAPSHOT_BUILD_SECONDS = Histogram('ikea_snapshot_build_seconds', 'Time to rebuild the catalog snapshot')
+STOCK_CACHE_REQUESTS = Counter('ikea_stock_cache_requests_total',
+                               'Stock cache reads: hit (fresh), stale (served while refreshing) or miss (loaded in place)',
+                               ['result'])
+STOCK_CACHE_REFRESHES = Histogram('ikea_stock_cache_refresh_seconds', 'Time to refresh the stock cache',
+                                  ['outcome'])
+RENDER_CACHE_REQUESTS = Counter('ikea_render_cache_requests_total',
+                                'Rendered response lookups: hit, miss, not_modified (304) or streamed (not cached)', ['result'])
+
+# Scraping
+SCRAPE_SECONDS = Histogram('ikea_scrape_seconds', 'Time to fetch one product page for a stock check',
+                           ['outcome'])
+FETCH_RETRIES = Counter('ikea_fetch_retries_total', 'Throttled fetch attempts that were retried', ['provider'])
+FETCH_BYTES = Counter('ikea_fetch_bytes_total', 'Bytes downloaded from upstream', ['kind'])
+RATE_GOVERNOR_RPS = Gauge('ikea_rate_governor_requests_per_second', 'Current rate of each provider governor',
+                          ['provider'])
+PARSE_SECONDS = Histogram('ikea_parse_seconds', 'Time from handing a page to the parse pool to its result',
+                          ['func'])
+BATCH_DURATION = Gauge('ikea_batch_duration_seconds', 'Duration of the last batch run', ['action'])
+BATCH_LAST_SUCCESS = Gauge('ikea_batch_last_success_timestamp_seconds',
+                           'Unix time the last successful batch run finished', ['action'])
+IMAGE_DOWNLOAD_SECONDS = Histogram('ikea_image_download_seconds', 'Time to download one product image',
+                                   ['method', 'outcome'])
+
+
+def render() -> str:
+    return REGISTRY.render()
+
+
+def write_textfile(path: Union[str, Path]):
+    REGISTRY.write_textfile(path)
@@ -1,7 +1,16 @@
+import re
 from dataclasses import dataclass
 from typing import Dict, Optional
 from decimal import Decimal
 
+# Product URLs end in the article number, e.g. .../fargklar-art-20477181 (s-prefixed for combinations)
+ARTICLE_NUMBER_RE = re.compile(r'-(s?\d{8})/?$')
+
+def article_number(url: str) -> Optional[str]:
+    """IKEA article number from a product URL, or None if it does not end in one"""
+    match = ARTICLE_NUMBER_RE.search(url)
+    return match.group(1) if match else None
+
 @dataclass
 class Product:
     name: str
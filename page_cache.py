@@ -0,0 +1,94 @@
+import gzip
+import hashlib
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+import brotli
+
+from config import RENDER_CACHE_ENTRIES
+
+# Preferred first when the client accepts several
+ENCODINGS = ('br', 'gzip', 'identity')
+
+
+def compress_stream(chunks: Iterable[bytes], encoding: str) -> Iterator[bytes]:
+    """Compress a streamed body chunk by chunk, flushing after each so the client can decode it as it arrives"""
+    if encoding == 'identity':
+        yield from chunks
+        return
+    if encoding == 'br':
+        compressor = brotli.Compressor()
+        for chunk in chunks:
+            yield compressor.process(chunk) + compressor.flush()
+        yield compressor.finish()
+        return
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)  # wbits 31: gzip framing
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def variant_etag(tag: str, encoding: str) -> str:
+    """Strong validators differ per encoding, since the bytes do"""
+    return tag if encoding == 'identity' else f"{tag}-{encoding}"
+
+
+class RenderedResponse:
+    """A response body rendered once, with its compressed variants built ahead of time"""
+
+    def __init__(self, body: bytes, mimetype: str):
+        self.mimetype = mimetype
+        self.variants: Dict[str, bytes] = {
+            'identity': body, 'gzip': gzip.compress(body, 9), 'br': brotli.compress(body)
+        }
+
+
+class RenderCache:
+    """Rendered responses for the current snapshot version.
+
+    Entries are keyed by whatever identifies a response within a version
+    (route and query string). A new version drops every entry, and at most
+    ``max_entries`` are kept, least recently used first out.
+    """
+
+    def __init__(self, max_entries: int = RENDER_CACHE_ENTRIES):
+        self.max_entries = max_entries
+        self.version: Optional[str] = None
+        self._entries: 'OrderedDict[str, RenderedResponse]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def etag(version: str, key: str) -> str:
+        """Strong ETag (unquoted) for a response of a snapshot version"""
+        return hashlib.sha1(f"{version}\n{key}".encode()).hexdigest()
+
+    def peek(self, version: str, key: str) -> Optional[RenderedResponse]:
+        """The cached response for ``key`` in this version, if it has been rendered"""
+        with self._lock:
+            if version != self.version:
+                return None
+            response = self._entries.get(key)
+            if response is not None:
+                self._entries.move_to_end(key)
+            return response
+
+    def get(self, version: str, key: str, render: Callable[[], bytes], mimetype: str) -> RenderedResponse:
+        """The cached response for ``key``, rendering it on first use in this version"""
+        with self._lock:
+            if version != self.version:
+                self._entries.clear()
+                self.version = version
+            response = self._entries.get(key)
+            if response is not None:
+                self._entries.move_to_end(key)
+                return response
+
+        response = RenderedResponse(render(), mimetype)
+        with self._lock:
+            if version == self.version:
+                self._entries[key] = response
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        return response
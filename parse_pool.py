@@ -0,0 +1,106 @@
+import asyncio
+import functools
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import AsyncIterable, AsyncIterator, Callable, Optional, Tuple, TypeVar
+
+from config import PARSE_WORKERS, PARSE_BACKLOG
+from metrics import PARSE_SECONDS
+
+K = TypeVar('K')
+R = TypeVar('R')
+
+_END = object()
+
+
+class ParseStage:
+    """Runs CPU-bound page parsers in a process pool, off the event loop.
+
+    Parsers must be module-level functions taking the page body and returning
+    a picklable result. The pool is started on first use and reused for the
+    life of the stage.
+    """
+
+    def __init__(self, workers: int = PARSE_WORKERS, backlog: int = PARSE_BACKLOG):
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.workers = workers
+        self.backlog = max(backlog, workers)
+        self._pool: Optional[ProcessPoolExecutor] = None
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # Forking a process that already runs fetch threads is unsafe
+            self._pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context('spawn'))
+        return self._pool
+
+    async def parse(self, func: Callable[[str], R], body: str) -> R:
+        """Parse a single body in the pool"""
+        with PARSE_SECONDS.labels(func.__name__).time():
+            return await asyncio.get_running_loop().run_in_executor(self._get_pool(), func, body)
+
+    async def map(self, func: Callable[[str], R],
+                  bodies: AsyncIterable[Tuple[K, Optional[str]]]) -> AsyncIterator[Tuple[K, Optional[R]]]:
+        """Parse (key, body) pairs as they arrive, yielding (key, result) as parses finish.
+
+        ``bodies`` is read concurrently with parsing, so fetching and parsing
+        overlap; at most ``backlog`` bodies wait on the pool at once. A None
+        body is passed through as a None result. An error raised while reading
+        ``bodies`` or parsing stops the stage and is re-raised to the caller.
+        """
+        loop = asyncio.get_running_loop()
+        pool = self._get_pool()
+        slots = asyncio.Semaphore(self.backlog)
+        done: asyncio.Queue = asyncio.Queue()
+        outstanding = 0
+        parse_seconds = PARSE_SECONDS.labels(func.__name__)
+
+        def finished(key, submitted_at, future):
+            parse_seconds.observe(time.perf_counter() - submitted_at)
+            slots.release()
+            done.put_nowait((key, future))
+
+        async def feed():
+            nonlocal outstanding
+            async for key, body in bodies:
+                outstanding += 1
+                if body is None:
+                    done.put_nowait((key, None))
+                    continue
+                await slots.acquire()
+                future = loop.run_in_executor(pool, func, body)
+                future.add_done_callback(functools.partial(finished, key, time.perf_counter()))
+
+        feeder = asyncio.create_task(feed())
+        feeder.add_done_callback(lambda _: done.put_nowait((_END, None)))
+        feeding = True
+        try:
+            while feeding or outstanding:
+                key, future = await done.get()
+                if key is _END:
+                    feeding = False
+                    feeder.result()
+                    continue
+                outstanding -= 1
+                yield key, (future.result() if future is not None else None)
+        finally:
+            feeder.cancel()
+            await asyncio.gather(feeder, return_exceptions=True)
+
+    def close(self):
+        """Shut the worker processes down"""
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+
+_stage: Optional[ParseStage] = None
+
+
+def get_parse_stage() -> ParseStage:
+    """Return the process-wide parse stage"""
+    global _stage
+    if _stage is None:
+        _stage = ParseStage()
+    return _stage
@@ -0,0 +1,187 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional
+
+import requests
+
+from config import (
+    REQUESTS_PER_SECOND, MIN_REQUESTS_PER_SECOND, MAX_REQUESTS_PER_SECOND,
+    RATE_BURST, AIMD_INCREASE, AIMD_DECREASE
+)
+from metrics import RATE_GOVERNOR_RPS
+
+
+class RateLimited(Exception):
+    """Raised when a provider answers 429 Too Many Requests"""
+
+    def __init__(self, message: str = "Rate limited", retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Parse a Retry-After header (delta seconds or HTTP date) into seconds"""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(timezone.utc)).total_seconds())
+
+
+def _status_and_headers(exc: BaseException):
+    response = getattr(exc, 'response', None)
+    if response is not None and hasattr(response, 'status_code'):
+        return response.status_code, response.headers
+    # aiohttp.ClientResponseError carries them directly
+    return getattr(exc, 'status', None), getattr(exc, 'headers', None)
+
+
+def is_throttled(exc: BaseException) -> bool:
+    """Whether an error means the provider wants us to slow down"""
+    if isinstance(exc, (RateLimited, TimeoutError, asyncio.TimeoutError, requests.Timeout)):
+        return True
+    status, _ = _status_and_headers(exc)
+    return status in (408, 429)
+
+
+def retry_after(exc: BaseException) -> Optional[float]:
+    """Seconds the provider asked us to wait, if it said so"""
+    if isinstance(exc, RateLimited) and exc.retry_after is not None:
+        return exc.retry_after
+    _, headers = _status_and_headers(exc)
+    if headers:
+        return parse_retry_after(headers.get('Retry-After'))
+    return None
+
+
+class TokenBucket:
+    """Token bucket rate limiter for asyncio code.
+
+    Tokens refill continuously at ``rate`` per second up to ``capacity``; each
+    request takes one. Waiters are served in arrival order.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else 1.0
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock: Optional[asyncio.Lock] = None
+        self._lock_loop = None
+
+    def _get_lock(self) -> asyncio.Lock:
+        # Limiters may be shared module-wide and outlive one asyncio.run()
+        loop = asyncio.get_running_loop()
+        if self._lock is None or self._lock_loop is not loop:
+            self._lock = asyncio.Lock()
+            self._lock_loop = loop
+        return self._lock
+
+    def _refill(self):
+        now = time.monotonic()
+        if now > self._updated:
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+
+    def set_rate(self, rate: float):
+        """Change the refill rate; tokens earned so far keep the old rate"""
+        self._refill()
+        self.rate = rate
+
+    def pause(self, seconds: float):
+        """Hand out no tokens for ``seconds`` and start empty afterwards"""
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+        self._updated = max(self._updated, self._paused_until)
+
+    async def acquire(self) -> float:
+        """Wait until a token is available and take it; returns the admission time"""
+        async with self._get_lock():
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return time.monotonic()
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+
+class RateGovernor(TokenBucket):
+    """Shared AIMD rate controller for one upstream provider.
+
+    Every caller takes a token before each request. Successes raise the rate
+    additively (by ``increase`` requests/sec for every second of successful
+    traffic) and a 429 or timeout cuts it by ``decrease``. Outcomes of
+    requests admitted before the last cut are ignored, so a burst of
+    concurrent 429s only cuts once and requests still in flight at the old
+    rate do not undo the cut. Retry-After pauses every caller.
+    """
+
+    def __init__(self, rate: float = REQUESTS_PER_SECOND,
+                 min_rate: float = MIN_REQUESTS_PER_SECOND,
+                 max_rate: float = MAX_REQUESTS_PER_SECOND,
+                 increase: float = AIMD_INCREASE,
+                 decrease: float = AIMD_DECREASE,
+                 burst: float = RATE_BURST,
+                 name: str = 'default'):
+        super().__init__(rate, burst)
+        self.name = name
+        self.rate_gauge = RATE_GOVERNOR_RPS.labels(name)
+        self.rate_gauge.set(rate)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self._last_decrease = 0.0
+
+    def set_rate(self, rate: float):
+        super().set_rate(min(self.max_rate, max(self.min_rate, rate)))
+        self.rate_gauge.set(self.rate)
+
+    def on_success(self, admitted_at: Optional[float] = None):
+        """Additive increase, unless the request was admitted before the last cut"""
+        if admitted_at is not None and admitted_at < self._last_decrease:
+            return
+        self.set_rate(self.rate + self.increase / self.rate)
+
+    def on_throttle(self, retry_after: Optional[float] = None, admitted_at: Optional[float] = None):
+        """Multiplicative decrease, plus a pause for every caller when Retry-After was sent"""
+        if retry_after:
+            self.pause(retry_after)
+        if admitted_at is not None and admitted_at < self._last_decrease:
+            return
+        self.set_rate(self.rate * self.decrease)
+        self._last_decrease = time.monotonic()
+        print(f"Rate limited. Throttling to {self.rate:.2f} requests/sec"
+              + (f", pausing {retry_after:.0f}s" if retry_after else ""))
+
+
+# Upstream providers with their own shared governor
+FIRECRAWL = 'firecrawl'
+IKEA = 'ikea'
+
+_governors: Dict[str, RateGovernor] = {}
+
+
+def get_governor(name: str) -> RateGovernor:
+    """Return the process-wide governor for an upstream provider"""
+    if name not in _governors:
+        _governors[name] = RateGovernor(name=name)
+    return _governors[name]
@@ -0,0 +1,160 @@
+import asyncio
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from collections import Counter, OrderedDict
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, Optional, Union
+
+from config import RESPONSE_CACHE_DIR, RESPONSE_CACHE_MAX_BYTES
+
+# Each entry file is the store time (big-endian double) followed by the
+# zlib-compressed body. File mtimes track recency for LRU eviction.
+_HEADER = struct.Struct('>d')
+
+
+class ResponseCache:
+    """Content-addressed on-disk cache of fetched response bodies.
+
+    Entries are keyed on the URL plus the request parameters, stored
+    compressed, and evicted least-recently-used once the cache grows past
+    ``max_bytes``. Each consumer passes its own TTL on lookup, so a long-lived
+    consumer can reuse a body that a short-lived one would refetch.
+
+    Consumers only share an entry when they make the same request: a plain
+    GET of a product page (params None) is shared by http-backend stock
+    checks and image downloads. Firecrawl stock checks (HTML) and
+    screenshots ask for different formats and are cached separately.
+    """
+
+    def __init__(self, directory: Union[str, Path] = RESPONSE_CACHE_DIR,
+                 max_bytes: int = RESPONSE_CACHE_MAX_BYTES):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.stats: Counter = Counter()
+        self._lock = threading.Lock()
+        self._entries: 'OrderedDict[str, int]' = OrderedDict()
+        self._size = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+
+        entries = []
+        for path in self.directory.glob('*/*.z'):
+            stat = path.stat()
+            entries.append((stat.st_mtime, path.stem, stat.st_size))
+        for _, key, size in sorted(entries):
+            self._entries[key] = size
+            self._size += size
+
+    @staticmethod
+    def key(url: str, params: Optional[Dict] = None) -> str:
+        """Cache key for a request"""
+        payload = url + '\n' + json.dumps(params or {}, sort_keys=True)
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.z"
+
+    def get(self, url: str, params: Optional[Dict] = None, ttl: Optional[float] = None,
+            consumer: str = 'default') -> Optional[bytes]:
+        """Return the cached body if present and younger than ``ttl`` seconds"""
+        key = self.key(url, params)
+        path = self._path(key)
+        try:
+            data = path.read_bytes()
+        except FileNotFoundError:
+            self.stats[f'{consumer}.misses'] += 1
+            return None
+        (stored_at,) = _HEADER.unpack_from(data)
+        if ttl is not None and time.time() - stored_at > ttl:
+            self.stats[f'{consumer}.expired'] += 1
+            return None
+        os.utime(path)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+        self.stats[f'{consumer}.hits'] += 1
+        return zlib.decompress(data[_HEADER.size:])
+
+    def put(self, url: str, body: bytes, params: Optional[Dict] = None):
+        """Store a body, evicting least-recently-used entries past ``max_bytes``"""
+        key = self.key(url, params)
+        path = self._path(key)
+        path.parent.mkdir(exist_ok=True)
+        data = _HEADER.pack(time.time()) + zlib.compress(body)
+        # A private temporary file per writer, so concurrent puts never interleave
+        with tempfile.NamedTemporaryFile(dir=path.parent, suffix='.tmp', delete=False) as f:
+            f.write(data)
+        try:
+            os.replace(f.name, path)
+        except BaseException:
+            os.unlink(f.name)
+            raise
+
+        with self._lock:
+            self._size += len(data) - self._entries.pop(key, 0)
+            self._entries[key] = len(data)
+            while self._size > self.max_bytes and len(self._entries) > 1:
+                old_key, old_size = self._entries.popitem(last=False)
+                self._path(old_key).unlink(missing_ok=True)
+                self._size -= old_size
+                self.stats['evictions'] += 1
+
+    async def get_or_fetch(self, url: str, params: Optional[Dict], ttl: Optional[float],
+                           load: Callable[[], Awaitable[Optional[bytes]]],
+                           consumer: str = 'default') -> Optional[bytes]:
+        """Return a fresh cached body, or ``load`` it and cache the result.
+
+        Concurrent requests for the same key share a single ``load`` call.
+        Disk reads, writes and (de)compression run in worker threads.
+        """
+        key = self.key(url, params)
+        if key not in self._inflight:
+            body = await asyncio.to_thread(self.get, url, params, ttl, consumer)
+            if body is not None:
+                return body
+
+        if key in self._inflight:
+            self.stats[f'{consumer}.shared'] += 1
+            return await asyncio.shield(self._inflight[key])
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            body = await load()
+            if body is not None:
+                await asyncio.to_thread(self.put, url, body, params)
+            future.set_result(body)
+            return body
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else was waiting
+            raise
+        finally:
+            del self._inflight[key]
+
+    def summary(self) -> str:
+        """One-line hit/miss summary"""
+        hits = sum(v for k, v in self.stats.items() if k.endswith('.hits'))
+        misses = sum(v for k, v in self.stats.items() if k.endswith(('.misses', '.expired')))
+        return (f"{hits} hits, {misses} misses, {len(self._entries)} entries, "
+                f"{self._size / 1e6:.1f} MB")
+
+
+_cache: Optional[ResponseCache] = None
+
+
+def get_response_cache() -> ResponseCache:
+    """Return the process-wide response cache"""
+    global _cache
+    if _cache is None:
+        _cache = ResponseCache()
+    return _cache
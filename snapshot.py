@@ -0,0 +1,275 @@
+import threading
+from bisect import bisect_left, bisect_right
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from config import STORES
+from metrics import SNAPSHOT_BUILD_SECONDS
+from stock_matrix import StockMatrix
+
+
+def parse_price(price) -> Optional[float]:
+    """Numeric price value, or None when missing or unparseable"""
+    if pd.isna(price):
+        return None
+    try:
+        # Handle string prices that might start with +
+        price_str = str(price).replace('+', '').strip()
+        return float(price_str.replace(',', ''))
+    except (ValueError, TypeError, AttributeError):
+        return None
+
+
+def format_price(price):
+    """Format price value"""
+    price_float = parse_price(price)
+    if price_float is None:
+        return "N/A"
+    return f"HK${price_float:,.1f}"
+
+
+def parse_prices(prices: pd.Series) -> pd.Series:
+    """``parse_price`` for a whole column: float values, NaN when missing or unparseable"""
+    if pd.api.types.is_numeric_dtype(prices):
+        return prices.astype(float)
+    # Each distinct price string is converted once, with float() like parse_price
+    # (pd.to_numeric's parser can be off in the last digit)
+    distinct = prices.dropna().unique()
+    values = dict(zip(distinct, (parse_price(price) for price in distinct)))
+    return prices.map(values).astype(float)
+
+
+def format_prices(values: pd.Series) -> pd.Series:
+    """``format_price`` for a column of parsed prices; each distinct price is formatted once"""
+    distinct = values.dropna().unique()
+    labels = dict(zip(distinct, (f"HK${value:,.1f}" for value in distinct)))
+    return values.map(labels).fillna("N/A")
+
+
+def stock_frame(stock_data: StockMatrix, urls: pd.Series) -> pd.DataFrame:
+    """Products x stores quantities for ``urls`` (0 where there is no stock record)"""
+    # A no-op for the StockMatrix the stock cache serves
+    matrix = StockMatrix.from_results(stock_data)
+    stock = pd.DataFrame(matrix.quantities.astype(np.int64), index=matrix.urls, columns=STORES)
+    return stock.reindex(urls.array, fill_value=0)
+
+
+def build_products(prices_csv: Union[str, Path], images_csv: Union[str, Path],
+                   stock_data: StockMatrix) -> List[Dict]:
+    """Combine the product CSVs and stock data into display records, sorted by name"""
+    # Read product data from both CSV files
+    df_prices = pd.read_csv(prices_csv)
+    df_images = pd.read_csv(images_csv)
+
+    # Clean column names
+    df_prices.columns = df_prices.columns.str.strip()
+    df_images.columns = df_images.columns.str.strip()
+
+    # Drop any existing price column from images DataFrame
+    if 'Price' in df_images.columns:
+        df_images = df_images.drop('Price', axis=1)
+
+    # Create a base DataFrame with unique product URLs, then clean up the URLs
+    df = df_images.drop_duplicates(subset=['Product URL'], keep='first').copy()
+    df['Product URL'] = df['Product URL'].str.strip()
+    df_prices['Product URL'] = df_prices['Product URL'].str.strip()
+
+    # Merge with price data; a URL listed twice after cleanup keeps its first row
+    df = pd.merge(df, df_prices[['Product URL', 'Price']], on='Product URL', how='left')
+    df = df.drop_duplicates(subset=['Product URL'], keep='first')
+    df = df.sort_values('Product Name', kind='stable', ignore_index=True)
+
+    # Display columns, computed a column at a time
+    price_value = parse_prices(df['Price'])
+    # A column with no paths at all (before any image download) is read as float
+    image_name = df['Local Image Path'].astype('string').str.rsplit('/', n=1).str[-1]
+    columns = pd.DataFrame({
+        'name': df['Product Name'],
+        'url': df['Product URL'],
+        'description': df['Description'].fillna('N/A'),
+        'price': format_prices(price_value),
+        'price_value': price_value.astype(object).where(price_value.notna(), None),
+        'image_path': ('/static/product_images/' + image_name).astype(object).where(image_name.notna(), None),
+    })
+    stock = stock_frame(stock_data, df['Product URL'])
+
+    # One conversion to Python records at the end (tolist() gives native ints and floats)
+    fields = list(columns.columns)
+    values = zip(*(columns[field].tolist() for field in fields))
+    return [dict(zip(fields, row), stock=dict(zip(STORES, quantities)))
+            for row, quantities in zip(values, stock.to_numpy().tolist())]
+
+
+def _bitmask(positions: Iterable[int], size: int) -> int:
+    """Bitset (as an int) with the given positions set"""
+    bits = bytearray((size + 7) // 8)
+    for i in positions:
+        bits[i >> 3] |= 1 << (i & 7)
+    return int.from_bytes(bits, 'little')
+
+
+class _PrefixMasks:
+    """Bitsets of the first k positions of an ordering, for any k.
+
+    A bitset is kept for every ``step`` positions; the rest of a prefix is
+    filled in from the ordering, so any prefix costs at most ``step`` bits.
+    """
+
+    def __init__(self, order: List[int], size: int, step: int = 64):
+        self.order = order
+        self.size = size
+        self.step = step
+        self.checkpoints = []
+        bits = bytearray((size + 7) // 8)
+        for k in range(len(order) + 1):
+            if k % step == 0:
+                self.checkpoints.append(int.from_bytes(bits, 'little'))
+            if k < len(order):
+                i = order[k]
+                bits[i >> 3] |= 1 << (i & 7)
+
+    def prefix(self, k: int) -> int:
+        j = k // self.step
+        mask = self.checkpoints[j]
+        if k > j * self.step:
+            mask |= _bitmask(self.order[j * self.step:k], self.size)
+        return mask
+
+    def range(self, start: int, end: int) -> int:
+        """Bitset of positions ``order[start:end]``"""
+        return self.prefix(end) ^ self.prefix(start)
+
+
+class ProductIndex:
+    """Lookup structures over a name-ordered product list, built once per snapshot.
+
+    Products are referred to by their position in the list, and sets of
+    products are bitsets over those positions, so filters combine with a few
+    big-int ANDs. Each store has a precomputed in-stock set and its positions
+    sorted by quantity (for "at least N" filters); prices have a sorted index
+    for ranges. Neither kind of filter looks at individual products.
+    """
+
+    def __init__(self, products: List[Dict]):
+        self.size = len(products)
+        self.everything = (1 << self.size) - 1
+        self.quantities = {store: [product['stock'][store] for product in products] for store in STORES}
+        self.in_stock = {store: _bitmask((i for i, qty in enumerate(quantities) if qty > 0), self.size)
+                         for store, quantities in self.quantities.items()}
+        self._qty_keys: Dict[str, List[int]] = {}
+        self._by_qty: Dict[str, _PrefixMasks] = {}
+        for store, quantities in self.quantities.items():
+            order = sorted(range(self.size), key=quantities.__getitem__)
+            self._qty_keys[store] = [quantities[i] for i in order]
+            self._by_qty[store] = _PrefixMasks(order, self.size)
+
+        self.prices = [product['price_value'] for product in products]
+        priced = sorted((price, i) for i, price in enumerate(self.prices) if price is not None)
+        self._price_keys = [price for price, _ in priced]
+        self._by_price = _PrefixMasks([i for _, i in priced], self.size)
+
+    def select(self, in_stock: Iterable[str] = (), min_qty: Optional[Dict[str, int]] = None,
+               min_price: Optional[float] = None, max_price: Optional[float] = None) -> int:
+        """Bitset of the products matching every filter"""
+        mask = self.everything
+        for store in in_stock:
+            mask &= self.in_stock[store]
+        for store, qty in (min_qty or {}).items():
+            start = bisect_left(self._qty_keys[store], qty)
+            mask &= self._by_qty[store].range(start, self.size)
+        if min_price is not None or max_price is not None:
+            start = bisect_left(self._price_keys, min_price) if min_price is not None else 0
+            end = bisect_right(self._price_keys, max_price) if max_price is not None else len(self._price_keys)
+            mask &= self._by_price.range(start, max(start, end))
+        return mask
+
+    def positions(self, mask: int) -> np.ndarray:
+        """Positions in a bitset, in name order"""
+        bits = np.frombuffer(mask.to_bytes((self.size + 7) // 8, 'little'), dtype=np.uint8)
+        return np.flatnonzero(np.unpackbits(bits, bitorder='little'))
+
+
+class CatalogSnapshot:
+    """Ready-to-serve product records for one version of the catalog and stock data"""
+
+    def __init__(self, products: List[Dict], signature: Tuple, stock_data: StockMatrix):
+        self.products = products
+        self.by_url = {product['url']: product for product in products}
+        self.index = ProductIndex(products)
+        self.signature = signature
+        self.stock_data = stock_data
+        self.built_at = datetime.now()
+
+    def query(self, offset: int = 0, limit: Optional[int] = None, **filters) -> Tuple[int, List[Dict]]:
+        """(total matches, one page of matching products) for ``ProductIndex.select`` filters"""
+        mask = self.index.select(**filters)
+        if mask == self.index.everything:
+            positions = range(self.index.size)
+        else:
+            positions = self.index.positions(mask)
+        end = None if limit is None else offset + limit
+        return mask.bit_count(), [self.products[i] for i in positions[offset:end]]
+
+
+class SnapshotStore:
+    """Keeps the current catalog snapshot in memory.
+
+    The snapshot is rebuilt only when one of the source CSVs changes on disk
+    (by mtime and size) or a different stock snapshot object is passed in;
+    every other call returns the records already built.
+    """
+
+    def __init__(self, prices_csv: Union[str, Path] = 'ikea_products.csv',
+                 images_csv: Union[str, Path] = 'ikea_products_with_images.csv'):
+        self.paths = (Path(prices_csv), Path(images_csv))
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._lock = threading.Lock()
+
+    def signature(self) -> Tuple:
+        """(mtime_ns, size) of each source file"""
+        signature = []
+        for path in self.paths:
+            stat = path.stat()
+            signature.append((stat.st_mtime_ns, stat.st_size))
+        return tuple(signature)
+
+    def _is_current(self, snapshot: Optional[CatalogSnapshot], signature: Tuple, stock_data: StockMatrix) -> bool:
+        # Stock snapshots are replaced, never mutated, so identity means unchanged
+        return snapshot is not None and snapshot.signature == signature and snapshot.stock_data is stock_data
+
+    def peek(self, stock_data: StockMatrix) -> Optional[CatalogSnapshot]:
+        """Current snapshot if it is up to date, without rebuilding it"""
+        snapshot = self._snapshot
+        return snapshot if self._is_current(snapshot, self.signature(), stock_data) else None
+
+    def get(self, stock_data: StockMatrix) -> CatalogSnapshot:
+        """Current snapshot, rebuilding it first if the sources or stock changed"""
+        signature = self.signature()
+        snapshot = self._snapshot
+        if self._is_current(snapshot, signature, stock_data):
+            return snapshot
+
+        with self._lock:
+            # Another request may have rebuilt it while we waited
+            snapshot = self._snapshot
+            if not self._is_current(snapshot, signature, stock_data):
+                with SNAPSHOT_BUILD_SECONDS.time():
+                    products = build_products(self.paths[0], self.paths[1], stock_data)
+                    snapshot = CatalogSnapshot(products, signature, stock_data)
+                self._snapshot = snapshot
+            return snapshot
+
+
+_store: Optional[SnapshotStore] = None
+
+
+def get_snapshot_store() -> SnapshotStore:
+    """Return the process-wide catalog snapshot store"""
+    global _store
+    if _store is None:
+        _store = SnapshotStore()
+    return _store
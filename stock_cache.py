@@ -0,0 +1,283 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Callable, Mapping, Optional, Sequence, Tuple, Union
+
+from config import (
+    SHARED_STOCK_CACHE, STORES, STOCK_CACHE_BACKEND, STOCK_CACHE_POLL_SECONDS, STOCK_CACHE_TTL_HOURS,
+    STOCK_REFRESH_LEASE_SECONDS, STOCK_REFRESH_RETRY_SECONDS, STOCK_RESULTS_FILE
+)
+from catalog import Signature, file_signature
+from metrics import STOCK_CACHE_REFRESHES, STOCK_CACHE_REQUESTS
+from stock_checker import load_stock_results
+from stock_matrix import StockMatrix
+
+
+class StockCache:
+    """Stock data for the web app, refreshed with stale-while-revalidate.
+
+    Once the data is older than ``ttl``, the next reader starts a refresh in a
+    background thread and keeps getting the previous data until the new load
+    is published. The data is also stale as soon as one of ``sources``, the
+    files the loader reads, changes size or mtime, so a new sweep is served
+    without waiting for ``ttl``. Only one refresh runs at a time; a failed
+    refresh keeps the old data and is retried after ``retry_after``.
+    ``on_update`` is called with every new snapshot and its load time before
+    it is served. Snapshots are served as a ``StockMatrix``.
+    """
+
+    def __init__(self, loader: Callable[[], Optional[Mapping]] = load_stock_results,
+                 ttl: timedelta = timedelta(hours=STOCK_CACHE_TTL_HOURS),
+                 retry_after: timedelta = timedelta(seconds=STOCK_REFRESH_RETRY_SECONDS),
+                 on_update: Optional[Callable[[StockMatrix, datetime], None]] = None,
+                 sources: Sequence[Union[str, Path]] = (STOCK_RESULTS_FILE,)):
+        self.loader = loader
+        self.ttl = ttl
+        self.retry_after = retry_after
+        self.on_update = on_update
+        self.sources = [Path(path) for path in sources]
+        # Signature of the sources when the served data was loaded
+        self._signature: Optional[Signature] = None
+        # (data, loaded at) is swapped as a whole so readers never see a mix
+        self._entry: Optional[Tuple[StockMatrix, datetime]] = None
+        self._lock = threading.Lock()
+        self._refreshing = False
+        self._next_attempt: Optional[datetime] = None
+
+    @property
+    def timestamp(self) -> Optional[datetime]:
+        """When the served data was loaded"""
+        return self._entry[1] if self._entry else None
+
+    def set(self, data: Mapping, timestamp: Optional[datetime] = None):
+        """Publish a new stock snapshot (a StockMatrix, or stock per product URL)"""
+        data = StockMatrix.from_results(data)
+        timestamp = timestamp or datetime.now()
+        if self.on_update is not None:
+            self.on_update(data, timestamp)
+        self._entry = (data, timestamp)
+
+    def _load(self) -> Tuple[StockMatrix, Signature]:
+        """Load the data, with the signature its sources had before they were read"""
+        signature = file_signature(self.sources)
+        data = self.loader()
+        return StockMatrix.from_results(data if data is not None else {}), signature
+
+    def _update(self):
+        """Bring the served data up to date"""
+        data, signature = self._load()
+        self.set(data)
+        self._signature = signature
+
+    def _sources_changed(self) -> bool:
+        return self._signature is not None and file_signature(self.sources) != self._signature
+
+    def _due(self, entry: Tuple[StockMatrix, datetime], now: datetime) -> bool:
+        """Whether a reader at ``now`` should start a refresh"""
+        return now - entry[1] >= self.ttl or self._sources_changed()
+
+    def _run_update(self):
+        start = time.perf_counter()
+        try:
+            self._update()
+            self._next_attempt = None
+            STOCK_CACHE_REFRESHES.labels('ok').observe(time.perf_counter() - start)
+        except Exception as e:
+            print(f"Error refreshing stock data: {e}")
+            self._next_attempt = datetime.now() + self.retry_after
+            STOCK_CACHE_REFRESHES.labels('error').observe(time.perf_counter() - start)
+        finally:
+            self._refreshing = False
+
+    def refresh(self, wait: bool = False) -> bool:
+        """Start a refresh unless one is already running; returns whether one was started"""
+        with self._lock:
+            if self._refreshing:
+                return False
+            self._refreshing = True
+        if wait:
+            self._run_update()
+        else:
+            threading.Thread(target=self._run_update, name='stock-cache-refresh', daemon=True).start()
+        return True
+
+    def get(self) -> StockMatrix:
+        """Current stock data, triggering a background refresh once it is stale"""
+        return self.get_entry()[0]
+
+    def get_entry(self) -> Tuple[StockMatrix, Optional[datetime]]:
+        """Current (stock data, loaded at), triggering a background refresh once it is stale"""
+        entry = self._entry
+        now = datetime.now()
+        retry_due = self._next_attempt is None or now >= self._next_attempt
+        if entry is None:
+            # Nothing to serve yet: the first reader loads in place, others wait for it
+            STOCK_CACHE_REQUESTS.labels('miss').inc()
+            if retry_due:
+                with self._lock:
+                    if self._entry is None:
+                        self._refreshing = True
+                        self._run_update()
+            return self._entry or (StockMatrix.from_results({}), None)
+
+        if retry_due and self._due(entry, now):
+            STOCK_CACHE_REQUESTS.labels('stale').inc()
+            self.refresh()
+        else:
+            STOCK_CACHE_REQUESTS.labels('hit').inc()
+        return entry
+
+
+class SharedStockCache(StockCache):
+    """A StockCache whose snapshot is shared by every process on the host.
+
+    The current snapshot lives in a SQLite file with a version counter. Each
+    process polls the version every ``poll_interval`` (in the background, like
+    a refresh) and only reloads the data when it changed, so all workers serve
+    the same snapshot with the same load time. When the shared snapshot is
+    older than ``ttl`` or its sources changed since it was loaded, the
+    process holding the refresh lease reloads it for everyone; the lease
+    expires after ``lease`` in case that process dies.
+    """
+
+    def __init__(self, loader: Callable[[], Optional[Mapping]] = load_stock_results,
+                 path: Union[str, Path] = SHARED_STOCK_CACHE,
+                 ttl: timedelta = timedelta(hours=STOCK_CACHE_TTL_HOURS),
+                 retry_after: timedelta = timedelta(seconds=STOCK_REFRESH_RETRY_SECONDS),
+                 on_update: Optional[Callable[[StockMatrix, datetime], None]] = None,
+                 poll_interval: timedelta = timedelta(seconds=STOCK_CACHE_POLL_SECONDS),
+                 lease: timedelta = timedelta(seconds=STOCK_REFRESH_LEASE_SECONDS),
+                 sources: Sequence[Union[str, Path]] = (STOCK_RESULTS_FILE,)):
+        super().__init__(loader, ttl, retry_after, on_update, sources)
+        self.path = Path(path)
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.version = 0
+        self._checked_at: Optional[datetime] = None
+        self._local = threading.local()
+        self._init_db()
+
+    @property
+    def holder(self) -> str:
+        return f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+
+    def _connect(self) -> sqlite3.Connection:
+        # One connection per thread, reopened in forked workers
+        if getattr(self._local, 'pid', None) != os.getpid():
+            self._local.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            self._local.pid = os.getpid()
+        return self._local.conn
+
+    def _init_db(self):
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS stock_snapshot (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                version INTEGER NOT NULL,
+                loaded_at TEXT,
+                data TEXT,
+                source_signature TEXT
+            )
+        """)
+        columns = {row[1] for row in conn.execute("PRAGMA table_info(stock_snapshot)")}
+        if 'source_signature' not in columns:
+            # Snapshot files from before sources were tracked
+            conn.execute("ALTER TABLE stock_snapshot ADD COLUMN source_signature TEXT")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS refresh_lease (
+                id INTEGER PRIMARY KEY CHECK (id = 1),
+                holder TEXT,
+                expires_at REAL
+            )
+        """)
+        conn.execute("INSERT OR IGNORE INTO stock_snapshot (id, version) VALUES (1, 0)")
+        conn.execute("INSERT OR IGNORE INTO refresh_lease (id) VALUES (1)")
+
+    def _sync(self) -> Optional[Tuple[datetime, Optional[str]]]:
+        """Adopt the published snapshot if its version changed; returns its load time and source signature"""
+        conn = self._connect()
+        version, loaded_at, source = conn.execute(
+            "SELECT version, loaded_at, source_signature FROM stock_snapshot WHERE id = 1").fetchone()
+        if version == 0:
+            return None
+        loaded_at = datetime.fromisoformat(loaded_at)
+        if version != self.version:
+            (payload,) = conn.execute("SELECT data FROM stock_snapshot WHERE id = 1").fetchone()
+            self.set(StockMatrix.from_results(json.loads(payload)), loaded_at)
+            self.version = version
+        return loaded_at, source
+
+    def _publish(self, data: StockMatrix, signature: Signature):
+        """Write a new snapshot version for every process"""
+        loaded_at = datetime.now()
+        payload = json.dumps({url: dict(zip(STORES, quantities))
+                              for url, quantities in zip(data.urls, data.quantities.tolist())})
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("UPDATE stock_snapshot SET version = version + 1, loaded_at = ?, data = ?, "
+                         "source_signature = ? WHERE id = 1",
+                         (loaded_at.isoformat(), payload, json.dumps(signature)))
+            (version,) = conn.execute("SELECT version FROM stock_snapshot WHERE id = 1").fetchone()
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        self.set(data, loaded_at)
+        self.version = version
+
+    def _acquire_lease(self) -> bool:
+        now = time.time()
+        cursor = self._connect().execute(
+            "UPDATE refresh_lease SET holder = ?, expires_at = ? "
+            "WHERE id = 1 AND (holder IS NULL OR expires_at < ?)",
+            (self.holder, now + self.lease.total_seconds(), now))
+        return cursor.rowcount == 1
+
+    def _release_lease(self):
+        self._connect().execute("UPDATE refresh_lease SET holder = NULL WHERE id = 1 AND holder = ?",
+                                (self.holder,))
+
+    def _is_fresh(self, published: Optional[Tuple[datetime, Optional[str]]]) -> bool:
+        """Whether a published snapshot is within ``ttl`` and loaded from the current sources"""
+        if published is None:
+            return False
+        loaded_at, source = published
+        return datetime.now() - loaded_at < self.ttl and source == json.dumps(file_signature(self.sources))
+
+    def _update(self):
+        self._checked_at = datetime.now()
+        if self._is_fresh(self._sync()):
+            return
+        if not self._acquire_lease():
+            # Another process is refreshing; on a cold start serve a local load meanwhile
+            if self._entry is None:
+                super()._update()
+            return
+        try:
+            # It may have been published while we were taking the lease
+            if not self._is_fresh(self._sync()):
+                self._publish(*self._load())
+        finally:
+            self._release_lease()
+
+    def _due(self, entry: Tuple[StockMatrix, datetime], now: datetime) -> bool:
+        return self._checked_at is None or now - self._checked_at >= self.poll_interval
+
+
+def create_stock_cache(backend: str = STOCK_CACHE_BACKEND,
+                       loader: Callable[[], Optional[Mapping]] = load_stock_results,
+                       on_update: Optional[Callable[[StockMatrix, datetime], None]] = None) -> StockCache:
+    """Build the stock cache for a backend name: local (per process) or shared (per host)"""
+    if backend == 'local':
+        return StockCache(loader, on_update=on_update)
+    if backend == 'shared':
+        return SharedStockCache(loader, on_update=on_update)
+    raise ValueError(f"Unknown stock cache backend: {backend}")
@@ -1,149 +1,201 @@
 import asyncio
 import json
+import time
 from pathlib import Path
-from typing import Dict, Optional, List
-import re
-from datetime import datetime
+from typing import Dict, Optional, List, Tuple
+from datetime import datetime, timedelta
 
-from firecrawl import FirecrawlApp
 from models import StockInfo, Product
 from csv_handler import CSVHandler
-from config import FIRECRAWL_API_KEY
+from stock_parser import parse_availability
+from fetchers import Fetcher, create_fetcher
+from checkpoint import CheckpointJournal
+from metrics import SCRAPE_SECONDS
+from parse_pool import ParseStage, get_parse_stage
+from stock_history import StockHistory, get_stock_history
+from stock_matrix import StockMatrix
+from config import (
+    FIRECRAWL_API_KEY, MAX_CONCURRENCY, RESUME_MAX_AGE_HOURS, FETCH_BACKEND, PARTIAL_RESULTS_FILE,
+    STOCK_RESULTS_FILE
+)
+
+# Latest results snapshot, relative to the working directory
 
 class StockChecker:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, concurrency: int = MAX_CONCURRENCY,
+                 requests_per_second: Optional[float] = None,
+                 fetcher: Optional[Fetcher] = None,
+                 parser: Optional[ParseStage] = None,
+                 history: Optional[StockHistory] = None):
         self.api_key = api_key
-        self.app = FirecrawlApp(api_key=api_key)
+        self.fetcher = fetcher or create_fetcher(FETCH_BACKEND, api_key, concurrency)
+        self.engine = self.fetcher.engine
+        self.parser = parser or get_parse_stage()
+        if requests_per_second:
+            self.engine.governor.set_rate(requests_per_second)
         self.csv_handler = CSVHandler()
-        self.results_file = Path('stock_results.json')
-        self.partial_results_file = Path('stock_results_partial.json')
+        self.results_file = STOCK_RESULTS_FILE
+        self.partial_results_file = PARTIAL_RESULTS_FILE
+        self.journal = CheckpointJournal(self.partial_results_file)
+        # Opened on first use, so checkers that never record or query history leave the database alone
+        self.history = history
 
     def _parse_stock_info(self, html: str) -> StockInfo:
-        """Parse stock information from the HTML content"""
-        stock_info = {}
-        stores = ['Warehouse', 'Causeway Bay', 'Kowloon Bay', 'Macau Taipa', 'Shatin', 'Tsuen Wan']
-        
-        for store in stores:
-            # First check for "Out of stock" message
-            out_of_stock_pattern = f'Out of stock at\\s*{store}'
-            if re.search(out_of_stock_pattern, html, re.IGNORECASE):
-                stock_info[store] = 0
-                continue
-
-            # Then check for "In stock" message with quantity
-            patterns = [
-                f'In stock at\\s*{store}\\s*([0-9,]+)\\s*in stock',
-                f'{store}[^0-9]*([0-9,]+)\\s*in stock',
-                f'status__label[^>]*>[^>]*{store}[^0-9]*([0-9,]+)\\s*in stock'
-            ]
-            
-            found = False
-            for pattern in patterns:
-                match = re.search(pattern, html, re.IGNORECASE)
-                if match:
-                    try:
-                        qty_str = match.group(1).replace(',', '')
-                        stock_info[store] = int(qty_str)
-                        found = True
-                        break
-                    except (ValueError, IndexError) as e:
-                        print(f"Error parsing quantity for {store}: {e}")
-            
-            # If no stock information found, assume out of stock
-            if not found:
-                stock_info[store] = 0
-        
-        return StockInfo.from_dict(stock_info)
-
-    async def _exponential_backoff(self, attempt: int, max_attempts: int = 5):
-        """Implement exponential backoff for rate limiting"""
-        if attempt >= max_attempts:
-            raise Exception("Max retry attempts reached")
-        wait_time = min(300, (2 ** attempt))
-        print(f"Rate limited. Waiting {wait_time} seconds before retry...")
-        await asyncio.sleep(wait_time)
+        """Parse stock information from the page content"""
+        return StockInfo.from_dict(parse_availability(html))
 
-    async def _scrape_product(self, url: str, attempt: int = 0) -> Optional[Dict]:
-        """Scrape a single URL with retry logic"""
+    async def _scrape_product(self, url: str) -> Optional[str]:
+        """Fetch a single product page; throttled attempts are retried by the fetch engine"""
         print(f"\nChecking stock for: {url}")
+        start = time.perf_counter()
+        outcome = 'error'
         try:
-            result = self.app.scrape_url(url, params={'formats': ['html']})
-            if result and 'html' in result:
-                return result
+            body = await self.fetcher.fetch(url)
+            if body is not None:
+                outcome = 'ok'
+                return body
+            outcome = 'failed'
             print(f"Failed to scrape {url}")
             return None
         except Exception as e:
-            if "429" in str(e) and attempt < 5:  # Rate limit error
-                await self._exponential_backoff(attempt)
-                return await self._scrape_product(url, attempt + 1)
             print(f"Error scraping {url}: {str(e)}")
             return None
+        finally:
+            SCRAPE_SECONDS.labels(outcome).observe(time.perf_counter() - start)
 
-    def _save_results(self, results: Dict, is_partial: bool = False):
-        """Save results to file"""
-        file_path = self.partial_results_file if is_partial else self.results_file
-        results_with_timestamp = {
-            'timestamp': datetime.now().isoformat(),
-            'results': {url: stock_info.to_dict() for url, stock_info in results.items()}
-        }
-        with open(file_path, 'w') as f:
-            json.dump(results_with_timestamp, f, indent=4)
+    def _load_checkpoint(self) -> Dict[str, Tuple[datetime, Dict[str, int]]]:
+        """Last known (checked_at, stock) per URL from the results snapshot and journal"""
+        checkpoint = {}
+        if self.results_file.exists():
+            with open(self.results_file, 'r') as f:
+                data = json.load(f)
+            if 'timestamp' in data and 'results' in data:
+                # Snapshots written before per-product times only have the sweep's timestamp
+                default = data['timestamp']
+                checked_at = data.get('checked_at', {})
+                for url, stock in data['results'].items():
+                    checkpoint[url] = (datetime.fromisoformat(checked_at.get(url, default)), stock)
+        # Journal records are newer than the snapshot they will be compacted into
+        for url, record in self.journal.load().items():
+            checkpoint[url] = (datetime.fromisoformat(record['checked_at']), record['stock'])
+        return checkpoint
+
+    def _resume_from_checkpoint(self, urls: List[str], max_age: timedelta) -> Dict[str, StockInfo]:
+        """Return results still fresh within max_age, keeping them in the journal"""
+        cutoff = datetime.now() - max_age
+        journaled = self.journal.load()
+        fresh = {}
+        for url, (checked_at, stock) in self._load_checkpoint().items():
+            if checked_at < cutoff or url not in urls:
+                continue
+            fresh[url] = StockInfo.from_dict(stock)
+            # Carry snapshot-only entries into the journal so compaction keeps them
+            if url not in journaled:
+                self.journal.append(url, stock, checked_at)
+        self.journal.flush()
+        return fresh
 
-    async def check_stock(self, batch_size: int = 2) -> Dict[str, StockInfo]:
-        """Check stock for all products"""
-        urls = self.csv_handler.get_all_product_urls()
+    async def check_stock(self, resume: bool = False,
+                          max_age: timedelta = timedelta(hours=RESUME_MAX_AGE_HOURS)) -> Dict[str, StockInfo]:
+        """Check stock for all products.
+
+        With ``resume``, products checked within ``max_age`` (by an earlier,
+        possibly interrupted sweep) are reused instead of fetched again.
+        """
+        # The catalog lists some products more than once; fetch each URL once
+        urls = list(dict.fromkeys(self.csv_handler.get_all_product_urls()))
         results = {}
+        
+        if resume:
+            results = self._resume_from_checkpoint(set(urls), max_age)
+            urls = [url for url in urls if url not in results]
+            print(f"\nResuming: {len(results)} products checked within the last {max_age}, skipping them")
+        else:
+            self.journal.reset()
+        reused = len(results)
         total_urls = len(urls)
         
-        print(f"\nChecking stock for {total_urls} products")
+        print(f"\nChecking stock for {total_urls} products "
+              f"({self.engine.concurrency} concurrent, starting at {self.engine.governor.rate:g} requests/sec)")
         
-        for i in range(0, total_urls, batch_size):
-            batch = urls[i:i + batch_size]
-            print(f"\nProgress: {i}/{total_urls} URLs processed ({(i/total_urls)*100:.1f}%)")
-            
-            tasks = []
-            for url in batch:
-                await asyncio.sleep(2)  # Rate limiting delay
-                tasks.append(asyncio.create_task(self._scrape_product(url)))
-            
-            batch_results = await asyncio.gather(*tasks)
-            
-            for url, result in zip(batch, batch_results):
-                if result and 'html' in result:
-                    stock_info = self._parse_stock_info(result['html'])
+        processed = 0
+        fetched = self.engine.map(self._scrape_product, urls)
+        try:
+            # Pages are parsed in the process pool while later ones are fetched
+            async for url, stock in self.parser.map(parse_availability, fetched):
+                processed += 1
+                if stock is not None:
+                    stock_info = StockInfo.from_dict(stock)
                     results[url] = stock_info
                     product = self.csv_handler.get_product_by_url(url)
                     product_name = product.name if product else "Unknown Product"
                     print(f"\nStock information for {product_name} ({url}):")
                     print(stock_info)  # Will use the new string representation
                     
-                    # Save partial results
-                    self._save_results(results, is_partial=True)
-            
-            await asyncio.sleep(3)  # Batch delay
+                    # Checkpoint this product
+                    self.journal.append(url, stock_info.to_dict())
+                
+                print(f"\nProgress: {processed}/{total_urls} URLs processed ({(processed/total_urls)*100:.1f}%)")
+        finally:
+            self.journal.close()
+            await self.fetcher.close()
         
-        self._save_results(results)
+        self.journal.compact(self.results_file)
+        checked = len(results) - reused
+        if checked:
+            # Products carried over by a resume are recorded with the time they were actually checked
+            product_checked_at = {url: checked_at for url, (checked_at, _) in self._load_checkpoint().items()}
+            try:
+                run_id = self._get_history().record_sweep(results, product_checked_at=product_checked_at)
+                print(f"\nRecorded {len(results)} products ({checked} checked now) in the stock history as run {run_id}")
+            except Exception as e:
+                # The snapshot above is already saved; only the history entry is lost
+                print(f"Error recording stock history: {e}")
+        else:
+            print("\nNo products were checked in this sweep; the stock history is unchanged")
+        if self.fetcher.cache is not None:
+            print(f"\nResponse cache: {self.fetcher.cache.summary()}")
         return results
 
-    def get_latest_stock_results(self) -> Optional[Dict]:
-        """Get the latest stock results from file"""
-        if self.results_file.exists():
-            with open(self.results_file, 'r') as f:
-                data = json.load(f)
-                if 'results' in data:
-                    return {url: StockInfo.from_dict(stock_data) 
-                           for url, stock_data in data['results'].items()}
-        return None
+    def _get_history(self) -> StockHistory:
+        if self.history is None:
+            self.history = get_stock_history()
+        return self.history
+
+    def get_latest_stock_results(self) -> Optional[StockMatrix]:
+        """Get the latest stock results from the stock history, or from file if it has none"""
+        try:
+            results = self._get_history().latest_results()
+        except Exception as e:
+            print(f"Error reading stock history: {e}")
+            results = None
+        return results if results is not None else load_stock_results(self.results_file)
+
+def load_stock_results(results_file: Path = STOCK_RESULTS_FILE) -> Optional[StockMatrix]:
+    """Read a stock results snapshot without setting up a fetcher"""
+    if results_file.exists():
+        with open(results_file, 'r') as f:
+            data = json.load(f)
+            if 'results' in data:
+                return StockMatrix.from_results(data['results'])
+    return None
 
-async def main():
+async def main(resume: bool = False, max_age_hours: float = RESUME_MAX_AGE_HOURS):
     checker = StockChecker(FIRECRAWL_API_KEY)
     try:
-        results = await checker.check_stock()
-        print("\nStock check completed. Results saved to stock_results.json")
+        results = await checker.check_stock(resume=resume, max_age=timedelta(hours=max_age_hours))
+        print(f"\nStock check completed. Results saved to {STOCK_RESULTS_FILE}")
         return results
     except KeyboardInterrupt:
-        print("\nScript interrupted by user")
+        print("\nScript interrupted by user. Run again with --resume to continue")
         raise
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    import argparse
+    parser = argparse.ArgumentParser(description='IKEA stock sweep')
+    parser.add_argument('--resume', action='store_true',
+                        help='Skip products checked recently by an earlier sweep')
+    parser.add_argument('--max-age-hours', type=float, default=RESUME_MAX_AGE_HOURS,
+                        help='How recent a check must be to be skipped on resume')
+    args = parser.parse_args()
+    asyncio.run(main(args.resume, args.max_age_hours))
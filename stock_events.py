@@ -0,0 +1,125 @@
+import asyncio
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Deque, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+import orjson
+
+from config import STOCK_EVENTS_HISTORY, STORES
+from stock_matrix import StockLike, StockMatrix
+
+
+def diff_stock(old: Mapping[str, StockLike],
+               new: Mapping[str, StockLike]) -> Tuple[Dict[str, Dict[str, int]], List[str]]:
+    """(changed quantities per product and store, products no longer listed) between two snapshots.
+
+    The snapshots are compared as StockMatrix arrays, so only the products
+    that changed are visited in Python.
+    """
+    old, new = StockMatrix.from_results(old), StockMatrix.from_results(new)
+    # Row of each new product in the old snapshot, -1 for new products
+    rows = np.fromiter((old.index.get(url, -1) for url in new.urls), dtype=np.intp, count=len(new))
+    listed = rows >= 0
+    changed = np.ones(new.quantities.shape, dtype=bool)
+    changed[listed] = old.quantities[rows[listed]] != new.quantities[listed]
+    changes = {}
+    for row in np.flatnonzero(changed.any(axis=1)).tolist():
+        quantities = new.quantities[row].tolist()
+        changes[new.urls[row]] = {STORES[column]: quantities[column]
+                                  for column in np.flatnonzero(changed[row]).tolist()}
+    removed = [url for url in old.urls if url not in new.index]
+    return changes, removed
+
+
+def event_id(loaded_at: datetime) -> int:
+    """Event ids are snapshot load times in milliseconds, so workers sharing a snapshot agree on them"""
+    return int(loaded_at.timestamp() * 1000)
+
+
+def sse_frame(event: str, id: int, data: Dict) -> bytes:
+    return b"id: %d\nevent: %s\ndata: %s\n\n" % (id, event.encode(), orjson.dumps(data))
+
+
+class StockBroadcaster:
+    """Publishes stock snapshot changes as Server-Sent Events frames.
+
+    Each published snapshot is diffed against the previous one once, and the
+    encoded frame goes into a ring buffer of the last ``history`` events that
+    every subscriber reads from. Subscribers only wait: on a condition when
+    they are threads, or on one event per event loop when they are
+    coroutines. A subscriber that fell further behind than the buffer gets a
+    ``reset`` event telling it to reload everything.
+    """
+
+    def __init__(self, history: int = STOCK_EVENTS_HISTORY):
+        # (id, id of the snapshot it was diffed against, frame)
+        self._events: Deque[Tuple[int, int, bytes]] = deque(maxlen=history)
+        self._data: Optional[StockMatrix] = None
+        self.last_id: Optional[int] = None
+        self.loaded_at: Optional[datetime] = None
+        self._changed = threading.Condition()
+        self._loop_events: Dict[asyncio.AbstractEventLoop, asyncio.Event] = {}
+
+    def publish(self, data: StockMatrix, loaded_at: datetime):
+        """Record a new snapshot and wake the subscribers"""
+        id = event_id(loaded_at)
+        with self._changed:
+            if self._data is not None and id != self.last_id:
+                changes, removed = diff_stock(self._data, data)
+                frame = sse_frame('stock', id, {'loaded_at': loaded_at.isoformat(), 'changes': changes,
+                                                'removed': removed})
+                self._events.append((id, self.last_id, frame))
+            self._data = data
+            self.last_id = id
+            self.loaded_at = loaded_at
+            self._changed.notify_all()
+            loops = list(self._loop_events)
+        for loop in loops:
+            try:
+                loop.call_soon_threadsafe(self._wake, loop)
+            except RuntimeError:  # the loop was closed
+                with self._changed:
+                    self._loop_events.pop(loop, None)
+
+    def _wake(self, loop: asyncio.AbstractEventLoop):
+        with self._changed:
+            event = self._loop_events.pop(loop, None)
+        if event is not None:
+            event.set()
+
+    def catch_up(self, last_id: Optional[int]) -> Tuple[List[bytes], Optional[int]]:
+        """Frames a subscriber that has seen ``last_id`` should get next, and the id it is then at"""
+        with self._changed:
+            current = self.last_id
+            if current is None or last_id == current:
+                return [], last_id
+            if last_id is not None:
+                frames = []
+                for id, base, frame in self._events:
+                    if frames or base == last_id:
+                        frames.append(frame)
+                if frames:
+                    return frames, current
+            # New subscriber, or one that missed more than the buffer holds
+            kind = 'ready' if last_id is None else 'reset'
+            return [sse_frame(kind, current, {'loaded_at': self.loaded_at.isoformat()})], current
+
+    def wait(self, last_id: Optional[int], timeout: float) -> bool:
+        """Block until there is a snapshot newer than ``last_id``; False on timeout"""
+        with self._changed:
+            return self._changed.wait_for(lambda: self.last_id != last_id, timeout)
+
+    async def wait_async(self, last_id: Optional[int], timeout: float) -> bool:
+        """``wait`` for coroutines: every subscriber on a loop shares one asyncio.Event"""
+        loop = asyncio.get_running_loop()
+        with self._changed:
+            if self.last_id != last_id:
+                return True
+            event = self._loop_events.setdefault(loop, asyncio.Event())
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
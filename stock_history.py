@@ -0,0 +1,184 @@
+"""Stock history: every sweep's results, kept as a time series in the DuckDB database.
+
+Each sweep becomes one run in ``stock_runs`` and one row per product and
+store in ``stock_history`` (run_id, checked_at, article_number, product_url,
+store, qty), appended as a single Arrow batch. Runs are numbered in order,
+so the latest results are a run_id lookup rather than a scan.
+"""
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+
+from config import STORES
+from database import Database, get_database
+from models import StockInfo, article_number
+from stock_matrix import StockMatrix
+
+
+class StockHistory:
+    """Appends sweeps to the stock history tables and answers questions about them.
+
+    Queries run on a read-only database; ``record_sweep`` takes write access
+    only while it appends, so readers never hold DuckDB's exclusive lock.
+    """
+
+    def __init__(self, db: Optional[Database] = None):
+        self.db = db or get_database()
+
+    def _ensure_tables(self):
+        with self.db.transaction() as cursor:
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS stock_runs (
+                    run_id BIGINT PRIMARY KEY,
+                    checked_at TIMESTAMP,
+                    products INTEGER
+                )
+            """)
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS stock_history (
+                    run_id BIGINT,
+                    checked_at TIMESTAMP,
+                    article_number VARCHAR,
+                    product_url VARCHAR,
+                    store VARCHAR,
+                    qty INTEGER
+                )
+            """)
+
+    def record_sweep(self, results: Dict[str, StockInfo], checked_at: Optional[datetime] = None,
+                     product_checked_at: Optional[Mapping[str, datetime]] = None) -> int:
+        """Append one sweep's results (product URL -> stock) as a new run; returns its run_id.
+
+        Rows are stamped with the run's ``checked_at`` unless
+        ``product_checked_at`` says when a product was actually checked, as for
+        results a resumed sweep carried over from an earlier one.
+        """
+        checked_at = checked_at or datetime.now()
+        product_checked_at = product_checked_at or {}
+        stock = StockMatrix.from_results(results)
+        urls = stock.urls
+        rows = len(urls) * len(STORES)
+
+        with self.db.writable():
+            self._ensure_tables()
+            with self.db.transaction() as cursor:
+                run_id = cursor.execute("SELECT coalesce(max(run_id), 0) + 1 FROM stock_runs").fetchone()[0]
+                batch = pa.table({
+                    'run_id': pa.repeat(pa.scalar(run_id, pa.int64()), rows),
+                    'checked_at': pa.array([product_checked_at.get(url, checked_at) for url in urls for _ in STORES],
+                                           pa.timestamp('us')),
+                    'article_number': pa.array([article_number(url) for url in urls for _ in STORES], pa.string()),
+                    'product_url': pa.array([url for url in urls for _ in STORES], pa.string()),
+                    'store': pa.array(STORES * len(urls), pa.string()),
+                    'qty': pa.array(stock.quantities.ravel()),
+                })
+                cursor.execute("INSERT INTO stock_runs VALUES (?, ?, ?)", [run_id, checked_at, len(urls)])
+                cursor.register('sweep_batch', batch)
+                try:
+                    cursor.execute("INSERT INTO stock_history SELECT * FROM sweep_batch")
+                finally:
+                    cursor.unregister('sweep_batch')
+        return run_id
+
+    def _recorded(self) -> bool:
+        """Whether any sweep was ever recorded (the tables exist)"""
+        return self.db.cursor().execute(
+            "SELECT count(*) FROM duckdb_tables() WHERE table_name = 'stock_runs'").fetchone()[0] > 0
+
+    def latest_run(self) -> Optional[Tuple[int, datetime]]:
+        """(run_id, checked_at) of the most recent sweep, or None if none was recorded"""
+        if not self._recorded():
+            return None
+        return self.db.cursor().execute(
+            "SELECT run_id, checked_at FROM stock_runs ORDER BY run_id DESC LIMIT 1").fetchone()
+
+    def latest_results(self) -> Optional[StockMatrix]:
+        """Stock per product URL from the most recent sweep, or None if none was recorded"""
+        run = self.latest_run()
+        if run is None:
+            return None
+        # One row per product, with a column per store
+        columns = ', '.join(f"max(qty) FILTER (WHERE store = ${i + 2})" for i in range(len(STORES)))
+        rows = self.db.cursor().execute(f"""
+            SELECT product_url, {columns}
+            FROM stock_history
+            WHERE run_id = $1
+            GROUP BY product_url
+        """, [run[0], *STORES]).fetchall()
+        return StockMatrix([row[0] for row in rows], np.array([row[1:] for row in rows], dtype=np.int32))
+
+    def stock_over_time(self, article: str) -> List[Tuple[datetime, StockInfo]]:
+        """(checked_at, stock) for an article number in every sweep that checked it, oldest first"""
+        if not self._recorded():
+            return []
+        rows = self.db.cursor().execute("""
+            SELECT checked_at, store, qty
+            FROM stock_history
+            WHERE article_number = ?
+            ORDER BY run_id
+        """, [article]).fetchall()
+        history: Dict[datetime, Dict[str, int]] = {}
+        for checked_at, store, qty in rows:
+            history.setdefault(checked_at, {})[store] = qty
+        return [(checked_at, StockInfo.from_dict(quantities)) for checked_at, quantities in history.items()]
+
+    def last_in_stock(self, article: str, store: str) -> Optional[datetime]:
+        """When a sweep last found an article in stock at a store, or None if it never did"""
+        if not self._recorded():
+            return None
+        return self.db.cursor().execute("""
+            SELECT max(checked_at)
+            FROM stock_history
+            WHERE article_number = ? AND store = ? AND qty > 0
+        """, [article, store]).fetchone()[0]
+
+
+_history: Optional[StockHistory] = None
+_history_lock = threading.Lock()
+
+
+def get_stock_history() -> StockHistory:
+    """The process-wide StockHistory on the product database"""
+    global _history
+    with _history_lock:
+        if _history is None:
+            _history = StockHistory()
+        return _history
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description='Query or fill the stock history')
+    commands = parser.add_subparsers(dest='command', required=True)
+    over_time = commands.add_parser('history', help='Stock of an article in every sweep')
+    over_time.add_argument('article', help='Article number, e.g. 20477181')
+    last = commands.add_parser('last-in-stock', help='When a store last had an article')
+    last.add_argument('article')
+    last.add_argument('store', choices=STORES)
+    backfill = commands.add_parser('import', help='Record a stock_results.json snapshot as a sweep')
+    backfill.add_argument('results_file', type=Path)
+    args = parser.parse_args()
+
+    if args.command == 'history':
+        history = get_stock_history()
+        for checked_at, stock in history.stock_over_time(args.article):
+            print(checked_at.isoformat(sep=' ', timespec='seconds'),
+                  '  '.join(f"{store}: {qty}" for store, qty in stock.to_dict().items()))
+    elif args.command == 'last-in-stock':
+        history = get_stock_history()
+        when = history.last_in_stock(args.article, args.store)
+        print(when.isoformat(sep=' ', timespec='seconds') if when else f"Never in stock at {args.store}")
+    else:
+        with open(args.results_file, 'r') as f:
+            data = json.load(f)
+        results = StockMatrix.from_results(data['results'])
+        product_checked_at = {url: datetime.fromisoformat(when) for url, when in data.get('checked_at', {}).items()}
+        run_id = get_stock_history().record_sweep(results, datetime.fromisoformat(data['timestamp']),
+                                                  product_checked_at)
+        print(f"Recorded {len(results)} products from {args.results_file} as run {run_id}")
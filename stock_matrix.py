@@ -0,0 +1,132 @@
+"""Stock of many products as one products x stores int32 matrix.
+
+A ``StockMatrix`` is a read-only mapping of product URL to stock, like the
+``Dict[str, StockInfo]`` the stock checker returns, but the quantities live
+in one contiguous NumPy array with a row per product and a column per store,
+so totals and filters over the whole catalog are single array operations.
+Looking a product up gives a ``StockRow``, a view of its row that can stand
+in for a ``StockInfo``.
+"""
+import dataclasses
+from collections.abc import Mapping
+from operator import attrgetter
+from typing import Dict, Iterator, List, Mapping as MappingType, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from config import STORES
+from models import StockInfo
+
+# StockInfo attribute for each store, in STORES order
+STORE_FIELDS = tuple(field.name for field in dataclasses.fields(StockInfo))
+
+_get_fields = attrgetter(*STORE_FIELDS)
+
+
+class StockRow:
+    """One product's row of a StockMatrix, with the attributes and methods of StockInfo"""
+
+    __slots__ = ('_quantities',)
+
+    def __init__(self, quantities: np.ndarray):
+        self._quantities = quantities
+
+    def to_dict(self) -> Dict[str, int]:
+        return dict(zip(STORES, self._quantities.tolist()))
+
+    def total(self) -> int:
+        return int(self._quantities.sum())
+
+    def to_stock_info(self) -> StockInfo:
+        return StockInfo(*self._quantities.tolist())
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, StockRow):
+            return bool(np.array_equal(self._quantities, other._quantities))
+        if isinstance(other, StockInfo):
+            return self._quantities.tolist() == list(_get_fields(other))
+        return NotImplemented
+
+    __hash__ = None
+
+    def __str__(self) -> str:
+        return str(self.to_stock_info())
+
+    def __repr__(self) -> str:
+        return str(self)
+
+
+def _store_property(column: int) -> property:
+    return property(lambda self: int(self._quantities[column]))
+
+
+for _column, _field in enumerate(STORE_FIELDS):
+    setattr(StockRow, _field, _store_property(_column))
+
+
+StockLike = Union[StockInfo, StockRow, MappingType[str, int]]
+
+
+class StockMatrix(Mapping):
+    """Read-only mapping of product URL to StockRow over one int32 products x stores matrix"""
+
+    def __init__(self, urls: Sequence[str], quantities: np.ndarray):
+        self.urls: List[str] = list(urls)
+        self.quantities = np.ascontiguousarray(quantities, dtype=np.int32).reshape(len(self.urls), len(STORES))
+        self.quantities.flags.writeable = False
+        self.index: Dict[str, int] = {url: row for row, url in enumerate(self.urls)}
+        self.stores = STORES
+        self.store_index: Dict[str, int] = {store: column for column, store in enumerate(STORES)}
+
+    @classmethod
+    def from_results(cls, results: MappingType[str, StockLike]) -> 'StockMatrix':
+        """Build from stock per product URL: StockInfo, StockRow or {store: qty} values"""
+        if isinstance(results, StockMatrix):
+            return results
+        rows = [[stock.get(store, 0) for store in STORES] if isinstance(stock, Mapping) else _get_fields(stock)
+                for stock in results.values()]
+        return cls(list(results), np.array(rows, dtype=np.int32).reshape(-1, len(STORES)))
+
+    # Mapping interface, so a StockMatrix can go wherever Dict[str, StockInfo] is read
+
+    def __getitem__(self, url: str) -> StockRow:
+        return StockRow(self.quantities[self.index[url]])
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.urls)
+
+    def __len__(self) -> int:
+        return len(self.urls)
+
+    def __contains__(self, url) -> bool:
+        return url in self.index
+
+    # Aggregations over the whole catalog
+
+    def product_totals(self) -> np.ndarray:
+        """Total quantity of each product over all stores, in row order"""
+        return self.quantities.sum(axis=1, dtype=np.int64)
+
+    def store_totals(self) -> Dict[str, int]:
+        """Total quantity per store over all products"""
+        return dict(zip(STORES, self.quantities.sum(axis=0, dtype=np.int64).tolist()))
+
+    def out_of_stock(self) -> List[str]:
+        """Products out of stock at every store"""
+        rows = np.flatnonzero(~self.quantities.any(axis=1))
+        return [self.urls[row] for row in rows.tolist()]
+
+    def in_stock_at(self, store: str, min_qty: int = 1) -> List[str]:
+        """Products with at least ``min_qty`` at a store"""
+        rows = np.flatnonzero(self.quantities[:, self.store_index[store]] >= min_qty)
+        return [self.urls[row] for row in rows.tolist()]
+
+    def top_stocked(self, n: Optional[int] = None, above: int = 0) -> List[Tuple[str, int]]:
+        """(url, total) of the products with more than ``above`` in total, most stocked first.
+
+        Ties keep row order. ``n`` limits the result to the first n products.
+        """
+        totals = self.product_totals()
+        rows = np.flatnonzero(totals > above)
+        rows = rows[np.argsort(-totals[rows], kind='stable')][:n]
+        return [(self.urls[row], total) for row, total in zip(rows.tolist(), totals[rows].tolist())]
@@ -0,0 +1,107 @@
+import re
+from typing import Dict, Optional, Tuple
+
+from config import STORES
+
+_STORE_ALTERNATION = '|'.join(re.escape(store) for store in STORES)
+
+# One scanner for every store. Each match is either an "Out of stock at <store>"
+# notice or a store mention whose next number is followed by "in stock". The
+# quantity is captured in a lookahead so adjacent store mentions are not consumed.
+_AVAILABILITY_RE = re.compile(
+    rf'out of stock at\s*(?P<out>{_STORE_ALTERNATION})'
+    rf'|(?P<explicit>in stock at\s*)?(?P<store>{_STORE_ALTERNATION})'
+    rf'(?=(?P<gap>[^0-9]*)(?P<qty>[0-9][0-9,]*)\s*in stock)',
+    re.IGNORECASE
+)
+
+_LAST_DIGIT_RE = re.compile(r'[0-9][^0-9]*\Z')
+
+_CANONICAL_STORES = {store.lower(): store for store in STORES}
+
+# Fallback for the rare pages where str.lower() changes the length (e.g. "İ")
+# and would shift offsets; ASCII-only lowering keeps them aligned but is slower
+_ASCII_LOWER = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')
+
+IN_STOCK_MARKER = 'in stock'
+OUT_OF_STOCK_MARKER = 'out of stock at'
+
+# Room left after the last "Out of stock at" for whitespace and the store name
+_OUT_OF_STOCK_TAIL = 128
+
+
+def _last_digit_before(text: str, end: int) -> int:
+    """Return the index of the last digit in text[:end], or -1"""
+    window = 512
+    while True:
+        start = max(0, end - window)
+        match = _LAST_DIGIT_RE.search(text, start, end)
+        if match:
+            return match.start()
+        if start == 0:
+            return -1
+        window *= 4
+
+
+def find_availability_block(html: str) -> Optional[Tuple[int, int]]:
+    """Locate the span of the page that holds store availability.
+
+    Returns (start, end) offsets into ``html``, or None when the page has no
+    availability markers at all.
+    """
+    lowered = html.lower()
+    if len(lowered) != len(html):
+        lowered = html.translate(_ASCII_LOWER)
+    first_in = lowered.find(IN_STOCK_MARKER)
+    first_out = lowered.find(OUT_OF_STOCK_MARKER)
+    if first_in < 0 and first_out < 0:
+        return None
+
+    starts = []
+    ends = []
+    if first_out >= 0:
+        starts.append(first_out)
+        last_out = lowered.rfind(OUT_OF_STOCK_MARKER)
+        ends.append(last_out + len(OUT_OF_STOCK_MARKER) + _OUT_OF_STOCK_TAIL)
+    if first_in >= 0:
+        # A store mention only pairs with the first quantity that follows it,
+        # so nothing before the last digit preceding that quantity can match.
+        qty_start = len(lowered[:first_in].rstrip().rstrip('0123456789,'))
+        starts.append(_last_digit_before(lowered, qty_start) + 1)
+        ends.append(lowered.rfind(IN_STOCK_MARKER) + len(IN_STOCK_MARKER))
+
+    return min(starts), min(max(ends), len(html))
+
+
+def parse_availability(html: str) -> Dict[str, int]:
+    """Parse per-store stock quantities from a product page in a single pass"""
+    stock_info = dict.fromkeys(STORES, 0)
+    block = find_availability_block(html)
+    if block is None:
+        return stock_info
+
+    out_of_stock = set()
+    explicit = {}
+    mentioned = {}
+
+    for match in _AVAILABILITY_RE.finditer(html, *block):
+        if match.group('out'):
+            out_of_stock.add(_CANONICAL_STORES[match.group('out').lower()])
+            if len(out_of_stock) == len(STORES):
+                break
+            continue
+
+        store = _CANONICAL_STORES[match.group('store').lower()]
+        qty = int(match.group('qty').replace(',', ''))
+
+        # "In stock at <store> <qty> in stock" wins over a looser mention
+        if match.group('explicit') and not match.group('gap').strip():
+            explicit.setdefault(store, qty)
+        else:
+            mentioned.setdefault(store, qty)
+
+    for store in STORES:
+        if store not in out_of_stock:
+            stock_info[store] = explicit.get(store, mentioned.get(store, 0))
+    return stock_info
+
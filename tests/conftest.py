@@ -0,0 +1,46 @@
+import asyncio
+import os
+import sys
+from types import SimpleNamespace
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(ROOT / 'benchmarks'))
+
+# One cache per test process, never the shared sqlite file
+os.environ.setdefault('STOCK_CACHE_BACKEND', 'local')
+
+
+@pytest.fixture
+def in_tmp_path(tmp_path, monkeypatch):
+    """Run the test from an empty working directory (the modules use relative paths)"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+class FakeClock:
+    """Monotonic time for the rate limiter that only moves when the code under test sleeps"""
+
+    def __init__(self):
+        self.now = 0.0
+        self._sleep = asyncio.sleep
+
+    def monotonic(self) -> float:
+        return self.now
+
+    async def sleep(self, seconds: float):
+        self.now += max(seconds, 0.0)
+        await self._sleep(0)
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    """Drive rate_governor and every asyncio.sleep from a FakeClock"""
+    import rate_governor
+    clock = FakeClock()
+    monkeypatch.setattr(rate_governor, 'time', SimpleNamespace(monotonic=clock.monotonic))
+    monkeypatch.setattr(asyncio, 'sleep', clock.sleep)
+    return clock
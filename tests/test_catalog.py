@@ -0,0 +1,137 @@
+import csv
+import os
+from pathlib import Path
+from typing import List
+
+from catalog import Catalog
+from csv_handler import CSVHandler
+from database import Database
+from models import Product
+
+PLATE = 'https://www.ikea.com.hk/en/products/plates/plate-art-20477181'
+BOWL = 'https://www.ikea.com.hk/en/products/bowls/bowl-art-30477185'
+MUG = 'https://www.ikea.com.hk/en/products/mugs/mug-art-40477189'
+HEADER = ['Product Name', 'Product URL', 'Description', 'Price', 'Image URL', 'Local Image Path']
+
+
+def write_csv(path: Path, rows: List[List[str]], header: List[str] = HEADER, mtime_offset: int = 0):
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        writer.writerows(rows)
+    # Make the change visible even on filesystems with coarse mtimes
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + mtime_offset * 10 ** 9))
+
+
+def read_csv(path: Path) -> List[dict]:
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def catalog_csv(tmp_path: Path) -> Path:
+    path = tmp_path / 'products.csv'
+    write_csv(path, [
+        ['Plate', PLATE, 'A plate', '9.9', 'https://example.com/plate.jpg', 'product_images/plate.jpg'],
+        ['Bowl', BOWL, 'A bowl', '1,299', '', ''],
+        ['Plate again', PLATE, 'A repeated listing', '12', '', ''],
+    ])
+    return path
+
+
+def test_csv_products_are_indexed_by_url_and_article_number(tmp_path: Path):
+    handler = CSVHandler(str(catalog_csv(tmp_path)))
+    assert [product.name for product in handler.get_all_products()] == ['Plate', 'Bowl', 'Plate again']
+    assert handler.get_all_product_urls() == [PLATE, BOWL, PLATE]
+    # The first listing of a repeated product wins
+    assert handler.get_product_by_url(PLATE).name == 'Plate'
+    assert handler.get_product_by_article_number('30477185').url == BOWL
+    assert str(handler.get_product_by_url(BOWL).price) == '1299'
+    assert handler.get_product_by_url(MUG) is None
+    assert handler.get_product_by_article_number('99999999') is None
+
+
+def test_csv_image_url_is_generated_from_the_article_number(tmp_path: Path):
+    handler = CSVHandler(str(catalog_csv(tmp_path)))
+    # As before the catalog was indexed: the Image URL column is not read back
+    assert handler.get_product_by_url(PLATE).image_url == 'https://www.ikea.com.hk/dairyfarm/hk/images/20477181.jpg'
+    assert handler.get_product_by_url(BOWL).image_url == 'https://www.ikea.com.hk/dairyfarm/hk/images/30477185.jpg'
+
+
+def test_catalog_reloads_when_the_file_changes(tmp_path: Path):
+    path = catalog_csv(tmp_path)
+    handler = CSVHandler(str(path))
+    assert handler.get_product_by_url(MUG) is None
+
+    write_csv(path, [['Mug', MUG, 'A mug', '5', '', '']], mtime_offset=5)
+    assert handler.get_product_by_article_number('40477189').name == 'Mug'
+    assert handler.get_product_by_url(PLATE) is None
+    # Every handler of the file shares the reloaded catalog
+    assert CSVHandler(str(path)).catalog is handler.catalog
+
+
+def test_catalog_loads_once_per_version(tmp_path: Path):
+    path = tmp_path / 'source'
+    path.write_text('v1')
+    loads = []
+
+    def load() -> List[Product]:
+        loads.append(path.read_text())
+        return [Product(name='Plate', url=PLATE, description='', image_url='', price=None)]
+
+    catalog = Catalog(load, [path])
+    for _ in range(3):
+        assert catalog.by_url(PLATE).name == 'Plate'
+        assert catalog.by_article('20477181') is not None
+    assert len(catalog) == 1
+    assert loads == ['v1']
+
+    catalog.invalidate()
+    catalog.products()
+    assert loads == ['v1', 'v1']
+
+
+def test_csv_update_product_images_rewrites_only_the_image_column(tmp_path: Path):
+    path = catalog_csv(tmp_path)
+    handler = CSVHandler(str(path))
+    handler.get_all_products()
+    catalog_products = handler.catalog.products()
+
+    updated = handler.update_product_images({PLATE: 'https://example.com/new.jpg', MUG: 'https://example.com/mug.jpg'})
+    assert updated == 2  # both listings of the plate; the mug is not in the file
+    rows = read_csv(path)
+    assert [row['Image URL'] for row in rows] == ['https://example.com/new.jpg', '', 'https://example.com/new.jpg']
+    assert [row['Local Image Path'] for row in rows] == ['product_images/plate.jpg', '', '']
+    assert [row['Price'] for row in rows] == ['9.9', '1,299', '12']
+    assert list(rows[0]) == HEADER
+    # The catalog was reloaded from the new file
+    assert handler.catalog.products() is not catalog_products
+    assert not list(tmp_path.glob('*.tmp'))
+
+
+def test_csv_update_product_images_adds_a_missing_image_column(tmp_path: Path):
+    path = tmp_path / 'products.csv'
+    write_csv(path, [['Bowl', BOWL, 'A bowl', '5']], header=HEADER[:4])
+    assert CSVHandler(str(path)).update_product_image(BOWL, 'https://example.com/bowl.jpg')
+    assert read_csv(path) == [{'Product Name': 'Bowl', 'Product URL': BOWL, 'Description': 'A bowl',
+                               'Price': '5', 'Image URL': 'https://example.com/bowl.jpg'}]
+
+
+def test_database_products_are_indexed_and_updated_in_bulk(tmp_path: Path):
+    db = Database(str(tmp_path / 'products.db'))
+    with db.transaction() as cursor:
+        cursor.executemany("INSERT INTO ikea_products VALUES (?, ?, ?, ?, ?)", [
+            ('Plate', PLATE, 'A plate', None, 9.9),
+            ('Bowl', BOWL, 'A bowl', None, 12.5),
+        ])
+    db.catalog.invalidate()
+    assert db.get_all_product_urls() == [PLATE, BOWL]
+    assert db.get_product_by_article_number('30477185').name == 'Bowl'
+    assert db.get_product_by_url(PLATE).image_url is None
+
+    updated = db.update_product_images({PLATE: 'https://example.com/plate.jpg', MUG: 'https://example.com/mug.jpg'})
+    assert updated == 1
+    assert db.get_product_by_url(PLATE).image_url == 'https://example.com/plate.jpg'
+    assert db.get_product_by_url(BOWL).image_url is None
+    assert db.update_product_images({}) == 0
+    db.close()
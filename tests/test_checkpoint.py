@@ -0,0 +1,139 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, Optional
+
+import pytest
+
+from bench_parse import AVAILABILITY_BLOCK
+from checkpoint import CheckpointJournal
+from csv_handler import CSVHandler
+from database import Database
+from fetch_engine import FetchEngine
+from fetchers import Fetcher
+from parse_pool import ParseStage
+from rate_governor import RateGovernor
+from stock_checker import StockChecker
+from stock_history import StockHistory
+
+URLS = [f"https://www.ikea.com.hk/en/products/test/product-art-1000000{i}" for i in range(3)]
+STOCK = {'Warehouse': 1, 'Causeway Bay': 2, 'Kowloon Bay': 3, 'Macau Taipa': 4, 'Shatin': 5, 'Tsuen Wan': 6}
+
+
+class PageFetcher(Fetcher):
+    """Serves the same availability block for every URL and records what was fetched"""
+
+    def __init__(self):
+        super().__init__(FetchEngine(4, RateGovernor(rate=1e6, max_rate=1e6, burst=1e6)))
+        self.fetched: List[str] = []
+
+    async def _fetch(self, url: str) -> Optional[str]:
+        self.fetched.append(url)
+        return AVAILABILITY_BLOCK
+
+
+@pytest.fixture(scope='module')
+def parser():
+    stage = ParseStage(workers=1)
+    yield stage
+    stage.close()
+
+
+def make_checker(workdir: Path, parser: ParseStage) -> StockChecker:
+    catalog = workdir / 'catalog.csv'
+    catalog.write_text('Product Name,Product URL,Description,Price\n' +
+                       ''.join(f"Product {i},{url},test,1.0\n" for i, url in enumerate(URLS)))
+    checker = StockChecker('offline', fetcher=PageFetcher(), parser=parser,
+                           history=StockHistory(Database(str(workdir / 'history.db'))))
+    checker.csv_handler = CSVHandler(str(catalog))
+    checker.results_file = workdir / 'stock_results.json'
+    checker.journal.path = workdir / 'stock_results_partial.ndjson'
+    return checker
+
+
+def test_compact_keeps_each_products_check_time(in_tmp_path: Path):
+    journal = CheckpointJournal(in_tmp_path / 'partial.ndjson')
+    old = datetime.now() - timedelta(hours=30)
+    journal.append(URLS[0], STOCK, old)
+    journal.append(URLS[1], STOCK)
+    results = journal.compact(in_tmp_path / 'stock_results.json')
+
+    assert set(results) == {URLS[0], URLS[1]}
+    with open(in_tmp_path / 'stock_results.json') as f:
+        snapshot = json.load(f)
+    assert datetime.fromisoformat(snapshot['checked_at'][URLS[0]]) == old
+    assert not journal.path.exists()
+
+
+def test_resume_skips_only_fresh_products(in_tmp_path: Path, parser: ParseStage):
+    checker = make_checker(in_tmp_path, parser)
+    stale = datetime.now() - timedelta(hours=30)
+    fresh = datetime.now() - timedelta(hours=1)
+    checker.journal.append(URLS[0], STOCK, stale)
+    checker.journal.append(URLS[1], STOCK, fresh)
+    checker.journal.compact(checker.results_file)
+
+    results = asyncio.run(checker.check_stock(resume=True, max_age=timedelta(hours=24)))
+
+    assert set(results) == set(URLS)
+    assert sorted(checker.fetcher.fetched) == [URLS[0], URLS[2]]
+    # The reused product keeps its original check time in the new snapshot
+    checkpoint = checker._load_checkpoint()
+    assert checkpoint[URLS[1]][0] == fresh
+    assert checkpoint[URLS[0]][0] > fresh
+
+
+def test_resumed_products_age_across_sweeps(in_tmp_path: Path, parser: ParseStage):
+    checker = make_checker(in_tmp_path, parser)
+    checked_at = datetime.now() - timedelta(hours=2)
+    for url in URLS:
+        checker.journal.append(url, STOCK, checked_at)
+    checker.journal.compact(checker.results_file)
+
+    # Everything is fresh within a day, so nothing is fetched ...
+    checker.fetcher = PageFetcher()
+    asyncio.run(checker.check_stock(resume=True, max_age=timedelta(hours=24)))
+    assert checker.fetcher.fetched == []
+
+    # ... but the reused results are still two hours old, not as old as the last sweep
+    checker.fetcher = PageFetcher()
+    asyncio.run(checker.check_stock(resume=True, max_age=timedelta(hours=1)))
+    assert sorted(checker.fetcher.fetched) == sorted(URLS)
+
+
+def test_resume_reads_snapshots_without_per_product_times(in_tmp_path: Path, parser: ParseStage):
+    checker = make_checker(in_tmp_path, parser)
+    with open(checker.results_file, 'w') as f:
+        json.dump({'timestamp': (datetime.now() - timedelta(hours=30)).isoformat(),
+                   'results': {URLS[0]: STOCK}}, f)
+
+    assert checker._resume_from_checkpoint(set(URLS), timedelta(hours=24)) == {}
+    assert set(checker._resume_from_checkpoint(set(URLS), timedelta(hours=48))) == {URLS[0]}
+
+
+def test_resumed_sweep_records_real_check_times(in_tmp_path: Path, parser: ParseStage):
+    checker = make_checker(in_tmp_path, parser)
+    earlier = (datetime.now() - timedelta(hours=3)).replace(microsecond=0)
+    checker.journal.append(URLS[0], STOCK, earlier)
+    checker.journal.compact(checker.results_file)
+
+    start = datetime.now()
+    asyncio.run(checker.check_stock(resume=True, max_age=timedelta(hours=24)))
+
+    article = URLS[0].rsplit('-art-', 1)[1]
+    assert [when for when, _ in checker.history.stock_over_time(article)] == [earlier]
+    assert all(when >= start for url in URLS[1:]
+               for when, _ in checker.history.stock_over_time(url.rsplit('-art-', 1)[1]))
+
+
+def test_resume_with_nothing_to_fetch_records_no_run(in_tmp_path: Path, parser: ParseStage):
+    checker = make_checker(in_tmp_path, parser)
+    asyncio.run(checker.check_stock())
+    run = checker.history.latest_run()
+
+    checker.fetcher = PageFetcher()
+    results = asyncio.run(checker.check_stock(resume=True, max_age=timedelta(hours=24)))
+    assert set(results) == set(URLS)
+    assert checker.fetcher.fetched == []
+    assert checker.history.latest_run() == run
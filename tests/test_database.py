@@ -0,0 +1,77 @@
+import subprocess
+import sys
+from pathlib import Path
+
+import duckdb
+
+from database import Database, get_database
+
+PRODUCT = ('Plate', 'https://www.ikea.com.hk/en/products/plates/plate-art-20477181', 'A plate', None, 9.9)
+
+
+def create_catalog(path: Path):
+    db = Database(str(path))
+    with db.transaction() as cursor:
+        cursor.execute("INSERT INTO ikea_products VALUES (?, ?, ?, ?, ?)", PRODUCT)
+    db.close()
+
+
+def readable_elsewhere(path: Path) -> bool:
+    """Whether another process can open the file, which a writer's exclusive lock prevents"""
+    script = f"import duckdb; duckdb.connect({str(path)!r}, read_only=True).close()"
+    return subprocess.run([sys.executable, '-c', script], capture_output=True).returncode == 0
+
+
+def test_get_database_opens_read_only_by_default(tmp_path: Path):
+    path = tmp_path / 'products.db'
+    create_catalog(path)
+    db = get_database(str(path))
+    assert db.read_only
+    assert db.get_all_product_urls() == [PRODUCT[1]]
+    assert readable_elsewhere(path)
+    db.close()
+
+
+def test_a_writer_upgrades_the_shared_read_only_database(tmp_path: Path):
+    path = tmp_path / 'products.db'
+    create_catalog(path)
+    reader = get_database(str(path))
+    reader.get_all_products()
+    cursor = reader.cursor()
+
+    writer = get_database(str(path), read_only=False)
+    assert writer is reader and not writer.read_only
+    assert writer.update_product_images({PRODUCT[1]: 'https://example.com/plate.jpg'}) == 1
+    # Readers keep working through the same object, on the new connection
+    assert reader.cursor() is not cursor
+    assert reader.get_product_by_url(PRODUCT[1]).image_url == 'https://example.com/plate.jpg'
+    # Later read-only callers share the writable database
+    assert get_database(str(path)) is writer
+    writer.close()
+
+
+def test_writes_on_a_read_only_database_only_lock_while_writing(tmp_path: Path):
+    path = tmp_path / 'products.db'
+    create_catalog(path)
+    db = Database(str(path), read_only=True)
+
+    with db.writable():
+        assert not db.read_only
+        assert not readable_elsewhere(path)
+    assert db.read_only
+
+    assert db.update_product_images({PRODUCT[1]: 'https://example.com/plate.jpg'}) == 1
+    assert db.read_only
+    assert db.get_product_by_url(PRODUCT[1]).image_url == 'https://example.com/plate.jpg'
+    assert readable_elsewhere(path)
+    db.close()
+
+
+def test_a_missing_file_can_be_opened_read_only(tmp_path: Path):
+    path = tmp_path / 'new.db'
+    db = Database(str(path), read_only=True)
+    assert db.read_only
+    assert db.get_all_products() == []
+    db.close()
+    assert duckdb.connect(str(path), read_only=True).execute(
+        "SELECT count(*) FROM ikea_products").fetchone() == (0,)
@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+from conftest import FakeClock
+from fetch_engine import FetchEngine
+from rate_governor import RateGovernor, RateLimited
+
+
+def test_map_never_has_more_than_concurrency_in_flight(clock: FakeClock):
+    engine = FetchEngine(concurrency=3, governor=RateGovernor(rate=50, max_rate=50, burst=5))
+    in_flight, peak = 0, 0
+
+    async def fetch(item: int) -> int:
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        # Uneven latencies so runners pick up new items at different times
+        await asyncio.sleep(0.01 * (item % 4 + 1))
+        in_flight -= 1
+        return item * 2
+
+    async def run():
+        return [pair async for pair in engine.map(lambda item: engine.request(fetch, item), range(20))]
+
+    pairs = asyncio.run(run())
+    assert sorted(pairs) == [(item, item * 2) for item in range(20)]
+    assert peak == 3
+
+
+def test_map_reraises_a_worker_error():
+    engine = FetchEngine(concurrency=2, governor=RateGovernor(rate=1000, max_rate=1000, burst=10))
+
+    async def fetch(item: int) -> int:
+        if item == 3:
+            raise ValueError(item)
+        return item
+
+    async def run():
+        return [pair async for pair in engine.map(fetch, range(6))]
+
+    with pytest.raises(ValueError):
+        asyncio.run(run())
+
+
+def test_last_throttled_attempt_is_reported_before_it_is_raised():
+    governor = RateGovernor(rate=1000, min_rate=1, max_rate=1000, burst=10)
+    engine = FetchEngine(concurrency=1, governor=governor, max_retries=0)
+
+    async def fetch():
+        raise RateLimited("slow down")
+
+    with pytest.raises(RateLimited):
+        asyncio.run(engine.request(fetch))
+    assert governor.rate == 1000 * governor.decrease
+
+
+def test_a_request_past_the_timeout_counts_as_a_throttle():
+    governor = RateGovernor(rate=1000, min_rate=1, max_rate=1000, burst=10)
+    engine = FetchEngine(concurrency=1, governor=governor, max_retries=1, timeout=0.05)
+    attempts = []
+
+    async def fetch():
+        attempts.append(len(attempts))
+        if len(attempts) == 1:
+            await asyncio.sleep(10)
+        return 'ok'
+
+    assert asyncio.run(engine.request(fetch)) == 'ok'
+    assert attempts == [0, 1]
+    assert engine.retries == 1
+    assert governor.rate < 1000
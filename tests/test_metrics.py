@@ -0,0 +1,59 @@
+import pytest
+
+from metrics import Counter, Gauge, Histogram, Metric, Registry
+
+
+def test_metric_kinds_must_implement_children_and_samples():
+    with pytest.raises(TypeError):
+        Metric('abstract', 'Not a metric kind', registry=Registry())
+
+
+def test_render_uses_the_text_exposition_format():
+    registry = Registry()
+    requests = Counter('app_requests_total', 'Requests served', ['route', 'status'], registry=registry)
+    rate = Gauge('app_rate', 'Current rate', registry=registry)
+    latency = Histogram('app_seconds', 'Latency', ['route'], buckets=(0.1, 1), registry=registry)
+
+    requests.labels('/', '200').inc()
+    requests.labels(route='/api', status='404').inc(2)
+    requests.labels('/', '200').inc()
+    rate.set(2.5)
+    for value in (0.05, 0.1, 0.5, 3):
+        latency.labels('/').observe(value)
+
+    assert registry.render() == '''\
+# HELP app_requests_total Requests served
+# TYPE app_requests_total counter
+app_requests_total{route="/",status="200"} 2
+app_requests_total{route="/api",status="404"} 2
+# HELP app_rate Current rate
+# TYPE app_rate gauge
+app_rate 2.5
+# HELP app_seconds Latency
+# TYPE app_seconds histogram
+app_seconds_bucket{route="/",le="0.1"} 2
+app_seconds_bucket{route="/",le="1"} 3
+app_seconds_bucket{route="/",le="+Inf"} 4
+app_seconds_sum{route="/"} 3.65
+app_seconds_count{route="/"} 4
+'''
+
+
+def test_label_values_are_escaped():
+    registry = Registry()
+    errors = Counter('app_errors_total', 'Errors\nby message', ['message'], registry=registry)
+    errors.labels('say "hi"\\n').inc()
+    assert registry.render().splitlines() == [
+        '# HELP app_errors_total Errors\\nby message',
+        '# TYPE app_errors_total counter',
+        'app_errors_total{message="say \\"hi\\"\\\\n"} 1',
+    ]
+
+
+def test_names_and_label_counts_are_checked():
+    registry = Registry()
+    counter = Counter('app_total', 'Total', ['route'], registry=registry)
+    with pytest.raises(ValueError):
+        Counter('app_total', 'Again', registry=registry)
+    with pytest.raises(ValueError):
+        counter.labels('/', 'extra')
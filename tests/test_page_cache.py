@@ -0,0 +1,61 @@
+import gzip
+from typing import List
+
+import brotli
+
+from page_cache import RenderCache, compress_stream, variant_etag
+
+
+def renderer(calls: List[str], body: bytes = b'<html>page</html>'):
+    def render() -> bytes:
+        calls.append(body.decode())
+        return body
+    return render
+
+
+def test_a_response_is_rendered_once_per_version():
+    cache, calls = RenderCache(), []
+    first = cache.get('v1', '/?page=1', renderer(calls), 'text/html')
+    assert cache.get('v1', '/?page=1', renderer(calls), 'text/html') is first
+    assert cache.peek('v1', '/?page=1') is first
+    assert len(calls) == 1
+
+    # A new snapshot version drops every entry of the old one
+    assert cache.peek('v2', '/?page=1') is None
+    cache.get('v2', '/?page=1', renderer(calls), 'text/html')
+    assert len(calls) == 2
+    assert cache.peek('v1', '/?page=1') is None
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache, calls = RenderCache(max_entries=2), []
+    cache.get('v1', 'a', renderer(calls), 'text/html')
+    cache.get('v1', 'b', renderer(calls), 'text/html')
+    cache.peek('v1', 'a')
+    cache.get('v1', 'c', renderer(calls), 'text/html')
+    assert cache.peek('v1', 'b') is None
+    assert cache.peek('v1', 'a') is not None
+    assert cache.peek('v1', 'c') is not None
+
+
+def test_every_variant_decodes_to_the_rendered_body():
+    body = b'{"products": []}' * 100
+    response = RenderCache().get('v1', '/api/products', lambda: body, 'application/json')
+    assert response.mimetype == 'application/json'
+    assert response.variants['identity'] == body
+    assert gzip.decompress(response.variants['gzip']) == body
+    assert brotli.decompress(response.variants['br']) == body
+
+
+def test_streamed_chunks_decode_to_the_whole_body():
+    chunks = [b'<tr>row %d</tr>' % i for i in range(50)]
+    assert b''.join(compress_stream(chunks, 'identity')) == b''.join(chunks)
+    assert gzip.decompress(b''.join(compress_stream(chunks, 'gzip'))) == b''.join(chunks)
+    assert brotli.decompress(b''.join(compress_stream(chunks, 'br'))) == b''.join(chunks)
+
+
+def test_etags_differ_per_version_key_and_encoding():
+    tag = RenderCache.etag('v1', '/')
+    assert tag != RenderCache.etag('v2', '/') != RenderCache.etag('v1', '/?page=2')
+    assert variant_etag(tag, 'identity') == tag
+    assert len({variant_etag(tag, encoding) for encoding in ('identity', 'gzip', 'br')}) == 3
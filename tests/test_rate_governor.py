@@ -0,0 +1,65 @@
+import asyncio
+import time
+from typing import List
+
+import pytest
+import requests
+
+from conftest import FakeClock
+from rate_governor import RateGovernor, TokenBucket, is_throttled
+
+
+def test_success_admitted_before_a_cut_does_not_raise_the_rate():
+    governor = RateGovernor(rate=4, min_rate=0.1, max_rate=10, increase=1, decrease=0.5)
+    admitted_at = time.monotonic()
+    governor.on_throttle(admitted_at=admitted_at)
+    assert governor.rate == 2
+
+    # Still in flight when the rate was cut: ignored
+    governor.on_success(admitted_at)
+    assert governor.rate == 2
+
+    governor.on_success(time.monotonic())
+    assert governor.rate == 2.5
+
+
+def test_throttles_are_recognised_by_status_not_message():
+    response = requests.Response()
+    response.status_code = 429
+    assert is_throttled(requests.HTTPError("Unexpected error", response=response))
+    assert is_throttled(requests.Timeout())
+    assert not is_throttled(Exception("Product 4290 not found"))
+
+
+def admissions(bucket: TokenBucket, count: int) -> List[float]:
+    async def run():
+        return [await bucket.acquire() for _ in range(count)]
+    return asyncio.run(run())
+
+
+def test_token_bucket_admits_a_burst_then_refills_at_the_rate(clock: FakeClock):
+    bucket = TokenBucket(rate=4, capacity=3)
+    times = admissions(bucket, 7)
+    assert times[:3] == [0, 0, 0]
+    assert times[3:] == pytest.approx([0.25, 0.5, 0.75, 1.0])
+
+
+def test_token_bucket_refills_up_to_its_capacity(clock: FakeClock):
+    bucket = TokenBucket(rate=2, capacity=2)
+    admissions(bucket, 2)
+    clock.now += 60
+    # A long idle period only earns ``capacity`` tokens
+    assert admissions(bucket, 3) == pytest.approx([60, 60, 60.5])
+
+
+def test_token_bucket_pause_holds_every_caller(clock: FakeClock):
+    bucket = TokenBucket(rate=10, capacity=5)
+    bucket.pause(3)
+    assert admissions(bucket, 2) == pytest.approx([3.1, 3.2])
+
+
+def test_set_rate_changes_the_spacing(clock: FakeClock):
+    bucket = TokenBucket(rate=1)
+    admissions(bucket, 1)
+    bucket.set_rate(5)
+    assert admissions(bucket, 2) == pytest.approx([0.2, 0.4])
@@ -0,0 +1,72 @@
+import asyncio
+from pathlib import Path
+from typing import Optional
+
+from config import IMAGE_PAGE_TTL
+from fetch_engine import FetchEngine
+from fetchers import FirecrawlFetcher, HttpFetcher
+from image_scraper import SCREENSHOT_PARAMS
+from rate_governor import RateGovernor
+from response_cache import ResponseCache
+
+URL = 'https://www.ikea.com.hk/en/products/test/product-art-10000000'
+PAGE = '<html><body>Shatin 5 in stock</body></html>'
+
+
+def engine() -> FetchEngine:
+    return FetchEngine(2, RateGovernor(rate=1e6, max_rate=1e6, burst=1e6))
+
+
+def test_image_download_reuses_an_http_stock_check_of_the_page(tmp_path: Path):
+    cache = ResponseCache(tmp_path)
+    fetcher = HttpFetcher(engine(), cache=cache)
+    fetches = []
+
+    async def get(url: str) -> str:
+        fetches.append(url)
+        return PAGE
+    fetcher._get = get
+
+    async def image_page_load() -> Optional[bytes]:
+        raise AssertionError("the page should come from the cache")
+
+    async def run():
+        assert await fetcher.fetch(URL) == PAGE
+        # The same call IkeaImageDownloader.get_product_image_url makes
+        return await cache.get_or_fetch(URL, None, IMAGE_PAGE_TTL, image_page_load, consumer='images')
+
+    assert asyncio.run(run()) == PAGE.encode()
+    assert fetches == [URL]
+    assert cache.stats['stock.misses'] == 1
+    assert cache.stats['images.hits'] == 1
+
+
+def test_firecrawl_stock_checks_and_screenshots_are_separate_entries():
+    assert ResponseCache.key(URL, FirecrawlFetcher.PARAMS) != ResponseCache.key(URL, SCREENSHOT_PARAMS)
+    assert ResponseCache.key(URL, None) == ResponseCache.key(URL, {})
+
+
+def test_concurrent_requests_share_one_load(tmp_path: Path):
+    cache = ResponseCache(tmp_path)
+    loads = []
+
+    async def load() -> bytes:
+        loads.append(1)
+        await asyncio.sleep(0.01)
+        return b'body'
+
+    async def run():
+        return await asyncio.gather(*(cache.get_or_fetch(URL, None, 60, load) for _ in range(5)))
+
+    assert asyncio.run(run()) == [b'body'] * 5
+    assert len(loads) == 1
+    assert cache.stats['default.shared'] == 4
+
+
+def test_writes_leave_no_temporary_files(tmp_path: Path):
+    cache = ResponseCache(tmp_path)
+    cache.put(URL, b'first')
+    cache.put(URL, b'second')
+    assert [path.suffix for path in tmp_path.glob('*/*')] == ['.z']
+    assert cache.get(URL) == b'second'
+    assert cache.get(URL, ttl=-1) is None
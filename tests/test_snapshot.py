@@ -0,0 +1,95 @@
+import random
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import pandas as pd
+import pytest
+
+from catalog_scaling import build_products_rowwise, make_catalog
+from config import STORES
+from conftest import ROOT
+from snapshot import CatalogSnapshot, build_products
+from stock_matrix import StockMatrix
+from stock_checker import load_stock_results
+
+PRICES_CSV = ROOT / 'ikea_products.csv'
+IMAGES_CSV = ROOT / 'ikea_products_with_images.csv'
+
+
+def test_build_products_matches_rowwise_build():
+    stock_data = load_stock_results(ROOT / 'stock_results.json')
+    assert build_products(PRICES_CSV, IMAGES_CSV, stock_data) == \
+        build_products_rowwise(PRICES_CSV, IMAGES_CSV, stock_data)
+
+
+def test_build_products_without_local_images(tmp_path: Path):
+    # Before any image download the column is empty and pandas reads it as float
+    df = pd.read_csv(PRICES_CSV)
+    df['Local Image Path'] = None
+    path = tmp_path / 'catalog.csv'
+    df.to_csv(path, index=False)
+    stock_data = load_stock_results(ROOT / 'stock_results.json')
+
+    products = build_products(path, path, stock_data)
+    assert len(products) == 61
+    assert all(product['image_path'] is None for product in products)
+    assert products == build_products_rowwise(path, path, stock_data)
+
+
+def test_build_products_matches_rowwise_on_synthetic_catalogs(tmp_path: Path):
+    for local_images in (True, False):
+        path, stock_data = make_catalog(500, tmp_path, local_images=local_images)
+        assert build_products(path, path, stock_data) == build_products_rowwise(path, path, stock_data)
+
+
+def random_products(count: int, seed: int) -> List[Dict]:
+    rng = random.Random(seed)
+    # Few distinct values, so filters land on ties and on the boundaries
+    return [{'name': f"Product {i:04d}", 'url': f"https://example.com/{i}",
+             'price_value': rng.choice([None, 0.0, 9.9, 10.0, 49.0, 120.5]),
+             'stock': {store: rng.choice([0, 0, 1, 2, 5, 30]) for store in STORES}}
+            for i in range(count)]
+
+
+def brute_force(products: List[Dict], in_stock=(), min_qty: Optional[Dict[str, int]] = None,
+                min_price: Optional[float] = None, max_price: Optional[float] = None) -> List[Dict]:
+    def matches(product: Dict) -> bool:
+        price = product['price_value']
+        if (min_price is not None or max_price is not None) and price is None:
+            return False
+        return (all(product['stock'][store] > 0 for store in in_stock)
+                and all(product['stock'][store] >= qty for store, qty in (min_qty or {}).items())
+                and (min_price is None or price >= min_price)
+                and (max_price is None or price <= max_price))
+    return [product for product in products if matches(product)]
+
+
+FILTERS = [
+    {},
+    {'in_stock': ['Shatin']},
+    {'in_stock': ['Shatin', 'Tsuen Wan']},
+    {'min_qty': {'Warehouse': 2}},
+    {'min_qty': {'Warehouse': 0}},
+    {'min_qty': {'Causeway Bay': 31}},
+    {'min_qty': {'Kowloon Bay': 5, 'Macau Taipa': 1}, 'in_stock': ['Shatin']},
+    {'min_price': 10.0},
+    {'max_price': 10.0},
+    {'min_price': 9.9, 'max_price': 49.0},
+    {'min_price': 50, 'max_price': 20},
+    {'min_price': 0.0, 'in_stock': ['Warehouse'], 'min_qty': {'Tsuen Wan': 2}},
+]
+
+
+@pytest.mark.parametrize('count', [0, 1, 7, 64, 300])
+@pytest.mark.parametrize('filters', FILTERS)
+def test_query_matches_a_brute_force_filter(count: int, filters: Dict):
+    products = random_products(count, seed=count)
+    snapshot = CatalogSnapshot(products, (), StockMatrix.from_results({}))
+    expected = brute_force(products, **filters)
+
+    total, page = snapshot.query(**filters)
+    assert total == len(expected)
+    assert page == expected
+    for offset, limit in [(0, 5), (3, 10), (len(expected) - 1, 5), (len(expected) + 2, 5)]:
+        offset = max(offset, 0)
+        assert snapshot.query(offset, limit, **filters) == (len(expected), expected[offset:offset + limit])
@@ -0,0 +1,72 @@
+import json
+import os
+import time
+from datetime import timedelta
+from pathlib import Path
+
+from stock_cache import SharedStockCache, StockCache
+from stock_checker import load_stock_results
+
+URL = 'https://www.ikea.com.hk/en/products/test/product-art-10000000'
+
+
+def write_results(path: Path, warehouse: int):
+    stock = {'Warehouse': warehouse, 'Causeway Bay': 0, 'Kowloon Bay': 0,
+             'Macau Taipa': 0, 'Shatin': 0, 'Tsuen Wan': 0}
+    with open(path, 'w') as f:
+        json.dump({'timestamp': '2024-12-01T00:00:00', 'results': {URL: stock}}, f)
+    # Make the change visible even on filesystems with coarse mtimes
+    mtime = time.time() + warehouse
+    os.utime(path, (mtime, mtime))
+
+
+def wait_for(condition, timeout: float = 5.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            return False
+        time.sleep(0.01)
+    return True
+
+
+def test_new_results_file_is_served_before_ttl(tmp_path: Path):
+    results = tmp_path / 'stock_results.json'
+    write_results(results, 1)
+    updates = []
+    cache = StockCache(lambda: load_stock_results(results), ttl=timedelta(hours=4),
+                       on_update=lambda data, _: updates.append(data[URL].warehouse), sources=[results])
+    assert cache.get()[URL].warehouse == 1
+
+    # Unchanged file: served from memory
+    cache.get()
+    assert updates == [1]
+
+    write_results(results, 2)
+    cache.get()
+    assert wait_for(lambda: cache.get()[URL].warehouse == 2)
+    assert updates == [1, 2]
+
+
+def test_shared_cache_republishes_a_new_results_file_within_the_poll_interval(tmp_path: Path):
+    results = tmp_path / 'stock_results.json'
+    write_results(results, 1)
+
+    def shared_cache(updates):
+        return SharedStockCache(lambda: load_stock_results(results), path=tmp_path / 'cache.sqlite',
+                                ttl=timedelta(hours=4), poll_interval=timedelta(0),
+                                on_update=lambda data, _: updates.append(data[URL].warehouse),
+                                sources=[results])
+
+    first_updates, second_updates = [], []
+    first, second = shared_cache(first_updates), shared_cache(second_updates)
+    assert first.get()[URL].warehouse == 1
+    assert second.get()[URL].warehouse == 1
+
+    write_results(results, 2)
+    first.get()
+    assert wait_for(lambda: first.get()[URL].warehouse == 2)
+    # The other worker adopts the republished snapshot instead of loading the file itself
+    second.get()
+    assert wait_for(lambda: second.get()[URL].warehouse == 2)
+    assert first.version == second.version == 2
+    assert first_updates == second_updates == [1, 2]
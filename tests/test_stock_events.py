@@ -0,0 +1,22 @@
+from config import STORES
+from stock_events import diff_stock
+from stock_matrix import StockMatrix
+
+
+def stock(**quantities):
+    return {store: quantities.get(store.replace(' ', '_').lower(), 0) for store in STORES}
+
+
+def test_diff_stock_reports_changed_new_and_removed_products():
+    old = StockMatrix.from_results({'a': stock(shatin=1), 'b': stock(warehouse=5), 'c': stock()})
+    new = StockMatrix.from_results({'b': stock(warehouse=5), 'a': stock(shatin=2, tsuen_wan=3), 'd': stock()})
+
+    changes, removed = diff_stock(old, new)
+    assert changes == {'a': {'Shatin': 2, 'Tsuen Wan': 3}, 'd': stock()}
+    assert removed == ['c']
+
+
+def test_diff_stock_between_equal_snapshots_is_empty():
+    snapshot = StockMatrix.from_results({'a': stock(shatin=1)})
+    assert diff_stock(snapshot, StockMatrix.from_results({'a': stock(shatin=1)})) == ({}, [])
+    assert diff_stock(StockMatrix.from_results({}), StockMatrix.from_results({})) == ({}, [])
@@ -0,0 +1,40 @@
+from datetime import datetime
+from pathlib import Path
+
+from config import STORES
+from database import Database
+from stock_history import StockHistory
+from test_database import readable_elsewhere
+
+URL = 'https://www.ikea.com.hk/en/products/plates/plate-art-20477181'
+
+
+def stock(**quantities):
+    return {store: quantities.get(store.replace(' ', '_').lower(), 0) for store in STORES}
+
+
+def test_queries_never_take_the_write_lock(tmp_path: Path):
+    path = tmp_path / 'history.db'
+    history = StockHistory(Database(str(path), read_only=True))
+    assert history.latest_results() is None
+    assert history.stock_over_time('20477181') == []
+    assert history.last_in_stock('20477181', 'Shatin') is None
+    assert history.db.read_only
+    assert readable_elsewhere(path)
+
+
+def test_record_sweep_writes_then_goes_back_to_read_only(tmp_path: Path):
+    path = tmp_path / 'history.db'
+    history = StockHistory(Database(str(path), read_only=True))
+    first, second = datetime(2024, 12, 1, 9), datetime(2024, 12, 2, 9)
+    assert history.record_sweep({URL: stock(shatin=3)}, first) == 1
+    assert history.record_sweep({URL: stock(warehouse=7)}, second) == 2
+    assert history.db.read_only
+    assert readable_elsewhere(path)
+
+    assert history.latest_results()[URL].to_dict() == stock(warehouse=7)
+    assert [(when, info.to_dict()) for when, info in history.stock_over_time('20477181')] == [
+        (first, stock(shatin=3)), (second, stock(warehouse=7))
+    ]
+    assert history.last_in_stock('20477181', 'Shatin') == first
+    assert history.last_in_stock('20477181', 'Tsuen Wan') is None
@@ -0,0 +1,73 @@
+import dataclasses
+import json
+import random
+from typing import Dict, List
+
+import pytest
+
+from config import STORES
+from conftest import ROOT
+from models import StockInfo
+from stock_matrix import STORE_FIELDS, StockMatrix
+
+Results = Dict[str, Dict[str, int]]
+
+
+def random_results(count: int, seed: int) -> Results:
+    rng = random.Random(seed)
+    return {f"https://example.com/product-art-{i:08d}": {store: rng.choice([0, 0, 0, 1, 3, 12]) for store in STORES}
+            for i in range(count)}
+
+
+def saved_results() -> Results:
+    with open(ROOT / 'stock_results.json') as f:
+        return json.load(f)['results']
+
+
+CASES = [random_results(count, seed=count) for count in (0, 1, 25, 200)] + [saved_results()]
+
+
+def test_store_fields_follow_the_stores():
+    assert len(STORE_FIELDS) == len(STORES)
+    info = StockInfo(*range(1, len(STORES) + 1))
+    assert info.to_dict() == dict(zip(STORES, range(1, len(STORES) + 1)))
+    assert [field.name for field in dataclasses.fields(StockInfo)] == list(STORE_FIELDS)
+
+
+@pytest.mark.parametrize('results', CASES)
+def test_rows_match_the_results(results: Results):
+    matrix = StockMatrix.from_results(results)
+    assert list(matrix) == list(results)
+    for url, stock in results.items():
+        assert matrix[url].to_dict() == stock
+        assert matrix[url] == StockInfo.from_dict(stock)
+        assert matrix[url].total() == sum(stock.values())
+
+
+@pytest.mark.parametrize('results', CASES)
+def test_store_totals(results: Results):
+    expected = {store: sum(stock[store] for stock in results.values()) for store in STORES}
+    assert StockMatrix.from_results(results).store_totals() == expected
+
+
+@pytest.mark.parametrize('results', CASES)
+def test_out_of_stock(results: Results):
+    expected = [url for url, stock in results.items() if not any(stock.values())]
+    assert StockMatrix.from_results(results).out_of_stock() == expected
+
+
+@pytest.mark.parametrize('results', CASES)
+@pytest.mark.parametrize('store', STORES)
+@pytest.mark.parametrize('min_qty', [1, 3, 13])
+def test_in_stock_at(results: Results, store: str, min_qty: int):
+    expected = [url for url, stock in results.items() if stock[store] >= min_qty]
+    assert StockMatrix.from_results(results).in_stock_at(store, min_qty) == expected
+
+
+@pytest.mark.parametrize('results', CASES)
+@pytest.mark.parametrize('n, above', [(None, 0), (5, 0), (None, 10), (3, 20)])
+def test_top_stocked(results: Results, n, above: int):
+    totals = [(url, sum(stock.values())) for url, stock in results.items()]
+    # sorted() is stable, so ties keep the results' order
+    expected: List = sorted((pair for pair in totals if pair[1] > above), key=lambda pair: -pair[1])[:n]
+    assert StockMatrix.from_results(results).top_stocked(n, above) == expected
@@ -0,0 +1,34 @@
+import pytest
+
+from bench_parse import AVAILABILITY_BLOCK, legacy_parse, load_pages
+from config import STORES
+from stock_parser import find_availability_block, parse_availability
+
+PAGES = load_pages()
+
+
+def test_fixtures_are_present():
+    # The HTML page, both JSON dumps, and a copy of each with an availability block
+    assert len(PAGES) == 6
+
+
+@pytest.mark.parametrize('name', sorted(PAGES))
+def test_matches_the_per_store_parser_on_saved_pages(name):
+    assert parse_availability(PAGES[name]) == legacy_parse(PAGES[name])
+
+
+def test_reads_every_store_from_an_availability_block():
+    assert parse_availability('<main>' + AVAILABILITY_BLOCK + '</main>') == {
+        'Warehouse': 30, 'Causeway Bay': 1213, 'Kowloon Bay': 0, 'Macau Taipa': 0, 'Shatin': 10, 'Tsuen Wan': 18
+    }
+
+
+def test_page_without_availability_is_out_of_stock_everywhere():
+    html = '<html><body>No stock information here</body></html>'
+    assert find_availability_block(html) is None
+    assert parse_availability(html) == dict.fromkeys(STORES, 0)
+
+
+def test_out_of_stock_wins_over_a_quantity():
+    html = 'Out of stock at Shatin <span>Shatin 5 in stock</span>'
+    assert parse_availability(html)['Shatin'] == legacy_parse(html)['Shatin'] == 0
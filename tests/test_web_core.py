@@ -0,0 +1,80 @@
+import gzip
+from datetime import datetime
+
+import brotli
+import pytest
+
+import web_core
+from page_cache import RenderCache
+from snapshot import CatalogSnapshot
+from stock_matrix import StockMatrix
+from web_core import BadRequest, cached_response, products_query
+
+
+@pytest.mark.parametrize('value', ['nan', 'NaN', 'inf', '-inf', 'infinity'])
+def test_price_filters_reject_non_finite_numbers(value):
+    for name in ('min_price', 'max_price'):
+        with pytest.raises(BadRequest):
+            products_query({name: value})
+
+
+def test_price_filters_accept_finite_numbers():
+    query = products_query({'min_price': '10', 'max_price': '49.9'})
+    assert (query['min_price'], query['max_price']) == (10.0, 49.9)
+
+
+class FixedStock:
+    timestamp = datetime(2024, 12, 1)
+
+    def get_entry(self):
+        return StockMatrix.from_results({}), self.timestamp
+
+
+class FixedSnapshots:
+    snapshot = CatalogSnapshot([], ('catalog',), StockMatrix.from_results({}))
+
+    def get(self, stock_data):
+        return self.snapshot
+
+    peek = get
+
+
+@pytest.fixture
+def fixed_snapshot(monkeypatch):
+    monkeypatch.setattr(web_core, 'get_stock_cache', FixedStock)
+    monkeypatch.setattr(web_core, 'get_snapshot_store', FixedSnapshots)
+    monkeypatch.setattr(web_core, 'render_cache', RenderCache())
+
+
+@pytest.mark.parametrize('accept_encoding, encoding', [
+    ('', 'identity'),
+    ('gzip', 'gzip'),
+    ('gzip, deflate, br', 'br'),
+    ('br;q=0.5, gzip', 'gzip'),
+    ('identity', 'identity'),
+    ('compress', 'identity'),
+])
+def test_cached_response_serves_the_preferred_encoding(fixed_snapshot, accept_encoding, encoding):
+    body = b'<html>products</html>' * 20
+    status, headers, payload = cached_response('/', lambda *_: body, 'text/html', accept_encoding)
+    assert status == 200
+    assert headers.get('Content-Encoding', 'identity') == encoding
+    assert headers['Vary'] == 'Accept-Encoding'
+    decode = {'identity': bytes, 'gzip': gzip.decompress, 'br': brotli.decompress}[encoding]
+    assert decode(payload) == body
+
+
+def test_cached_response_answers_a_matching_etag_with_304(fixed_snapshot):
+    renders = []
+
+    def render(*_):
+        renders.append(1)
+        return b'body'
+
+    _, headers, _ = cached_response('/', render, 'text/html', 'br')
+    status, _, payload = cached_response('/', render, 'text/html', 'br', if_none_match=headers['ETag'])
+    assert (status, payload) == (304, b'')
+    # The gzip variant has its own validator
+    status, _, _ = cached_response('/', render, 'text/html', 'gzip', if_none_match=headers['ETag'])
+    assert status == 200
+    assert renders == [1]
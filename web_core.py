@@ -0,0 +1,294 @@
+"""Catalog, stock and response caching shared by the Flask (web_app) and ASGI (asgi_app) servers"""
+import asyncio
+import math
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, Iterator, Mapping, Optional, Tuple, Union
+
+import orjson
+from jinja2 import Template
+from werkzeug.http import parse_accept_header, parse_etags, quote_etag
+
+from config import API_MAX_PAGE_SIZE, API_PAGE_SIZE, INDEX_STREAM_ROWS, STOCK_EVENTS_KEEPALIVE_SECONDS, STORES
+from metrics import PRODUCT_DATA_SECONDS, RENDER_CACHE_REQUESTS
+from page_cache import ENCODINGS, RenderCache, compress_stream, variant_etag
+from snapshot import CatalogSnapshot, get_snapshot_store
+from stock_cache import StockCache, create_stock_cache
+from stock_events import StockBroadcaster
+from stock_matrix import StockMatrix
+
+# Fields a JSON API client can ask for with ?fields=
+PRODUCT_FIELDS = ('name', 'url', 'description', 'price', 'price_value', 'image_path', 'stock')
+
+# Changes between stock snapshots, for the event stream
+stock_events = StockBroadcaster()
+
+
+def _on_stock_update(stock_data: StockMatrix, loaded_at: datetime):
+    get_snapshot_store().get(stock_data)
+    stock_events.publish(stock_data, loaded_at)
+
+
+_stock_cache: Optional[StockCache] = None
+
+
+def get_stock_cache() -> StockCache:
+    """Return the process-wide stock cache.
+
+    Stock data is refreshed in the background once it is older than the TTL.
+    The catalog snapshot is rebuilt and the stock changes published as each
+    new stock snapshot arrives, off the request path.
+    """
+    global _stock_cache
+    if _stock_cache is None:
+        _stock_cache = create_stock_cache(on_update=_on_stock_update)
+    return _stock_cache
+
+# Rendered pages and API responses for the current snapshot version
+render_cache = RenderCache()
+
+# render(snapshot, loaded_at) -> response body
+Render = Callable[[CatalogSnapshot, Optional[datetime]], bytes]
+# render(snapshot, loaded_at) -> response body in chunks
+StreamRender = Callable[[CatalogSnapshot, Optional[datetime]], Iterator[bytes]]
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def link_product_images(static_folder: Union[str, Path] = 'static'):
+    """Serve product_images/ from under the static folder"""
+    os.makedirs(static_folder, exist_ok=True)
+    product_images_link = Path(static_folder) / 'product_images'
+    if not product_images_link.exists():
+        os.symlink(Path('product_images').absolute(), product_images_link)
+
+
+def warm_up() -> CatalogSnapshot:
+    """Load the stock data and build the catalog snapshot ahead of the first request"""
+    return get_snapshot_store().get(get_stock_cache().get())
+
+
+def index_context(snapshot: CatalogSnapshot, loaded_at: Optional[datetime]) -> Dict:
+    """Template variables for index.html"""
+    last_update = loaded_at.strftime('%Y-%m-%d %H:%M:%S') if loaded_at else 'Never'
+    next_update = (loaded_at + get_stock_cache().ttl).strftime('%Y-%m-%d %H:%M:%S') if loaded_at else 'Unknown'
+    return {'products': snapshot.products, 'datetime': datetime,
+            'last_update': last_update, 'next_update': next_update}
+
+
+def _store_param(name: str) -> str:
+    if name not in STORES:
+        raise BadRequest(f"Unknown store: {name}")
+    return name
+
+
+def _number_param(args: Mapping[str, str], name: str, convert, minimum=None):
+    value = args.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        number = convert(value)
+    except ValueError:
+        raise BadRequest(f"{name} must be a number")
+    # float() also accepts 'nan' and 'inf'; a nan bound would match no price at all
+    if not math.isfinite(number):
+        raise BadRequest(f"{name} must be a finite number")
+    if minimum is not None and number < minimum:
+        raise BadRequest(f"{name} must be at least {minimum}")
+    return number
+
+
+def products_query(args: Mapping[str, str]) -> Dict:
+    """Validated /api/products parameters; raises BadRequest"""
+    in_stock = [_store_param(name) for name in args.get('in_stock', '').split(',') if name]
+    min_qty = _number_param(args, 'min_qty', int, 0)
+    min_qty_filter = None
+    if min_qty is not None:
+        if 'store' not in args:
+            raise BadRequest("min_qty needs a store")
+        min_qty_filter = {_store_param(args['store']): min_qty}
+    fields = [field for field in args.get('fields', '').split(',') if field] or PRODUCT_FIELDS
+    unknown = set(fields) - set(PRODUCT_FIELDS)
+    if unknown:
+        raise BadRequest(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return {
+        'in_stock': in_stock,
+        'min_qty': min_qty_filter,
+        'min_price': _number_param(args, 'min_price', float),
+        'max_price': _number_param(args, 'max_price', float),
+        'page': _number_param(args, 'page', int, 1) or 1,
+        'per_page': min(_number_param(args, 'per_page', int, 1) or API_PAGE_SIZE, API_MAX_PAGE_SIZE),
+        'fields': fields,
+    }
+
+
+def products_renderer(query: Dict) -> Render:
+    """Render function for one /api/products page"""
+    def render(snapshot: CatalogSnapshot, loaded_at: Optional[datetime]) -> bytes:
+        page, per_page, fields = query['page'], query['per_page'], query['fields']
+        total, products = snapshot.query(
+            offset=(page - 1) * per_page, limit=per_page, in_stock=query['in_stock'],
+            min_qty=query['min_qty'], min_price=query['min_price'], max_price=query['max_price'])
+        return orjson.dumps({
+            'total': total,
+            'page': page,
+            'per_page': per_page,
+            'last_update': loaded_at.isoformat() if loaded_at else None,
+            'products': [{field: product[field] for field in fields} for product in products]
+        })
+    return render
+
+
+def cache_key(path: str, query_string: str) -> str:
+    """Render cache key for a request, independent of parameter order"""
+    return f"{path}?{'&'.join(sorted(query_string.split('&')))}"
+
+
+def _validators(snapshot: CatalogSnapshot, loaded_at: Optional[datetime], key: str,
+                accept_encoding: str) -> Tuple[str, str, Dict[str, str]]:
+    """(snapshot version, ETag, response headers) for ``key`` in the encoding the client prefers"""
+    version = f"{snapshot.signature}|{loaded_at.isoformat() if loaded_at else ''}"
+    encoding = parse_accept_header(accept_encoding).best_match(ENCODINGS, default='identity')
+    etag = variant_etag(render_cache.etag(version, key), encoding)
+    headers = {
+        'ETag': quote_etag(etag),
+        'Vary': 'Accept-Encoding',
+        # Clients may keep a copy but must revalidate it, which is a cheap 304
+        'Cache-Control': 'no-cache',
+    }
+    if encoding != 'identity':
+        headers['Content-Encoding'] = encoding
+    return version, etag, headers
+
+
+def cached_response(key: str, render: Render, mimetype: str, accept_encoding: str = '',
+                    if_none_match: str = '', build: bool = True) -> Optional[Tuple[int, Dict[str, str], bytes]]:
+    """(status, headers, body) for a response rendered once per snapshot version.
+
+    ``render`` is only called when the current version has no cached copy, and
+    a matching If-None-Match gets a 304 without rendering anything. With
+    ``build=False`` nothing is loaded, rebuilt or rendered: None is returned
+    instead, so async servers can move that work off the event loop.
+    """
+    store = get_snapshot_store()
+    stock_cache = get_stock_cache()
+    if build:
+        with PRODUCT_DATA_SECONDS.time():
+            stock_data, loaded_at = stock_cache.get_entry()
+            snapshot = store.get(stock_data)
+    else:
+        if stock_cache.timestamp is None:
+            return None
+        stock_data, loaded_at = stock_cache.get_entry()
+        snapshot = store.peek(stock_data)
+        if snapshot is None:
+            return None
+
+    version, etag, headers = _validators(snapshot, loaded_at, key, accept_encoding)
+    if parse_etags(if_none_match).contains_weak(etag):
+        RENDER_CACHE_REQUESTS.labels('not_modified').inc()
+        return 304, headers, b''
+
+    rendered = render_cache.peek(version, key)
+    if rendered is not None:
+        RENDER_CACHE_REQUESTS.labels('hit').inc()
+    elif not build:
+        return None
+    else:
+        RENDER_CACHE_REQUESTS.labels('miss').inc()
+        rendered = render_cache.get(version, key, lambda: render(snapshot, loaded_at), mimetype)
+    encoding = headers.get('Content-Encoding', 'identity')
+    return 200, headers, rendered.variants[encoding]
+
+
+def streamed_response(key: str, render: StreamRender, accept_encoding: str = '',
+                      if_none_match: str = '') -> Tuple[int, Dict[str, str], Iterator[bytes]]:
+    """(status, headers, body chunks) for a response streamed as it renders.
+
+    Nothing is cached, but the ETag is still known before rendering, so a
+    matching If-None-Match gets a 304 and the body is never built.
+    """
+    with PRODUCT_DATA_SECONDS.time():
+        stock_data, loaded_at = get_stock_cache().get_entry()
+        snapshot = get_snapshot_store().get(stock_data)
+
+    _, etag, headers = _validators(snapshot, loaded_at, key, accept_encoding)
+    if parse_etags(if_none_match).contains_weak(etag):
+        RENDER_CACHE_REQUESTS.labels('not_modified').inc()
+        return 304, headers, iter(())
+    RENDER_CACHE_REQUESTS.labels('streamed').inc()
+    encoding = headers.get('Content-Encoding', 'identity')
+    return 200, headers, compress_stream(render(snapshot, loaded_at), encoding)
+
+
+def render_chunks(template: Template, context: Dict, rows_per_chunk: int = INDEX_STREAM_ROWS) -> Iterator[bytes]:
+    """Render a template over ``context['products']`` in chunks.
+
+    The first chunk is everything before the first product row (page head and
+    table header), then one chunk per ``rows_per_chunk`` products. Products
+    are pulled from the iterable as the template reaches them, so the page is
+    never held in memory whole.
+    """
+    pulled = 0
+
+    def products():
+        nonlocal pulled
+        for product in context['products']:
+            pulled += 1
+            yield product
+
+    flushed = 0
+    buffer = []
+    for piece in template.generate(**dict(context, products=products())):
+        # Flush as the template moves on to the first row and then every rows_per_chunk rows
+        if pulled != flushed and (flushed == 0 or pulled - flushed >= rows_per_chunk):
+            yield ''.join(buffer).encode()
+            buffer.clear()
+            flushed = pulled
+        buffer.append(piece)
+    yield ''.join(buffer).encode()
+
+
+# Sent first so browsers reconnect quickly after the stream drops
+SSE_PREAMBLE = b"retry: 5000\n\n"
+SSE_KEEPALIVE = b": keepalive\n\n"
+SSE_HEADERS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+
+def _last_event_id(value: Optional[str]) -> Optional[int]:
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+def stock_event_stream(last_event_id: Optional[str] = None,
+                       keepalive: float = STOCK_EVENTS_KEEPALIVE_SECONDS) -> Iterator[bytes]:
+    """Server-Sent Events of stock changes, for a subscriber resuming after ``last_event_id``"""
+    last = _last_event_id(last_event_id)
+    yield SSE_PREAMBLE
+    while True:
+        # Subscribers count as readers, so an idle dashboard still drives the refresh
+        get_stock_cache().get_entry()
+        frames, last = stock_events.catch_up(last)
+        yield b''.join(frames) or SSE_KEEPALIVE
+        stock_events.wait(last, keepalive)
+
+
+async def stock_event_stream_async(last_event_id: Optional[str] = None,
+                                   keepalive: float = STOCK_EVENTS_KEEPALIVE_SECONDS) -> AsyncIterator[bytes]:
+    """``stock_event_stream`` for async servers; an idle subscriber is one pending wait"""
+    last = _last_event_id(last_event_id)
+    stock_cache = get_stock_cache()
+    yield SSE_PREAMBLE
+    while True:
+        if stock_cache.timestamp is None:
+            await asyncio.to_thread(stock_cache.get_entry)
+        else:
+            stock_cache.get_entry()
+        frames, last = stock_events.catch_up(last)
+        yield b''.join(frames) or SSE_KEEPALIVE
+        await stock_events.wait_async(last, keepalive)